@@ -1,8 +1,11 @@
 from django.contrib import admin
-from .models import Notificacion
+from django.utils import timezone
+from pawtohome.paginacion import PaginadorEstimado
+from .changelist import ChangelistGrandeMixin
+from .models import Notificacion, NotificacionArchivada, Tarea
 
 @admin.register(Notificacion)
-class NotificacionAdmin(admin.ModelAdmin):
+class NotificacionAdmin(ChangelistGrandeMixin, admin.ModelAdmin):
     list_display = [
         'usuario', 'tipo', 'titulo', 'leida', 
         'fecha_creacion', 'fecha_lectura'
@@ -13,6 +16,9 @@ class NotificacionAdmin(admin.ModelAdmin):
         'reporte__nombre_perro'
     ]
     readonly_fields = ['fecha_creacion', 'fecha_lectura']
+    campo_keyset = 'fecha_creacion'
+    list_select_related = ['usuario']
+    raw_id_fields = ['usuario', 'reporte']
     
     fieldsets = (
         ('Destinatario', {
@@ -32,12 +38,7 @@ class NotificacionAdmin(admin.ModelAdmin):
     actions = ['marcar_como_leidas', 'marcar_como_no_leidas']
     
     def marcar_como_leidas(self, request, queryset):
-        updated = 0
-        for notificacion in queryset:
-            if not notificacion.leida:
-                notificacion.marcar_como_leida()
-                updated += 1
-        
+        updated = queryset.marcar_como_leidas()
         self.message_user(
             request, 
             f'{updated} notificación(es) marcada(s) como leída(s).'
@@ -45,12 +46,50 @@ class NotificacionAdmin(admin.ModelAdmin):
     marcar_como_leidas.short_description = "Marcar seleccionadas como leídas"
     
     def marcar_como_no_leidas(self, request, queryset):
-        updated = queryset.filter(leida=True).update(
-            leida=False, 
-            fecha_lectura=None
-        )
+        updated = queryset.marcar_como_no_leidas()
         self.message_user(
             request, 
             f'{updated} notificación(es) marcada(s) como no leída(s).'
         )
     marcar_como_no_leidas.short_description = "Marcar seleccionadas como no leídas"
+
+
+@admin.register(NotificacionArchivada)
+class NotificacionArchivadaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'usuario_id', 'tipo', 'titulo', 'leida', 'fecha_creacion', 'fecha_archivo']
+    list_filter = ['tipo']
+    search_fields = ['=id', '=usuario_id']
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = [
+        'tipo', 'estado', 'intentos', 'max_intentos',
+        'disponible_desde', 'fecha_creacion', 'bloqueada_por'
+    ]
+    list_filter = ['estado', 'tipo']
+    search_fields = ['tipo', 'ultimo_error']
+    readonly_fields = ['fecha_creacion', 'fecha_inicio', 'bloqueada_por', 'ultimo_error']
+    
+    actions = ['reintentar']
+    
+    def reintentar(self, request, queryset):
+        updated = queryset.exclude(estado='en_proceso').update(
+            estado='pendiente',
+            intentos=0,
+            disponible_desde=timezone.now(),
+            ultimo_error=''
+        )
+        self.message_user(
+            request, 
+            f'{updated} tarea(s) programada(s) para reintento.'
+        )
+    reintentar.short_description = "Reintentar tareas seleccionadas"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HomeinfoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Homeinfo'
+
+    def ready(self):
+        import Homeinfo.signals
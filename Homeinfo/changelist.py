@@ -0,0 +1,109 @@
+"""
+Changelists del admin para tablas muy grandes.
+
+``ChangelistGrandeMixin`` cambia tres cosas de un ModelAdmin:
+
+- El total se calcula con ``PaginadorEstimado`` (estimación del
+  planificador o conteo en cache por encima de ``ADMIN_CONTEO_UMBRAL``) y
+  no se cuenta la tabla completa sin filtros. ``?conteo=exacto`` fuerza
+  el COUNT(*) y se conserva en los enlaces del changelist.
+- Con el orden por defecto, las páginas se recorren por cursor sobre
+  (``campo_keyset``, pk) con ``?desde=<cursor>`` en lugar de OFFSET.
+  Ordenando por otra columna se vuelve a la paginación numerada.
+- Los facets de los filtros (un conteo por opción) quedan desactivados.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+
+from pawtohome.paginacion import (
+    UMBRAL_CONTEO, CursorInvalido, PaginadorEstimado, codificar_cursor, filtrar_desde_cursor,
+)
+
+CURSOR_VAR = 'desde'
+CONTEO_VAR = 'conteo'
+
+
+class ChangeListKeyset(ChangeList):
+    """ChangeList que pagina por cursor cuando se usa el orden por defecto"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.conteo_exacto = getattr(request, 'conteo_exacto', False)
+        super().__init__(request, *args, **kwargs)
+
+    def get_query_string(self, new_params=None, remove=None):
+        if self.conteo_exacto:
+            new_params = {CONTEO_VAR: 'exacto', **(new_params or {})}
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        campo = self.model_admin.campo_keyset
+        self.cursor = getattr(request, 'cursor_changelist', None)
+        self.keyset = (
+            campo is not None and ORDER_VAR not in self.params and not self.show_all
+            and (self.cursor is not None or self.page_num == 1)
+        )
+        self.url_siguiente = None
+        self.url_primera = self.get_query_string() if self.cursor else None
+
+        if not self.keyset:
+            super().get_results(request)
+        else:
+            paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+            try:
+                pagina = filtrar_desde_cursor(self.queryset, campo, self.cursor)
+            except CursorInvalido:
+                raise IncorrectLookupParameters
+            # Una fila de más indica si hay página siguiente sin otra consulta
+            filas = list(pagina[:self.list_per_page + 1])
+            if len(filas) > self.list_per_page:
+                filas = filas[:self.list_per_page]
+                ultima = filas[-1]
+                siguiente = codificar_cursor(getattr(ultima, campo), ultima.pk)
+                self.url_siguiente = self.get_query_string({CURSOR_VAR: siguiente})
+
+            self.result_count = paginator.count
+            self.show_full_result_count = False
+            self.show_admin_actions = True
+            self.full_result_count = None
+            self.result_list = filas
+            self.can_show_all = False
+            self.multi_page = self.url_siguiente is not None or self.cursor is not None
+            self.paginator = paginator
+
+        self.conteo_estimado = getattr(self.paginator, 'estimado', False)
+        self.url_conteo_exacto = (
+            self.get_query_string({CONTEO_VAR: 'exacto'}) if self.conteo_estimado else None
+        )
+
+
+class ChangelistGrandeMixin:
+    """Mixin de ModelAdmin para changelists de tablas con millones de filas"""
+
+    # Campo de fecha del orden por defecto; None desactiva la paginación por cursor
+    campo_keyset = None
+
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    change_list_template = 'admin/change_list_grande.html'
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListKeyset
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            umbral=getattr(settings, 'ADMIN_CONTEO_UMBRAL', UMBRAL_CONTEO),
+            exacto=getattr(request, 'conteo_exacto', False),
+        )
+
+    def changelist_view(self, request, extra_context=None):
+        # ChangeList trata los parámetros desconocidos como filtros, así que
+        # el cursor y el conteo exacto se sacan de GET antes de construirlo
+        parametros = request.GET.copy()
+        request.cursor_changelist = parametros.pop(CURSOR_VAR, [None])[-1]
+        request.conteo_exacto = parametros.pop(CONTEO_VAR, [''])[-1] == 'exacto'
+        request.GET = parametros
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,268 @@
+"""
+Cola de tareas en segundo plano respaldada por la base de datos.
+
+Las señales llaman a ``encolar()``, que inserta la tarea cuando la
+transacción actual se confirma. El comando ``manage.py procesar_cola``
+reclama tareas en lotes y ejecuta el manejador registrado para cada tipo.
+Varios trabajadores pueden correr a la vez: en PostgreSQL se reclaman con
+``SELECT ... FOR UPDATE SKIP LOCKED`` y en SQLite con un UPDATE condicional.
+
+Mientras una tarea se ejecuta, un hilo renueva su bloqueo cada tercio de
+``COLA_TIEMPO_BLOQUEO``, así que solo se reclama de nuevo si el trabajador
+que la tenía dejó de responder. Cada reclamo cuenta como intento: una
+tarea que tumba a su trabajador queda fallida al agotar ``max_intentos``.
+"""
+import logging
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Segundos tras los cuales una tarea en proceso se considera abandonada
+TIEMPO_BLOQUEO_SEGUNDOS = 300
+
+# Segundos base para el reintento exponencial de tareas fallidas
+ESPERA_REINTENTO_SEGUNDOS = 10
+
+_manejadores = {}
+_manejadores_lote = set()
+
+
+def manejador(tipo, lote=False):
+    """
+    Decorador que registra la función que ejecuta las tareas de ``tipo``.
+
+    Con ``lote=True`` la función recibe una lista con los datos de todas las
+    tareas de ese tipo reclamadas en la misma iteración, en lugar de una
+    llamada por tarea.
+    """
+    def decorador(funcion):
+        _manejadores[tipo] = funcion
+        if lote:
+            _manejadores_lote.add(tipo)
+        else:
+            _manejadores_lote.discard(tipo)
+        return funcion
+    return decorador
+
+
+def encolar(tipo, **datos):
+    """
+    Encola una tarea para cuando se confirme la transacción actual.
+
+    Con ``COLA_TAREAS_INMEDIATA = True`` la tarea se ejecuta en el mismo
+    proceso al confirmarse, útil en desarrollo y pruebas.
+    """
+    def crear():
+        if getattr(settings, 'COLA_TAREAS_INMEDIATA', False):
+            ejecutar(tipo, datos)
+        else:
+            Tarea.objects.create(tipo=tipo, datos=datos)
+
+    transaction.on_commit(crear)
+
+
+def encolar_varias(tipo, lista_datos):
+    """Como ``encolar()`` para varias tareas de ``tipo``, insertadas con un solo INSERT"""
+    lista_datos = list(lista_datos)
+
+    def crear():
+        if getattr(settings, 'COLA_TAREAS_INMEDIATA', False):
+            for datos in lista_datos:
+                ejecutar(tipo, datos)
+        else:
+            Tarea.objects.bulk_create([Tarea(tipo=tipo, datos=datos) for datos in lista_datos])
+
+    if lista_datos:
+        transaction.on_commit(crear)
+
+
+def ejecutar(tipo, datos):
+    """Ejecuta el manejador registrado para ``tipo``"""
+    try:
+        funcion = _manejadores[tipo]
+    except KeyError:
+        raise LookupError(f"No hay manejador registrado para las tareas '{tipo}'")
+    if tipo in _manejadores_lote:
+        return funcion([datos])
+    return funcion(**datos)
+
+
+def _tiempo_bloqueo():
+    return getattr(settings, 'COLA_TIEMPO_BLOQUEO', TIEMPO_BLOQUEO_SEGUNDOS)
+
+
+def _abandonadas(ahora):
+    return Q(estado='en_proceso', fecha_inicio__lt=ahora - timedelta(seconds=_tiempo_bloqueo()))
+
+
+def _disponibles(ahora):
+    return (
+        Q(estado='pendiente', disponible_desde__lte=ahora) |
+        (_abandonadas(ahora) & Q(intentos__lt=F('max_intentos')))
+    )
+
+
+def _descartar_agotadas(ahora):
+    """Marca como fallidas las tareas abandonadas que ya agotaron sus intentos"""
+    descartadas = Tarea.objects.filter(
+        _abandonadas(ahora), intentos__gte=F('max_intentos')
+    ).update(
+        estado='fallida',
+        bloqueada_por='',
+        ultimo_error="El trabajador dejó de responder en el último intento permitido.",
+    )
+    if descartadas:
+        logger.error("%d tarea(s) abandonadas agotaron sus intentos y quedan fallidas", descartadas)
+
+
+def reclamar_tareas(limite, trabajador):
+    """
+    Marca hasta ``limite`` tareas disponibles como en proceso para
+    ``trabajador`` y las retorna
+    """
+    ahora = timezone.now()
+    disponibles = _disponibles(ahora)
+    _descartar_agotadas(ahora)
+
+    with transaction.atomic():
+        consulta = Tarea.objects.filter(disponibles).order_by('disponible_desde')
+        if connection.features.has_select_for_update_skip_locked:
+            consulta = consulta.select_for_update(skip_locked=True)
+        ids = list(consulta.values_list('pk', flat=True)[:limite])
+        if not ids:
+            return []
+
+        # El filtro repetido hace el reclamo seguro aun sin SKIP LOCKED:
+        # solo un trabajador puede pasar cada fila de disponible a en proceso
+        Tarea.objects.filter(disponibles, pk__in=ids).update(
+            estado='en_proceso',
+            bloqueada_por=trabajador,
+            fecha_inicio=ahora,
+            intentos=F('intentos') + 1,
+        )
+
+    return list(Tarea.objects.filter(
+        pk__in=ids, estado='en_proceso', bloqueada_por=trabajador
+    ))
+
+
+def renovar_bloqueo(tareas, trabajador):
+    """
+    Extiende el bloqueo de las ``tareas`` que ``trabajador`` todavía tiene
+    reclamadas y retorna el conjunto de sus ids
+    """
+    ids = {tarea.pk for tarea in tareas}
+    propias = Tarea.objects.filter(pk__in=ids, estado='en_proceso', bloqueada_por=trabajador)
+    if propias.update(fecha_inicio=timezone.now()) == len(ids):
+        return ids
+    return set(propias.values_list('pk', flat=True))
+
+
+class _Latido(threading.Thread):
+    """Hilo que renueva el bloqueo de un grupo de tareas mientras se ejecuta"""
+
+    def __init__(self, tareas, trabajador, intervalo):
+        super().__init__(daemon=True)
+        self.tareas = tareas
+        self.trabajador = trabajador
+        self.intervalo = intervalo
+        self.detenido = threading.Event()
+
+    def run(self):
+        try:
+            while not self.detenido.wait(self.intervalo):
+                try:
+                    renovar_bloqueo(self.tareas, self.trabajador)
+                except Exception:
+                    logger.exception("No se pudo renovar el bloqueo de la tarea %s", self.tareas[0].pk)
+        finally:
+            # El hilo usa su propia conexión
+            connections.close_all()
+
+    def detener(self):
+        self.detenido.set()
+        self.join()
+
+
+def _ejecutar_grupo(grupo, trabajador):
+    latido = _Latido(grupo, trabajador, _tiempo_bloqueo() / 3)
+    latido.start()
+    try:
+        with transaction.atomic():
+            if grupo[0].tipo in _manejadores_lote:
+                _manejadores[grupo[0].tipo]([tarea.datos for tarea in grupo])
+            else:
+                ejecutar(grupo[0].tipo, grupo[0].datos)
+            Tarea.objects.filter(pk__in=[tarea.pk for tarea in grupo]).delete()
+    finally:
+        latido.detener()
+
+
+def _registrar_fallo(tarea, error):
+    tarea.ultimo_error = error[-5000:]
+    if tarea.intentos >= tarea.max_intentos:
+        tarea.estado = 'fallida'
+    else:
+        espera = getattr(settings, 'COLA_ESPERA_REINTENTO', ESPERA_REINTENTO_SEGUNDOS)
+        tarea.estado = 'pendiente'
+        tarea.disponible_desde = timezone.now() + timedelta(seconds=espera * 2 ** (tarea.intentos - 1))
+    tarea.bloqueada_por = ''
+    tarea.save(update_fields=['estado', 'disponible_desde', 'bloqueada_por', 'ultimo_error'])
+
+
+def procesar_lote(limite=100, trabajador=None):
+    """
+    Reclama y ejecuta un lote de tareas.
+    Retorna la tupla (completadas, fallidas).
+
+    Si falla el manejador de un grupo ``lote=True``, sus tareas se
+    ejecutan de nuevo una por una para que solo fallen las que lo causaron.
+    """
+    trabajador = trabajador or uuid.uuid4().hex
+    completadas = fallidas = 0
+
+    individuales = []
+    por_lote = {}
+    for tarea in reclamar_tareas(limite, trabajador):
+        if tarea.tipo in _manejadores_lote:
+            por_lote.setdefault(tarea.tipo, []).append(tarea)
+        else:
+            individuales.append([tarea])
+
+    pendientes = individuales + list(por_lote.values())
+    while pendientes:
+        grupo = pendientes.pop(0)
+        # Los grupos anteriores pudieron tardar más que el bloqueo; las
+        # tareas que ya reclamó otro trabajador no se ejecutan aquí
+        propias = renovar_bloqueo(grupo, trabajador)
+        grupo = [tarea for tarea in grupo if tarea.pk in propias]
+        if not grupo:
+            continue
+
+        try:
+            _ejecutar_grupo(grupo, trabajador)
+        except Exception:
+            if len(grupo) > 1:
+                logger.warning(
+                    "Falló el lote de %d tareas %s; se ejecutan una por una",
+                    len(grupo), grupo[0].tipo, exc_info=True
+                )
+                pendientes[:0] = [[tarea] for tarea in grupo]
+                continue
+            logger.exception("Falló la tarea %s (%s)", grupo[0].pk, grupo[0].tipo)
+            _registrar_fallo(grupo[0], traceback.format_exc())
+            fallidas += 1
+        else:
+            completadas += len(grupo)
+
+    return completadas, fallidas
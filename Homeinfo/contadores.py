@@ -0,0 +1,152 @@
+"""
+Contadores de notificaciones no leídas por usuario.
+
+La fuente de verdad es la tabla ``contador_notificaciones``; el cache
+guarda una copia por usuario que se descarta cada vez que el contador
+cambia. Si un usuario aún no tiene contador, se calcula una vez con
+COUNT(*) al leerlo. ``manage.py reconciliar_contadores`` corrige cualquier
+desviación respecto a la tabla de notificaciones.
+
+Cada invalidación incrementa además una generación global antes de borrar
+las copias; una lectura que vio cambiar la generación mientras consultaba
+la base de datos no guarda su valor, que podría ser anterior al cambio.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ContadorNotificaciones, Notificacion
+
+# Segundos que el contador permanece en el cache
+TTL_CONTADOR_SEGUNDOS = 600
+
+
+CLAVE_GENERACION = 'notificaciones:no_leidas:generacion'
+
+
+def clave_cache(usuario_id):
+    return f"notificaciones:no_leidas:{usuario_id}"
+
+
+def _invalidar(usuarios):
+    """Descarta al confirmar la transacción las copias en cache de los usuarios"""
+    claves = [clave_cache(usuario_id) for usuario_id in usuarios]
+
+    def invalidar():
+        try:
+            cache.incr(CLAVE_GENERACION)
+        except ValueError:
+            cache.set(CLAVE_GENERACION, time.time_ns(), None)
+        cache.delete_many(claves)
+
+    transaction.on_commit(invalidar)
+
+
+def _no_leidas_reales(usuario_id):
+    """Expresión con el COUNT(*) de las no leídas, para evaluarlo en la misma sentencia que escribe"""
+    return Coalesce(Subquery(
+        Notificacion.objects
+        .filter(usuario_id=usuario_id, leida=False)
+        .order_by()
+        .values('usuario_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recalcular(usuario_id):
+    """
+    Fija el contador del usuario al número real de notificaciones no leídas
+    y retorna ese valor. El conteo se hace en la misma sentencia que escribe
+    el contador, con la fila ya bloqueada si existía, así que no se pierden
+    los cambios que ``sumar_no_leidas`` confirme mientras tanto.
+    """
+    with transaction.atomic():
+        contador, _ = ContadorNotificaciones.objects.update_or_create(
+            usuario_id=usuario_id, defaults={'no_leidas': _no_leidas_reales(usuario_id)}
+        )
+        contador.refresh_from_db(fields=['no_leidas'])
+        _invalidar([usuario_id])
+    return contador.no_leidas
+
+
+def sumar_no_leidas(deltas):
+    """
+    Suma a los contadores de cada usuario su delta ({usuario_id: delta}).
+    Se hace un UPDATE con F() por cada valor distinto de delta. Los usuarios
+    sin contador se omiten: su contador se calculará al leerlo.
+    """
+    por_delta = defaultdict(list)
+    for usuario_id, delta in deltas.items():
+        if delta:
+            por_delta[delta].append(usuario_id)
+    if not por_delta:
+        return
+
+    for delta, usuarios in por_delta.items():
+        ContadorNotificaciones.objects.filter(usuario_id__in=usuarios).update(
+            no_leidas=F('no_leidas') + delta
+        )
+
+    _invalidar(deltas)
+
+
+def obtener_no_leidas(usuario_id):
+    """Retorna el número de notificaciones no leídas del usuario"""
+    clave = clave_cache(usuario_id)
+    no_leidas = cache.get(clave)
+    if no_leidas is not None:
+        return no_leidas
+
+    cache.add(CLAVE_GENERACION, time.time_ns(), None)
+    generacion = cache.get(CLAVE_GENERACION)
+    no_leidas = (
+        ContadorNotificaciones.objects
+        .filter(usuario_id=usuario_id)
+        .values_list('no_leidas', flat=True)
+        .first()
+    )
+    if no_leidas is None:
+        # recalcular() descarta la copia en cache en lugar de guardarla
+        return recalcular(usuario_id)
+
+    if cache.get(CLAVE_GENERACION) == generacion:
+        cache.set(clave, no_leidas, getattr(settings, 'CONTADOR_NOTIFICACIONES_TTL', TTL_CONTADOR_SEGUNDOS))
+    return no_leidas
+
+
+def reconciliar(tamano_lote=1000):
+    """
+    Recalcula los contadores existentes a partir de la tabla de
+    notificaciones y corrige los que no coinciden.
+    Retorna el número de contadores corregidos.
+    """
+    corregidos = 0
+    ultimo_id = None
+    while True:
+        contadores = ContadorNotificaciones.objects.order_by('usuario_id')
+        if ultimo_id is not None:
+            contadores = contadores.filter(usuario_id__gt=ultimo_id)
+        lote = dict(contadores.values_list('usuario_id', 'no_leidas')[:tamano_lote])
+        if not lote:
+            return corregidos
+        ultimo_id = max(lote)
+
+        reales = dict(
+            Notificacion.objects
+            .filter(usuario_id__in=lote, leida=False)
+            .order_by()
+            .values_list('usuario_id')
+            .annotate(total=Count('pk'))
+        )
+        for usuario_id, no_leidas in lote.items():
+            if reales.get(usuario_id, 0) != no_leidas:
+                # Se vuelve a contar al escribir: el contador o las
+                # notificaciones pudieron cambiar desde la lectura del lote
+                if recalcular(usuario_id) != no_leidas:
+                    corregidos += 1
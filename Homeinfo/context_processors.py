@@ -0,0 +1,12 @@
+from .contadores import obtener_no_leidas
+
+
+def notificaciones(request):
+    """
+    Agrega ``notificaciones_no_leidas`` al contexto de las plantillas.
+    Es un callable para que solo se consulte si la plantilla lo usa.
+    """
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        return {'notificaciones_no_leidas': 0}
+    return {'notificaciones_no_leidas': lambda: obtener_no_leidas(usuario.pk)}
@@ -0,0 +1,103 @@
+import io
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+# Rutas medidas por defecto: página de inicio, feed y búsqueda por radio del mapa
+RUTAS = [
+    '/',
+    '/reports/feed/',
+    '/maps/reportes/?lat=19.4326&lng=-99.1332&radio=10',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia por petición pasando por el manejador WSGI completo "
+        "(middleware, señales de inicio y fin de petición y cierre de "
+        "conexiones). Ejecutarlo con el perfil de desarrollo y con "
+        "ENTORNO=produccion para comparar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('rutas', nargs='*', default=RUTAS,
+                            help="Rutas a medir (con su query string)")
+        parser.add_argument('--peticiones', type=int, default=200,
+                            help="Peticiones por ruta")
+        parser.add_argument('--calentamiento', type=int, default=10,
+                            help="Peticiones por ruta que no se miden")
+        parser.add_argument('--sin-cache', action='store_true',
+                            help="Agrega un parámetro distinto a cada petición para evitar el cache de respuestas")
+
+    def _perfil(self):
+        base = settings.DATABASES['default']
+        pool = base.get('OPTIONS', {}).get('pool')
+        plantillas = settings.TEMPLATES[0].get('OPTIONS', {}).get('loaders')
+        return (
+            f"DEBUG={settings.DEBUG} motor={base['ENGINE'].rsplit('.', 1)[-1]} "
+            f"pool={'sí' if pool else 'no'} CONN_MAX_AGE={base.get('CONN_MAX_AGE', 0)} "
+            f"cache={settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]} "
+            f"templates={'cached' if plantillas else 'por defecto'}"
+        )
+
+    def _entorno(self, ruta):
+        path, _, query = ruta.partition('?')
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        return {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': host,
+            'SERVER_PORT': '80',
+            'HTTP_HOST': host,
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+    def _pedir(self, manejador, ruta):
+        estado = []
+        respuesta = manejador(self._entorno(ruta), lambda status, headers, *args: estado.append(status))
+        try:
+            for _ in respuesta:
+                pass
+        finally:
+            # close() envía request_finished, que cierra o devuelve la conexión
+            respuesta.close()
+        return estado[0]
+
+    def handle(self, *args, **options):
+        # Las conexiones abiertas por el comando no deben contarse
+        connection.close()
+        manejador = WSGIHandler()
+        self.stdout.write(self._perfil())
+        self.stdout.write(f"{'ruta':<50} {'estado':>6} {'p50 ms':>8} {'p95 ms':>8} {'media ms':>9}")
+
+        for ruta in options['rutas']:
+            separador = '&' if '?' in ruta else '?'
+            for i in range(options['calentamiento']):
+                self._pedir(manejador, ruta)
+
+            tiempos = []
+            estado = ''
+            for i in range(options['peticiones']):
+                actual = f"{ruta}{separador}_={i}" if options['sin_cache'] else ruta
+                inicio = time.perf_counter()
+                estado = self._pedir(manejador, actual)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            tiempos.sort()
+            self.stdout.write(
+                f"{ruta[:50]:<50} {estado.split()[0]:>6} "
+                f"{statistics.median(tiempos):>8.2f} "
+                f"{tiempos[int(len(tiempos) * 0.95) - 1]:>8.2f} "
+                f"{statistics.fmean(tiempos):>9.2f}"
+            )
@@ -0,0 +1,227 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from Homeinfo.models import Notificacion
+from pawtohome.sinteticos import CIUDADES, PREFIJO_USUARIO
+from reportsservice.models import Avistamiento, Comentario, Reporte
+
+# Páginas del feed que se recorren antes de medir la página profunda
+PAGINA_PROFUNDA = 10
+
+CHANGELISTS = {
+    'admin_reportes': '/admin/reportsservice/reporte/',
+    'admin_avistamientos': '/admin/reportsservice/avistamiento/',
+    'admin_comentarios': '/admin/reportsservice/comentario/',
+    'admin_fotos': '/admin/reportsservice/fotoreporte/',
+    'admin_notificaciones': '/admin/Homeinfo/notificacion/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide tiempo y número de consultas de las rutas críticas sobre los "
+        "datos de sembrar_datos_sinteticos: creación de reporte con difusión, "
+        "búsqueda por radio, páginas del feed, bandeja de notificaciones y "
+        "changelists del admin. Escribe los resultados en JSON para "
+        "compararlos entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--calentamiento', type=int, default=2)
+        parser.add_argument('--salida', default='bench_rutas.json',
+                            help="Archivo JSON de resultados")
+        parser.add_argument('--comparar', default=None,
+                            help="JSON de una corrida anterior para mostrar las diferencias")
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help="Aumento relativo de la mediana que se marca como regresión")
+        parser.add_argument('--solo', nargs='+', default=None,
+                            help="Medir solo estas operaciones")
+
+    def _cliente(self, usuario=None):
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        cliente = Client(SERVER_NAME=host)
+        if usuario is not None:
+            cliente.force_login(usuario)
+        return cliente
+
+    def _get(self, cliente, ruta, **parametros):
+        respuesta = cliente.get(ruta, parametros)
+        if respuesta.status_code != 200:
+            raise CommandError(f"{ruta} respondió {respuesta.status_code}")
+        return respuesta
+
+    def _operaciones(self):
+        User = get_user_model()
+        rng = random.Random(7)
+        autor = User.objects.filter(username__startswith=PREFIJO_USUARIO, is_superuser=False).first()
+        admin = User.objects.filter(username=f'{PREFIJO_USUARIO}admin').first()
+        if autor is None or admin is None:
+            raise CommandError("No hay datos sintéticos; ejecute primero sembrar_datos_sinteticos.")
+
+        anonimo = self._cliente()
+        personal = self._cliente(admin)
+        contador = iter(range(10 ** 9))
+
+        def sin_cache():
+            # Parámetro distinto en cada petición para no medir el cache de respuestas
+            return {'_': next(contador)}
+
+        creados = []
+
+        def crear_reporte():
+            latitud, longitud = rng.choice(CIUDADES)
+            # La difusión corre al confirmar la transacción, como con un trabajador
+            with override_settings(COLA_TAREAS_INMEDIATA=True):
+                with transaction.atomic():
+                    creados.append(Reporte.objects.create(
+                        usuario=autor,
+                        tipo_reporte='perdido',
+                        nombre_perro='Benchmark',
+                        color='café',
+                        tamano='mediano',
+                        descripcion='Reporte de benchmark',
+                        latitud=latitud + rng.gauss(0, 0.05),
+                        longitud=longitud + rng.gauss(0, 0.05),
+                        direccion='N/A',
+                        zona='Centro',
+                        fecha_incidente=timezone.now(),
+                        telefono_contacto='0000000000',
+                        email_contacto='bench@example.com',
+                    ).pk)
+
+        def radio():
+            latitud, longitud = rng.choice(CIUDADES)
+            self._get(anonimo, '/maps/reportes/', lat=latitud, lng=longitud, radio=5, **sin_cache())
+
+        cursor = None
+        for _ in range(PAGINA_PROFUNDA - 1):
+            cursor = self._get(anonimo, '/reports/feed/', cursor=cursor or '').json()['siguiente']
+            if cursor is None:
+                break
+
+        destinatario = (
+            Notificacion.objects.values('usuario').annotate(total=Count('pk')).order_by('-total').first()
+        )
+        bandeja = self._cliente(User.objects.get(pk=destinatario['usuario'])) if destinatario else None
+        cursor_bandeja = (
+            self._get(bandeja, '/notificaciones/').json()['siguiente'] if bandeja else None
+        )
+
+        operaciones = {
+            'crear_reporte': crear_reporte,
+            'radio_5km': radio,
+            'feed_primera_pagina': lambda: self._get(anonimo, '/reports/feed/', **sin_cache()),
+        }
+        if cursor:
+            operaciones['feed_pagina_profunda'] = lambda: self._get(
+                anonimo, '/reports/feed/', cursor=cursor, **sin_cache()
+            )
+        if bandeja:
+            operaciones['bandeja_primera_pagina'] = lambda: self._get(bandeja, '/notificaciones/')
+            if cursor_bandeja:
+                operaciones['bandeja_segunda_pagina'] = lambda: self._get(
+                    bandeja, '/notificaciones/', cursor=cursor_bandeja
+                )
+        for nombre, ruta in CHANGELISTS.items():
+            operaciones[nombre] = lambda ruta=ruta: self._get(personal, ruta)
+        return operaciones, creados
+
+    def _medir(self, funcion, repeticiones, calentamiento):
+        for _ in range(calentamiento):
+            funcion()
+        tiempos = []
+        consultas = []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas.captured_queries))
+        tiempos.sort()
+        return {
+            'repeticiones': repeticiones,
+            'ms_mediana': round(statistics.median(tiempos), 3),
+            'ms_p95': round(tiempos[max(0, int(len(tiempos) * 0.95) - 1)], 3),
+            'ms_min': round(tiempos[0], 3),
+            'consultas': int(statistics.median(consultas)),
+            'consultas_max': max(consultas),
+        }
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        operaciones, creados = self._operaciones()
+        if options['solo']:
+            operaciones = {nombre: operaciones[nombre] for nombre in options['solo'] if nombre in operaciones}
+
+        resultados = {}
+        self.stdout.write(f"{'operación':<26} {'mediana ms':>11} {'p95 ms':>9} {'consultas':>10}")
+        try:
+            for nombre, funcion in operaciones.items():
+                resultado = self._medir(funcion, options['repeticiones'], options['calentamiento'])
+                resultados[nombre] = resultado
+                self.stdout.write(
+                    f"{nombre:<26} {resultado['ms_mediana']:>11.2f} "
+                    f"{resultado['ms_p95']:>9.2f} {resultado['consultas']:>10}"
+                )
+        finally:
+            Reporte.objects.filter(pk__in=creados).delete()
+
+        datos = {
+            'commit': self._commit(),
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'filas': {
+                'usuarios': get_user_model().objects.count(),
+                'reportes': Reporte.objects.count(),
+                'avistamientos': Avistamiento.objects.count(),
+                'comentarios': Comentario.objects.count(),
+                'notificaciones': Notificacion.objects.count(),
+            },
+            'resultados': resultados,
+        }
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(datos, archivo, indent=2, sort_keys=True, ensure_ascii=False)
+            archivo.write('\n')
+        self.stdout.write(f"Resultados escritos en {options['salida']}")
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados, options['tolerancia'])
+
+    def _comparar(self, ruta, resultados, tolerancia):
+        with open(ruta, encoding='utf-8') as archivo:
+            anteriores = json.load(archivo)['resultados']
+
+        self.stdout.write(f"\n{'operación':<26} {'antes ms':>9} {'ahora ms':>9} {'cambio':>8} {'consultas':>12}")
+        for nombre, actual in resultados.items():
+            anterior = anteriores.get(nombre)
+            if anterior is None:
+                continue
+            cambio = actual['ms_mediana'] / anterior['ms_mediana'] - 1 if anterior['ms_mediana'] else 0.0
+            linea = (
+                f"{nombre:<26} {anterior['ms_mediana']:>9.2f} {actual['ms_mediana']:>9.2f} "
+                f"{cambio:>+8.0%} {anterior['consultas']:>5} -> {actual['consultas']:<4}"
+            )
+            if cambio > tolerancia or actual['consultas'] > anterior['consultas']:
+                self.stdout.write(self.style.ERROR(f"{linea} regresión"))
+            else:
+                self.stdout.write(linea)
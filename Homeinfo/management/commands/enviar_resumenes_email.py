@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from Homeinfo.resumenes import enviar_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía por email un resumen de las notificaciones no leídas a cada "
+        "usuario con notificaciones_email activo, como máximo uno por ventana, "
+        "en lotes por una sola conexión SMTP. Pensado para ejecutarse con cron "
+        "cada pocos minutos. Reporta el rendimiento en mensajes por segundo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventana', type=int, default=None,
+                            help="Minutos mínimos entre dos resúmenes al mismo usuario")
+        parser.add_argument('--antiguedad', type=int, default=None,
+                            help="Horas tras las que una notificación ya no se envía")
+        parser.add_argument('--lote', type=int, default=None,
+                            help="Mensajes enviados por lote")
+
+    def handle(self, *args, **options):
+        resultado = enviar_resumenes(
+            tamano_lote=options['lote'],
+            ventana_minutos=options['ventana'],
+            antiguedad_horas=options['antiguedad'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['mensajes']} resumen(es) con {resultado['notificaciones']} "
+            f"notificación(es) en {resultado['segundos']:.2f} s "
+            f"({resultado['mensajes_por_segundo']:.1f} mensajes/s)"
+        ))
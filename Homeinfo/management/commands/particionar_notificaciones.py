@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from Homeinfo import particiones
+
+
+class Command(BaseCommand):
+    help = (
+        "Convierte la tabla de notificaciones en una tabla particionada por mes "
+        "de fecha_creacion (solo PostgreSQL) para que la retención elimine meses "
+        "completos. Bloquea la tabla mientras copia las filas: ejecutarlo en una "
+        "ventana de mantenimiento. Si ya está particionada, solo crea las "
+        "particiones de los próximos meses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-adelante', type=int, default=3,
+                            help="Meses futuros con partición creada de antemano")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El particionado solo está disponible en PostgreSQL.")
+
+        if particiones.convertir(options['meses_adelante']):
+            self.stdout.write(self.style.SUCCESS("Tabla de notificaciones particionada por mes."))
+        else:
+            ahora = timezone.now()
+            particiones.crear_particiones(ahora, particiones.sumar_meses(ahora, options['meses_adelante']))
+            self.stdout.write("La tabla ya estaba particionada; particiones futuras creadas.")
+        for nombre, inicio, _ in particiones.particiones():
+            self.stdout.write(f"  {nombre} ({inicio:%Y-%m})")
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Homeinfo.cola import procesar_lote
+from ProfileService.indice import verificar_cache_compartida
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa la cola de tareas en segundo plano (notificaciones, etc.). "
+        "Se pueden ejecutar varias instancias a la vez."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100,
+                            help="Tareas reclamadas por iteración")
+        parser.add_argument('--procesos', type=int, default=1,
+                            help="Número de procesos trabajadores")
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help="Segundos de espera cuando la cola está vacía")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Terminar cuando la cola quede vacía")
+
+    def handle(self, *args, **options):
+        try:
+            verificar_cache_compartida()
+        except ImproperlyConfigured as error:
+            raise CommandError(error)
+
+        if options['procesos'] <= 1:
+            self._trabajar(options)
+            return
+
+        # Cerrar las conexiones heredadas antes de crear los procesos hijos
+        connections.close_all()
+        procesos = [
+            multiprocessing.Process(target=self._trabajar, args=(options,))
+            for _ in range(options['procesos'])
+        ]
+        for proceso in procesos:
+            proceso.start()
+        try:
+            for proceso in procesos:
+                proceso.join()
+        except KeyboardInterrupt:
+            for proceso in procesos:
+                proceso.terminate()
+
+    def _trabajar(self, options):
+        trabajador = f"{socket.gethostname()}:{os.getpid()}"
+        detener = []
+        signal.signal(signal.SIGTERM, lambda *_: detener.append(True))
+
+        total_completadas = total_fallidas = 0
+        while not detener:
+            completadas, fallidas = procesar_lote(options['lote'], trabajador)
+            total_completadas += completadas
+            total_fallidas += fallidas
+
+            if completadas + fallidas == 0:
+                if options['una_vez']:
+                    break
+                time.sleep(options['espera'])
+
+        self.stdout.write(
+            f"[{trabajador}] {total_completadas} tarea(s) completada(s), "
+            f"{total_fallidas} fallida(s)"
+        )
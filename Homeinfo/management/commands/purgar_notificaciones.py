@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Homeinfo import retencion
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica la política de retención de notificaciones: elimina las leídas "
+        "más antiguas que RETENCION_NOTIFICACIONES_LEIDAS_DIAS y todas las más "
+        "antiguas que RETENCION_NOTIFICACIONES_MESES, en lotes pequeños por "
+        "llave primaria. Opcionalmente las archiva antes en la tabla "
+        "notificacion_archivada o en un archivo JSONL comprimido. Con la tabla "
+        "particionada elimina los meses vencidos quitando su partición."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-leidas', type=int, default=None,
+                            help="Días que se conservan las notificaciones leídas")
+        parser.add_argument('--meses', type=int, default=None,
+                            help="Meses que se conserva cualquier notificación")
+        parser.add_argument('--lote', type=int, default=retencion.TAMANO_LOTE,
+                            help="Filas eliminadas por transacción")
+        parser.add_argument('--pausa', type=float, default=0.0,
+                            help="Segundos de espera entre lotes")
+        parser.add_argument('--archivar', choices=['tabla', 'archivo'], default=None,
+                            help="Dónde archivar las filas antes de eliminarlas")
+        parser.add_argument('--archivo', default=None,
+                            help="Ruta del .jsonl.gz para --archivar archivo (se agregan líneas)")
+        parser.add_argument('--sin-particiones', action='store_true',
+                            help="Eliminar por lotes aunque la tabla esté particionada")
+        parser.add_argument('--simular', action='store_true',
+                            help="Solo contar las notificaciones que se eliminarían")
+
+    def handle(self, *args, **options):
+        limite_leidas, limite_todas = retencion.limites(
+            dias_leidas=options['dias_leidas'], meses=options['meses']
+        )
+        if options['simular']:
+            total = retencion.vencidas(limite_leidas, limite_todas).count()
+            self.stdout.write(f"{total} notificación(es) se eliminarían.")
+            return
+
+        archivar = None
+        if options['archivar'] == 'tabla':
+            archivar = retencion.archivar_en_tabla
+        elif options['archivar'] == 'archivo':
+            if not options['archivo']:
+                raise CommandError("--archivar archivo requiere --archivo RUTA.")
+            archivar = retencion.ArchivoJSONL(options['archivo'])
+
+        resultado = retencion.purgar(
+            limite_leidas, limite_todas,
+            tamano_lote=options['lote'],
+            archivar=archivar,
+            pausa=options['pausa'],
+            usar_particiones=not options['sin_particiones'],
+        )
+        for nombre in resultado['particiones']:
+            self.stdout.write(f"Partición {nombre} eliminada")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['eliminadas']} notificación(es) eliminada(s)."
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from Homeinfo.contadores import reconciliar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los contadores de notificaciones no leídas a partir de la "
+        "tabla de notificaciones y corrige los que se hayan desviado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help="Contadores revisados por consulta")
+
+    def handle(self, *args, **options):
+        corregidos = reconciliar(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{corregidos} contador(es) corregido(s)."))
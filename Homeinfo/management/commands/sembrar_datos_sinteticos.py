@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pawtohome import sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea usuarios con ubicación preferida, reportes, avistamientos, "
+        "comentarios y notificaciones sintéticos concentrados alrededor de "
+        "ciudades, para usarlos con bench_rutas_criticas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=5000)
+        parser.add_argument('--reportes', type=int, default=20000)
+        parser.add_argument('--avistamientos', type=int, default=40000)
+        parser.add_argument('--comentarios', type=int, default=40000)
+        parser.add_argument('--notificaciones', type=int, default=100000)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--limpiar', action='store_true',
+                            help="Eliminar antes los datos sintéticos existentes")
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            inicio = time.perf_counter()
+            total, _ = sinteticos.eliminar_datos()
+            self.stdout.write(f"{total} filas sintéticas eliminadas en {time.perf_counter() - inicio:.1f}s")
+
+        inicio = time.perf_counter()
+        creados = sinteticos.sembrar(
+            usuarios=options['usuarios'],
+            reportes=options['reportes'],
+            avistamientos=options['avistamientos'],
+            comentarios=options['comentarios'],
+            notificaciones=options['notificaciones'],
+            semilla=options['semilla'],
+        )
+        resumen = ', '.join(f"{cantidad} {modelo}" for modelo, cantidad in creados.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Creados {resumen} en {time.perf_counter() - inicio:.1f}s"
+        ))
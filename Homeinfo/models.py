@@ -1,7 +1,43 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
+class NotificacionQuerySet(models.QuerySet):
+    
+    def marcar_como_leidas(self):
+        """
+        Marca como leídas las notificaciones no leídas del queryset con un
+        solo UPDATE y ajusta los contadores de no leídas.
+        Retorna el número de notificaciones actualizadas.
+        """
+        from .contadores import sumar_no_leidas
+        
+        no_leidas = self.filter(leida=False)
+        with transaction.atomic():
+            por_usuario = dict(
+                no_leidas.order_by().values_list('usuario_id').annotate(total=models.Count('pk'))
+            )
+            actualizadas = no_leidas.update(leida=True, fecha_lectura=timezone.now())
+            sumar_no_leidas({usuario_id: -total for usuario_id, total in por_usuario.items()})
+        return actualizadas
+    
+    def marcar_como_no_leidas(self):
+        """
+        Marca como no leídas las notificaciones leídas del queryset con un
+        solo UPDATE y ajusta los contadores de no leídas.
+        Retorna el número de notificaciones actualizadas.
+        """
+        from .contadores import sumar_no_leidas
+        
+        leidas = self.filter(leida=True)
+        with transaction.atomic():
+            por_usuario = dict(
+                leidas.order_by().values_list('usuario_id').annotate(total=models.Count('pk'))
+            )
+            actualizadas = leidas.update(leida=False, fecha_lectura=None)
+            sumar_no_leidas(por_usuario)
+        return actualizadas
+
 class Notificacion(models.Model):
     """
     Modelo de Notificación basado en el ER de PawsToHome
@@ -70,6 +106,8 @@ class Notificacion(models.Model):
         verbose_name="URL de Referencia"
     )
     
+    objects = NotificacionQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Notificación"
         verbose_name_plural = "Notificaciones"
@@ -78,6 +116,8 @@ class Notificacion(models.Model):
         indexes = [
             models.Index(fields=['usuario', 'leida']),
             models.Index(fields=['fecha_creacion']),
+            # Paginación por cursor de la bandeja de cada usuario
+            models.Index(fields=['usuario', '-fecha_creacion', '-id']),
         ]
     
     def __str__(self):
@@ -85,7 +125,229 @@ class Notificacion(models.Model):
     
     def marcar_como_leida(self):
         """Marca la notificación como leída"""
+        from .contadores import sumar_no_leidas
+        
         if not self.leida:
             self.leida = True
             self.fecha_lectura = timezone.now()
-            self.save(update_fields=['leida', 'fecha_lectura'])
+            with transaction.atomic():
+                # El filtro por leida=False evita descontar dos veces si otra
+                # petición la marcó al mismo tiempo
+                actualizadas = Notificacion.objects.filter(pk=self.pk, leida=False).update(
+                    leida=True, fecha_lectura=self.fecha_lectura
+                )
+                if actualizadas:
+                    sumar_no_leidas({self.usuario_id: -1})
+
+class ContadorNotificaciones(models.Model):
+    """
+    Número de notificaciones no leídas de cada usuario.
+    Se mantiene con expresiones F() al crear y leer notificaciones para no
+    tener que contar la tabla de notificaciones en cada página.
+    """
+    
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='contador_notificaciones',
+        verbose_name="Usuario"
+    )
+    
+    no_leidas = models.IntegerField(
+        default=0,
+        verbose_name="No Leídas"
+    )
+    
+    class Meta:
+        verbose_name = "Contador de Notificaciones"
+        verbose_name_plural = "Contadores de Notificaciones"
+        db_table = "contador_notificaciones"
+    
+    def __str__(self):
+        return f"{self.no_leidas} no leída(s) de {self.usuario_id}"
+
+
+class EnvioResumenEmail(models.Model):
+    """
+    Último resumen por email enviado a cada usuario.
+    Las notificaciones con id mayor que ``ultima_notificacion_id`` están
+    pendientes de enviarse en el siguiente resumen; así no hace falta
+    marcar cada fila de la tabla de notificaciones.
+    """
+    
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='envio_resumen_email',
+        verbose_name="Usuario"
+    )
+    
+    ultima_notificacion_id = models.BigIntegerField(
+        default=0,
+        verbose_name="Última Notificación Enviada"
+    )
+    
+    fecha_envio = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Fecha del Último Envío"
+    )
+    
+    class Meta:
+        verbose_name = "Envío de Resumen por Email"
+        verbose_name_plural = "Envíos de Resúmenes por Email"
+        db_table = "envio_resumen_email"
+    
+    def __str__(self):
+        return f"Resumen de {self.usuario_id} hasta {self.ultima_notificacion_id}"
+
+
+class NotificacionArchivada(models.Model):
+    """
+    Notificación retirada de la tabla principal por la política de
+    retención (``manage.py purgar_notificaciones --archivar tabla``).
+    Tabla fría: conserva el id original y los ids de usuario y reporte sin
+    llaves foráneas ni índices secundarios, así que no frena las escrituras
+    ni los borrados de las tablas relacionadas.
+    """
+    
+    id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="ID Original"
+    )
+    
+    usuario_id = models.BigIntegerField(
+        verbose_name="ID de Usuario"
+    )
+    
+    reporte_id = models.UUIDField(
+        null=True,
+        verbose_name="ID de Reporte"
+    )
+    
+    tipo = models.CharField(
+        max_length=20,
+        verbose_name="Tipo de Notificación"
+    )
+    
+    titulo = models.CharField(
+        max_length=200,
+        verbose_name="Título"
+    )
+    
+    mensaje = models.TextField(
+        verbose_name="Mensaje"
+    )
+    
+    url = models.URLField(
+        blank=True,
+        verbose_name="URL de Referencia"
+    )
+    
+    leida = models.BooleanField(
+        verbose_name="Leída"
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        verbose_name="Fecha de Creación"
+    )
+    
+    fecha_lectura = models.DateTimeField(
+        null=True,
+        verbose_name="Fecha de Lectura"
+    )
+    
+    fecha_archivo = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Fecha de Archivo"
+    )
+    
+    class Meta:
+        verbose_name = "Notificación Archivada"
+        verbose_name_plural = "Notificaciones Archivadas"
+        db_table = "notificacion_archivada"
+    
+    def __str__(self):
+        return f"Notificación archivada {self.id} de {self.usuario_id}"
+
+
+class Tarea(models.Model):
+    """
+    Tarea de la cola de trabajo en segundo plano.
+    Las señales encolan tareas y el comando ``procesar_cola`` las ejecuta
+    fuera del ciclo de la petición HTTP.
+    """
+    
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    tipo = models.CharField(
+        max_length=50,
+        verbose_name="Tipo de Tarea"
+    )
+    
+    datos = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Datos"
+    )
+    
+    estado = models.CharField(
+        max_length=12,
+        choices=ESTADO_CHOICES,
+        default='pendiente',
+        verbose_name="Estado"
+    )
+    
+    intentos = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Intentos"
+    )
+    
+    max_intentos = models.PositiveIntegerField(
+        default=5,
+        verbose_name="Máximo de Intentos"
+    )
+    
+    disponible_desde = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Disponible Desde"
+    )
+    
+    fecha_creacion = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Fecha de Creación"
+    )
+    
+    fecha_inicio = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Fecha de Inicio"
+    )
+    
+    bloqueada_por = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Bloqueada Por"
+    )
+    
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name="Último Error"
+    )
+    
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        db_table = "tarea"
+        ordering = ['disponible_desde']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo} ({self.get_estado_display()})"
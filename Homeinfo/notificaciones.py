@@ -0,0 +1,76 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from pawtohome import eventos
+from .contadores import sumar_no_leidas
+from .models import Notificacion
+
+# Número de filas por INSERT cuando no se configura NOTIFICACIONES_TAMANO_LOTE
+TAMANO_LOTE_NOTIFICACIONES = 500
+
+
+def serializar_notificacion(notificacion):
+    return {
+        'id': notificacion.id,
+        'tipo': notificacion.tipo,
+        'titulo': notificacion.titulo,
+        'mensaje': notificacion.mensaje,
+        'url': notificacion.url,
+        'reporte_id': str(notificacion.reporte_id) if notificacion.reporte_id else None,
+        'leida': notificacion.leida,
+        'fecha_creacion': notificacion.fecha_creacion.isoformat(),
+    }
+
+
+def publicar_notificaciones(notificaciones):
+    """Publica cada notificación en el canal de eventos de su usuario"""
+    for notificacion in notificaciones:
+        eventos.publicar(eventos.canal_usuario(notificacion.usuario_id), serializar_notificacion(notificacion))
+
+
+class EscritorNotificaciones:
+    """
+    Acumula notificaciones en memoria y las inserta con bulk_create en
+    lotes de ``tamano_lote`` filas, en lugar de un INSERT por notificación.
+
+    Puede usarse como context manager; al salir sin errores se insertan
+    las notificaciones pendientes.
+    """
+
+    def __init__(self, tamano_lote=None):
+        self.tamano_lote = tamano_lote or getattr(
+            settings, 'NOTIFICACIONES_TAMANO_LOTE', TAMANO_LOTE_NOTIFICACIONES
+        )
+        self._pendientes = []
+        self.total_creadas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.vaciar()
+        else:
+            self._pendientes = []
+
+    def agregar(self, **campos):
+        """Agrega una notificación a la cola y vacía el lote si está lleno"""
+        self._pendientes.append(Notificacion(**campos))
+        if len(self._pendientes) >= self.tamano_lote:
+            self.vaciar()
+
+    def vaciar(self):
+        """Inserta las notificaciones pendientes y retorna las creadas"""
+        if not self._pendientes:
+            return []
+        pendientes, self._pendientes = self._pendientes, []
+        with transaction.atomic():
+            creadas = Notificacion.objects.bulk_create(pendientes, batch_size=self.tamano_lote)
+            sumar_no_leidas(Counter(
+                notificacion.usuario_id for notificacion in creadas if not notificacion.leida
+            ))
+            # bulk_create no envía post_save: se publican aquí, una vez confirmadas
+            transaction.on_commit(lambda: publicar_notificaciones(creadas))
+        self.total_creadas += len(creadas)
+        return creadas
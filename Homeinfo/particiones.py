@@ -0,0 +1,196 @@
+"""
+Particionado mensual de la tabla de notificaciones (solo PostgreSQL).
+
+``convertir()`` reemplaza la tabla ``notificacion`` por una tabla
+particionada por rango de ``fecha_creacion`` con una partición por mes
+(``notificacion_AAAA_MM``) y una partición por defecto para lo que quede
+fuera. La llave primaria pasa a ser (id, fecha_creacion), como exige
+PostgreSQL; los ids siguen saliendo de una secuencia, así que para Django
+``id`` sigue siendo único.
+
+Con la tabla particionada, la retención quita meses completos con
+``DETACH PARTITION`` + ``DROP TABLE`` en lugar de borrar fila por fila.
+Las particiones de los meses siguientes deben existir antes de que
+lleguen notificaciones de ese mes; ``purgar_notificaciones`` las crea en
+cada corrida.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+from .contadores import sumar_no_leidas
+from .models import Notificacion
+
+TABLA = Notificacion._meta.db_table
+TABLA_ANTERIOR = f'{TABLA}_sin_particion'
+SECUENCIA = f'{TABLA}_particionada_id_seq'
+PARTICION_DEFECTO = f'{TABLA}_default'
+
+_NOMBRE_PARTICION = re.compile(rf'^{TABLA}_(\d{{4}})_(\d{{2}})$')
+
+
+def inicio_de_mes(fecha):
+    return datetime(fecha.year, fecha.month, 1, tzinfo=dt_timezone.utc)
+
+
+def sumar_meses(fecha, meses):
+    """Retorna el primer día del mes ``meses`` después del de ``fecha``"""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return datetime(indice // 12, indice % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def restar_meses(fecha, meses):
+    """Retorna ``fecha`` menos ``meses`` meses (el día se limita al último del mes)"""
+    mes = sumar_meses(fecha, -meses)
+    siguiente = sumar_meses(mes, 1)
+    dia = min(fecha.day, (siguiente - mes).days)
+    return fecha.replace(year=mes.year, month=mes.month, day=dia)
+
+
+def nombre_particion(mes):
+    return f'{TABLA}_{mes:%Y_%m}'
+
+
+def esta_particionada():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLA]
+        )
+        return cursor.fetchone() is not None
+
+
+def particiones():
+    """Retorna [(nombre, inicio, fin)] de las particiones mensuales, de la más antigua a la más nueva"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass", [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    resultado = []
+    for nombre in nombres:
+        coincidencia = _NOMBRE_PARTICION.match(nombre)
+        if coincidencia:
+            inicio = datetime(int(coincidencia[1]), int(coincidencia[2]), 1, tzinfo=dt_timezone.utc)
+            resultado.append((nombre, inicio, sumar_meses(inicio, 1)))
+    return sorted(resultado, key=lambda particion: particion[1])
+
+
+def crear_particiones(desde, hasta):
+    """Crea las particiones de los meses de ``desde`` a ``hasta`` (inclusive) que falten"""
+    mes = inicio_de_mes(desde)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        while mes <= hasta:
+            siguiente = sumar_meses(mes, 1)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {quote(nombre_particion(mes))} "
+                f"PARTITION OF {quote(TABLA)} "
+                f"FOR VALUES FROM ('{mes:%Y-%m-%d} 00:00:00+00') TO ('{siguiente:%Y-%m-%d} 00:00:00+00')"
+            )
+            mes = siguiente
+
+
+def eliminar_particion(nombre, inicio, fin, tamano_lote=1000, archivar=None):
+    """
+    Quita la partición ``nombre`` (mes de ``inicio`` a ``fin``) y la
+    elimina. Si se indica ``archivar``, antes se le pasan sus filas por
+    lotes. Descuenta de los contadores las no leídas que contenía.
+    Retorna el número de filas eliminadas.
+    """
+    from .retencion import CAMPOS_ARCHIVO
+
+    del_mes = Notificacion.objects.filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+    if archivar is not None:
+        ultimo_id = 0
+        while True:
+            filas = list(
+                del_mes.filter(pk__gt=ultimo_id).order_by('pk').values(*CAMPOS_ARCHIVO)[:tamano_lote]
+            )
+            if not filas:
+                break
+            archivar(filas)
+            ultimo_id = filas[-1]['id']
+
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {quote(TABLA)} DETACH PARTITION {quote(nombre)}")
+        cursor.execute(
+            f"SELECT usuario_id, COUNT(*) FILTER (WHERE NOT leida), COUNT(*) "
+            f"FROM {quote(nombre)} GROUP BY usuario_id"
+        )
+        por_usuario = cursor.fetchall()
+        cursor.execute(f"DROP TABLE {quote(nombre)}")
+        sumar_no_leidas({usuario_id: -no_leidas for usuario_id, no_leidas, _ in por_usuario})
+    return sum(total for _, _, total in por_usuario)
+
+
+def convertir(meses_adelante=3):
+    """
+    Convierte la tabla de notificaciones en una tabla particionada por mes.
+    Copia todas las filas dentro de una sola transacción con la tabla
+    bloqueada: debe ejecutarse en una ventana de mantenimiento.
+    """
+    if connection.vendor != 'postgresql':
+        raise ImproperlyConfigured(
+            f"El particionado solo está disponible en PostgreSQL; la base de datos es {connection.vendor}."
+        )
+    if esta_particionada():
+        return False
+
+    quote = connection.ops.quote_name
+    tabla, anterior, secuencia = quote(TABLA), quote(TABLA_ANTERIOR), quote(SECUENCIA)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {tabla} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"ALTER TABLE {tabla} RENAME TO {anterior}")
+
+        # Índices, llaves foráneas y llave primaria se recrean con sus nombres
+        # después de eliminar la tabla anterior, que los conserva al renombrarla
+        cursor.execute(
+            "SELECT i.indexdef FROM pg_indexes i "
+            "WHERE i.tablename = %s AND i.indexname NOT IN ("
+            "  SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+            [TABLA_ANTERIOR, anterior],
+        )
+        indices = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'f')", [anterior]
+        )
+        restricciones = cursor.fetchall()
+
+        cursor.execute(
+            f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (fecha_creacion)"
+        )
+        # Las columnas identity no se admiten en tablas particionadas antes de PostgreSQL 17
+        cursor.execute(f"CREATE SEQUENCE {secuencia} OWNED BY {tabla}.id")
+        cursor.execute(f"ALTER TABLE {tabla} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)", [SECUENCIA])
+
+        cursor.execute(f"SELECT MIN(fecha_creacion), MAX(id) FROM {anterior}")
+        mas_antigua, ultimo_id = cursor.fetchone()
+        ahora = datetime.now(dt_timezone.utc)
+        crear_particiones(mas_antigua or ahora, sumar_meses(ahora, meses_adelante))
+        cursor.execute(f"CREATE TABLE {quote(PARTICION_DEFECTO)} PARTITION OF {tabla} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {tabla} SELECT * FROM {anterior}")
+        cursor.execute("SELECT setval(%s::regclass, %s, false)", [SECUENCIA, (ultimo_id or 0) + 1])
+        cursor.execute(f"DROP TABLE {anterior}")
+
+        for nombre, tipo, definicion in restricciones:
+            if tipo == 'p':
+                cursor.execute(
+                    f"ALTER TABLE {tabla} ADD CONSTRAINT {quote(nombre)} PRIMARY KEY (id, fecha_creacion)"
+                )
+        for definicion in indices:
+            cursor.execute(re.sub(
+                rf' ON (?:\S+\.)?"?{re.escape(TABLA_ANTERIOR)}"? ', f' ON {tabla} ', definicion
+            ))
+        for nombre, tipo, definicion in restricciones:
+            if tipo == 'f':
+                cursor.execute(f"ALTER TABLE {tabla} ADD CONSTRAINT {quote(nombre)} {definicion}")
+    return True
@@ -0,0 +1,142 @@
+"""
+Resúmenes de notificaciones por email.
+
+En lugar de un correo por notificación, ``enviar_resumenes()`` agrupa las
+notificaciones no leídas de cada usuario con ``notificaciones_email``
+activo y le envía un solo correo como máximo cada
+``RESUMEN_EMAIL_VENTANA_MINUTOS``. Los correos se envían en lotes de
+``RESUMEN_EMAIL_LOTE`` mensajes por la misma conexión SMTP, abierta una
+vez por corrida; las plantillas se cargan una vez y cada resumen se
+genera con una sola pasada de render.
+
+Lo ya enviado se recuerda por usuario en ``EnvioResumenEmail`` (id de la
+última notificación incluida). La marca se actualiza después de enviar
+cada lote, así que si el envío falla el lote se reintenta en la
+siguiente corrida.
+"""
+import time
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core import mail
+from django.db.models import F, Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import EnvioResumenEmail, Notificacion
+
+VENTANA_MINUTOS = 60
+ANTIGUEDAD_HORAS = 48
+TAMANO_LOTE = 100
+
+# Notificaciones listadas en un correo; las demás se resumen como "y N más"
+MAXIMO_POR_RESUMEN = 20
+
+
+def pendientes(ahora=None, ventana_minutos=None, antiguedad_horas=None):
+    """
+    Queryset de las notificaciones no leídas que aún no se enviaron por
+    email, de usuarios que quieren recibirlas y cuyo último resumen salió
+    hace más de ``ventana_minutos``.
+    """
+    ahora = ahora or timezone.now()
+    if ventana_minutos is None:
+        ventana_minutos = getattr(settings, 'RESUMEN_EMAIL_VENTANA_MINUTOS', VENTANA_MINUTOS)
+    if antiguedad_horas is None:
+        antiguedad_horas = getattr(settings, 'RESUMEN_EMAIL_ANTIGUEDAD_HORAS', ANTIGUEDAD_HORAS)
+
+    return Notificacion.objects.filter(
+        leida=False,
+        fecha_creacion__gte=ahora - timedelta(hours=antiguedad_horas),
+        usuario__is_active=True,
+        usuario__configuracion__notificaciones_email=True,
+    ).exclude(usuario__email='').filter(
+        Q(usuario__envio_resumen_email__isnull=True) |
+        Q(
+            usuario__envio_resumen_email__fecha_envio__lte=ahora - timedelta(minutes=ventana_minutos),
+            pk__gt=F('usuario__envio_resumen_email__ultima_notificacion_id'),
+        )
+    )
+
+
+def _mensaje(plantillas, filas, sitio_url, conexion):
+    primera = filas[0]
+    total = len(filas)
+    contexto = {
+        'nombre': primera['usuario__first_name'] or primera['usuario__username'],
+        'notificaciones': filas[:MAXIMO_POR_RESUMEN],
+        'restantes': max(0, total - MAXIMO_POR_RESUMEN),
+        'total': total,
+        'sitio_url': sitio_url,
+    }
+    texto, html = plantillas
+    mensaje = mail.EmailMultiAlternatives(
+        subject=f"{total} notificación(es) nueva(s) en PawsToHome",
+        body=texto.render(contexto),
+        to=[primera['usuario__email']],
+        connection=conexion,
+    )
+    mensaje.attach_alternative(html.render(contexto), 'text/html')
+    return mensaje
+
+
+def enviar_resumenes(conexion=None, tamano_lote=None, ventana_minutos=None, antiguedad_horas=None):
+    """
+    Envía los resúmenes pendientes y retorna un diccionario con los
+    mensajes y notificaciones enviados, los segundos que tomó y el
+    rendimiento en mensajes por segundo.
+    """
+    ahora = timezone.now()
+    tamano_lote = tamano_lote or getattr(settings, 'RESUMEN_EMAIL_LOTE', TAMANO_LOTE)
+    sitio_url = getattr(settings, 'SITIO_URL', '').rstrip('/')
+    plantillas = (get_template('Homeinfo/email/resumen.txt'), get_template('Homeinfo/email/resumen.html'))
+
+    queryset = pendientes(ahora, ventana_minutos, antiguedad_horas)
+    usuarios = list(queryset.order_by('usuario_id').values_list('usuario_id', flat=True).distinct())
+
+    conexion = conexion or mail.get_connection()
+    mensajes_enviados = notificaciones_enviadas = 0
+    inicio = time.perf_counter()
+    conexion.open()
+    try:
+        for i in range(0, len(usuarios), tamano_lote):
+            filas = queryset.filter(usuario_id__in=usuarios[i:i + tamano_lote]).order_by(
+                'usuario_id', 'pk'
+            ).values(
+                'pk', 'usuario_id', 'titulo', 'mensaje', 'url',
+                'usuario__email', 'usuario__first_name', 'usuario__username',
+            )
+            mensajes = []
+            marcas = []
+            for usuario_id, del_usuario in groupby(filas, key=itemgetter('usuario_id')):
+                del_usuario = list(del_usuario)
+                mensajes.append(_mensaje(plantillas, del_usuario, sitio_url, conexion))
+                marcas.append(EnvioResumenEmail(
+                    usuario_id=usuario_id,
+                    ultima_notificacion_id=del_usuario[-1]['pk'],
+                    fecha_envio=ahora,
+                ))
+                notificaciones_enviadas += len(del_usuario)
+            if not mensajes:
+                continue
+
+            conexion.send_messages(mensajes)
+            EnvioResumenEmail.objects.bulk_create(
+                marcas,
+                update_conflicts=True,
+                unique_fields=['usuario'],
+                update_fields=['ultima_notificacion_id', 'fecha_envio'],
+            )
+            mensajes_enviados += len(mensajes)
+    finally:
+        conexion.close()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'mensajes': mensajes_enviados,
+        'notificaciones': notificaciones_enviadas,
+        'segundos': segundos,
+        'mensajes_por_segundo': mensajes_enviados / segundos if segundos else 0.0,
+    }
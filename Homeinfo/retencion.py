@@ -0,0 +1,146 @@
+"""
+Retención de notificaciones.
+
+La política tiene dos reglas:
+
+- Las notificaciones leídas se eliminan ``RETENCION_NOTIFICACIONES_LEIDAS_DIAS``
+  días después de creadas.
+- Todas, leídas o no, se eliminan ``RETENCION_NOTIFICACIONES_MESES`` meses
+  después de creadas; los contadores de no leídas se ajustan.
+
+``purgar()`` borra en lotes pequeños recorriendo la llave primaria, cada
+lote en su propia transacción, para no bloquear la tabla ni generar una
+transacción enorme. Antes de borrar, cada lote puede archivarse en la
+tabla fría ``notificacion_archivada`` o en un archivo JSONL comprimido
+con gzip (un miembro gzip por lote; ``zcat`` los lee como un solo
+archivo). Si la tabla está particionada por mes (``particiones``), los
+meses completos fuera de la segunda regla se eliminan quitando la
+partición.
+"""
+import gzip
+import json
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import particiones
+from .contadores import sumar_no_leidas
+from .models import Notificacion, NotificacionArchivada
+
+RETENCION_LEIDAS_DIAS = 90
+RETENCION_MESES = 12
+
+TAMANO_LOTE = 1000
+
+CAMPOS_ARCHIVO = [
+    'id', 'usuario_id', 'reporte_id', 'tipo', 'titulo', 'mensaje', 'url',
+    'leida', 'fecha_creacion', 'fecha_lectura',
+]
+
+
+def limites(ahora=None, dias_leidas=None, meses=None):
+    """Retorna (limite_leidas, limite_todas): se purga lo creado antes de cada fecha"""
+    ahora = ahora or timezone.now()
+    if dias_leidas is None:
+        dias_leidas = getattr(settings, 'RETENCION_NOTIFICACIONES_LEIDAS_DIAS', RETENCION_LEIDAS_DIAS)
+    if meses is None:
+        meses = getattr(settings, 'RETENCION_NOTIFICACIONES_MESES', RETENCION_MESES)
+    return ahora - timedelta(days=dias_leidas), particiones.restar_meses(ahora, meses)
+
+
+def vencidas(limite_leidas, limite_todas):
+    """Queryset de las notificaciones que la política permite eliminar"""
+    return Notificacion.objects.filter(
+        Q(leida=True, fecha_creacion__lt=limite_leidas) | Q(fecha_creacion__lt=limite_todas)
+    )
+
+
+class ArchivoJSONL:
+    """Agrega lotes de notificaciones a un archivo JSONL comprimido con gzip"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def __call__(self, filas):
+        with gzip.open(self.ruta, 'at', encoding='utf-8') as archivo:
+            for fila in filas:
+                archivo.write(json.dumps(fila, default=str, ensure_ascii=False))
+                archivo.write('\n')
+
+
+def archivar_en_tabla(filas):
+    """Copia un lote de notificaciones a la tabla fría"""
+    NotificacionArchivada.objects.bulk_create(
+        [NotificacionArchivada(**fila) for fila in filas],
+        # Un lote reintentado tras un fallo no duplica filas
+        ignore_conflicts=True,
+    )
+
+
+def purgar_lote(queryset, ultimo_id, tamano_lote, archivar=None):
+    """
+    Elimina hasta ``tamano_lote`` filas de ``queryset`` con id mayor que
+    ``ultimo_id`` en una transacción. Retorna (eliminadas, nuevo_ultimo_id);
+    nuevo_ultimo_id es None si no quedaban filas.
+    """
+    with transaction.atomic():
+        filas = list(
+            queryset.filter(pk__gt=ultimo_id)
+            .order_by('pk')
+            .select_for_update()
+            .values(*CAMPOS_ARCHIVO)[:tamano_lote]
+        )
+        if not filas:
+            return 0, None
+        if archivar is not None:
+            archivar(filas)
+        Notificacion.objects.filter(pk__in=[fila['id'] for fila in filas]).delete()
+        sumar_no_leidas({
+            usuario_id: -total
+            for usuario_id, total in Counter(fila['usuario_id'] for fila in filas if not fila['leida']).items()
+        })
+    return len(filas), filas[-1]['id']
+
+
+def purgar(limite_leidas, limite_todas, tamano_lote=TAMANO_LOTE, archivar=None, pausa=0.0,
+           usar_particiones=True, meses_adelante=3):
+    """
+    Aplica la política de retención. Retorna un diccionario con el número
+    de filas eliminadas y los nombres de las particiones eliminadas.
+    Con la tabla particionada crea además las particiones de los próximos
+    ``meses_adelante`` meses.
+    """
+    resultado = {'eliminadas': 0, 'particiones': []}
+
+    if usar_particiones and particiones.esta_particionada():
+        ahora = timezone.now()
+        particiones.crear_particiones(ahora, particiones.sumar_meses(ahora, meses_adelante))
+        for nombre, inicio, fin in particiones.particiones():
+            if fin <= limite_todas:
+                resultado['eliminadas'] += particiones.eliminar_particion(
+                    nombre, inicio, fin, tamano_lote=tamano_lote, archivar=archivar
+                )
+                resultado['particiones'].append(nombre)
+
+    queryset = vencidas(limite_leidas, limite_todas)
+    # Las filas creadas después del inicio de la purga no se recorren
+    ultimo_posible = Notificacion.objects.filter(
+        fecha_creacion__lt=max(limite_leidas, limite_todas)
+    ).aggregate(maximo=Max('pk'))['maximo']
+    if ultimo_posible is None:
+        return resultado
+    queryset = queryset.filter(pk__lte=ultimo_posible)
+
+    ultimo_id = 0
+    while True:
+        eliminadas, ultimo_id = purgar_lote(queryset, ultimo_id, tamano_lote, archivar)
+        if ultimo_id is None:
+            return resultado
+        resultado['eliminadas'] += eliminadas
+        if pausa:
+            time.sleep(pausa)
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Notificacion
+from .notificaciones import publicar_notificaciones
+
+@receiver(post_save, sender=Notificacion)
+def publicar_notificacion(sender, instance, created, **kwargs):
+    """
+    Signal para enviar a las conexiones en tiempo real del usuario una
+    notificación creada individualmente (las de EscritorNotificaciones se
+    publican al insertar el lote)
+    """
+    if created:
+        transaction.on_commit(lambda: publicar_notificaciones([instance]))
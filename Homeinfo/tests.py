@@ -1,3 +1,916 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Mapservice.models import CeldaCalor
+from ProfileService.models import ConfiguracionUsuario
+from pawtohome import cache_respuestas, eventos
+from pawtohome.instrumentacion import InstrumentacionSQLMiddleware, huella, metricas
+from pawtohome.paginacion import PaginadorEstimado, codificar_cursor
+from reportsservice.models import (
+    Avistamiento, CoincidenciaReporte, Comentario, FotoReporte, Raza, Reporte,
+)
+from .admin import NotificacionAdmin
+from . import cola, contadores, particiones, resumenes, retencion
+from .models import ContadorNotificaciones, Notificacion, NotificacionArchivada, Tarea
+from .notificaciones import EscritorNotificaciones
 
 # Create your tests here.
+
+class BandejaNotificacionesTests(TestCase):
+    """Pruebas de la bandeja de notificaciones y de marcarlas como leídas"""
+
+    def setUp(self):
+        modelo = get_user_model()
+        self.usuario = modelo.objects.create_user(username='vecino', phone_number='5512345678')
+        self.otro = modelo.objects.create_user(username='otro', phone_number='5512345679')
+        ahora = timezone.now()
+        self.notificaciones = Notificacion.objects.bulk_create([
+            Notificacion(usuario=self.usuario, tipo='sistema', titulo=f'Aviso {i}', mensaje='Mensaje',
+                         fecha_creacion=ahora - timedelta(minutes=i))
+            for i in range(5)
+        ])
+        self.ajena = Notificacion.objects.create(usuario=self.otro, tipo='sistema', titulo='Ajena', mensaje='M')
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def marcar(self, datos):
+        return self.client.post(
+            reverse('Homeinfo:marcar_notificaciones_leidas'), json.dumps(datos), content_type='application/json'
+        )
+
+    def test_pagina_por_cursor_solo_las_del_usuario(self):
+        titulos = []
+        parametros = {'limite': 2}
+        while True:
+            datos = self.client.get(reverse('Homeinfo:notificaciones'), parametros).json()
+            titulos += [notificacion['titulo'] for notificacion in datos['resultados']]
+            if datos['siguiente'] is None:
+                break
+            parametros['cursor'] = datos['siguiente']
+        self.assertEqual(titulos, [f'Aviso {i}' for i in range(5)])
+        self.assertEqual(datos['no_leidas'], 5)
+
+    def test_parametros_invalidos_de_la_bandeja(self):
+        url = reverse('Homeinfo:notificaciones')
+        casos = [
+            ({'limite': 'muchos'}, "El parámetro 'limite' debe ser numérico."),
+            ({'cursor': 'basura'}, 'El cursor no es válido.'),
+            ({'cursor': codificar_cursor(timezone.now(), 'no-es-un-id')}, 'El cursor no es válido.'),
+            ({'tipo': 'desconocido'}, "El parámetro 'tipo' no es válido."),
+            ({'leida': 'quizas'}, "El parámetro 'leida' debe ser true o false."),
+        ]
+        for parametros, mensaje in casos:
+            with self.subTest(parametros=parametros):
+                respuesta = self.client.get(url, parametros)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(respuesta.json()['error'], mensaje)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_marcar_por_ids_solo_afecta_las_propias(self):
+        ids = [self.notificaciones[0].pk, self.notificaciones[1].pk, self.ajena.pk]
+        datos = self.marcar({'ids': ids}).json()
+        self.assertEqual(datos, {'actualizadas': 2, 'no_leidas': 3})
+        self.assertFalse(Notificacion.objects.get(pk=self.ajena.pk).leida)
+
+        # Marcar de nuevo no descuenta dos veces
+        self.assertEqual(self.marcar({'ids': ids}).json(), {'actualizadas': 0, 'no_leidas': 3})
+        self.assertEqual(
+            self.client.get(reverse('Homeinfo:notificaciones'), {'leida': 'false'}).json()['no_leidas'], 3
+        )
+
+    def test_marcar_todas_desde_formulario(self):
+        respuesta = self.client.post(reverse('Homeinfo:marcar_notificaciones_leidas'), {'todas': 'true'})
+        self.assertEqual(respuesta.json(), {'actualizadas': 5, 'no_leidas': 0})
+        self.assertFalse(Notificacion.objects.filter(usuario=self.usuario, leida=False).exists())
+        self.assertIsNotNone(Notificacion.objects.filter(usuario=self.usuario).first().fecha_lectura)
+
+    def test_errores_al_marcar(self):
+        url = reverse('Homeinfo:marcar_notificaciones_leidas')
+        casos = [
+            ('{no es json', 'El cuerpo no es JSON válido.'),
+            ('[1, 2]', 'El cuerpo debe ser un objeto JSON.'),
+            ('{"ids": "12"}', "El parámetro 'ids' debe ser una lista de enteros."),
+            ('{"ids": ["uno"]}', "El parámetro 'ids' debe ser una lista de enteros."),
+            ('{}', "Indique 'ids' o 'todas'."),
+        ]
+        for cuerpo, mensaje in casos:
+            with self.subTest(cuerpo=cuerpo):
+                respuesta = self.client.post(url, cuerpo, content_type='application/json')
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(respuesta.json()['error'], mensaje)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_queryset_ajusta_contadores_de_cada_usuario(self):
+        ContadorNotificaciones.objects.create(usuario=self.usuario, no_leidas=5)
+        ContadorNotificaciones.objects.create(usuario=self.otro, no_leidas=1)
+
+        actualizadas = Notificacion.objects.filter(
+            pk__in=[self.notificaciones[0].pk, self.ajena.pk]
+        ).marcar_como_leidas()
+        self.assertEqual(actualizadas, 2)
+        self.assertEqual(
+            dict(ContadorNotificaciones.objects.values_list('usuario_id', 'no_leidas')),
+            {self.usuario.pk: 4, self.otro.pk: 0},
+        )
+
+
+class CacheRespuestasTests(TestCase):
+    """Pruebas del cache de respuestas cuando una invalidación llega durante la vista"""
+
+    def setUp(self):
+        cache.clear()
+        self.valor = 0
+        self.invalidar_durante = None
+
+        @cache_respuestas.cache_respuesta('prueba', etiquetas=('feed',))
+        def vista(request):
+            contenido = str(self.valor)
+            cache_respuestas.etiquetar(request, 'reporte:1')
+            if self.invalidar_durante:
+                # Otra petición confirma un cambio mientras se genera la respuesta
+                self.valor += 1
+                cache_respuestas.invalidar(self.invalidar_durante)
+                self.invalidar_durante = None
+            return HttpResponse(contenido)
+
+        self.vista = vista
+        self.request = RequestFactory().get('/prueba/')
+        self.request.user = AnonymousUser()
+
+    def test_respuesta_sin_cambios_se_reutiliza(self):
+        self.vista(self.request)
+        self.valor = 5
+        self.assertEqual(self.vista(self.request).content, b'0')
+
+    def test_invalidacion_durante_la_vista_no_queda_como_vigente(self):
+        for etiqueta in ('feed', 'reporte:1'):
+            with self.subTest(etiqueta=etiqueta):
+                cache.clear()
+                self.invalidar_durante = etiqueta
+                self.assertEqual(self.vista(self.request).content, str(self.valor - 1).encode())
+                self.assertEqual(self.vista(self.request).content, str(self.valor).encode())
+
+
+class InstrumentacionSQLTests(TestCase):
+    """Pruebas del middleware de instrumentación SQL y del endpoint de métricas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personal = get_user_model().objects.create_user(
+            username='personal', password='secreto123', phone_number='5512345678', is_staff=True
+        )
+
+    def setUp(self):
+        metricas.reiniciar()
+
+    def test_huella_agrupa_listas_in_de_distinta_longitud(self):
+        self.assertEqual(
+            huella('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            huella('SELECT 1 WHERE id IN (%s, %s)'),
+        )
+
+    def test_consultas_repetidas_se_reportan_como_n_mas_1(self):
+        def vista(request):
+            for pk in range(6):
+                list(Notificacion.objects.filter(pk=pk))
+            return HttpResponse()
+
+        middleware = InstrumentacionSQLMiddleware(vista)
+        with self.assertLogs('pawtohome.instrumentacion', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('6 ejecuciones', logs.output[0])
+        self.assertIn('pawtohome_sql_n_mas_1_total{vista="sin_ruta"} 1', metricas.texto_prometheus())
+
+    @override_settings(INSTRUMENTACION_SQL_MUESTREO=0)
+    def test_sin_muestreo_no_registra(self):
+        self.client.get('/reports/feed/')
+        self.assertNotIn('reportsservice:feed', metricas.texto_prometheus())
+
+    @override_settings(INSTRUMENTACION_METRICAS_TOKEN=None)
+    def test_endpoint_expone_histogramas_por_vista(self):
+        self.client.get('/reports/feed/')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.client.force_login(self.personal)
+        texto = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE pawtohome_sql_consultas histogram', texto)
+        self.assertIn('pawtohome_sql_consultas_count{vista="reportsservice:feed"} 1', texto)
+        self.assertIn('pawtohome_sql_segundos_bucket{vista="reportsservice:feed",le="+Inf"} 1', texto)
+
+
+class ChangelistsAdminTests(TestCase):
+    """Los changelists del admin hacen las mismas consultas con pocas o muchas filas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            username='administrador', password='secreto123', phone_number='5512345678'
+        )
+
+    def crear_filas(self, inicio, cantidad):
+        """Crea ``cantidad`` filas de cada modelo, cada una con su propio usuario y reporte"""
+        modelo = get_user_model()
+        usuarios = modelo.objects.bulk_create([
+            modelo(username=f'usuario{i}', phone_number=f'55{i:08d}') for i in range(inicio, inicio + cantidad)
+        ])
+        ConfiguracionUsuario.objects.crear_para_usuarios([usuario.pk for usuario in usuarios])
+        razas = Raza.objects.bulk_create([Raza(nombre=f'Raza {i}') for i in range(inicio, inicio + cantidad)])
+        ahora = timezone.now()
+        reportes = Reporte.objects.bulk_create([
+            Reporte(
+                usuario=usuario, raza=raza, tipo_reporte='perdido', nombre_perro='Firulais',
+                color='café', tamano='mediano', descripcion='Perro con collar',
+                latitud=19.43, longitud=-99.13, direccion='Calle 1', zona='Centro',
+                fecha_incidente=ahora, telefono_contacto='5512345678',
+                email_contacto='dueno@example.com',
+            )
+            for usuario, raza in zip(usuarios, razas)
+        ])
+        pares = list(zip(usuarios, reportes))
+        FotoReporte.objects.bulk_create([
+            FotoReporte(reporte=reporte, imagen=f'reportes/{reporte.pk}.jpg') for _, reporte in pares
+        ])
+        Avistamiento.objects.bulk_create([
+            Avistamiento(
+                reporte=reporte, usuario=usuario, latitud=19.43, longitud=-99.13,
+                direccion='Calle 1', fecha_avistamiento=ahora, descripcion='Visto', confianza=5,
+            )
+            for usuario, reporte in pares
+        ])
+        Comentario.objects.bulk_create([
+            Comentario(reporte=reporte, usuario=usuario, contenido='Lo vi') for usuario, reporte in pares
+        ])
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=usuario, reporte=reporte, tipo='nuevo_reporte', titulo='Nuevo', mensaje='Cerca')
+            for usuario, reporte in pares
+        ])
+        CoincidenciaReporte.objects.bulk_create([
+            CoincidenciaReporte(reporte=reporte, candidato=reportes[0], puntuacion=0.5,
+                                distancia_km=1.0, diferencia_horas=2.0)
+            for reporte in reportes[1:]
+        ])
+        Tarea.objects.bulk_create([Tarea(tipo='prueba') for _ in range(cantidad)])
+        CeldaCalor.objects.bulk_create([
+            CeldaCalor(zoom=10, columna=i, fila=i, peso=1, total=1) for i in range(inicio, inicio + cantidad)
+        ])
+
+    def consultas_por_changelist(self):
+        consultas = {}
+        for modelo in admin.site._registry:
+            url = reverse(f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}_changelist')
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, url)
+            consultas[modelo] = len(capturadas.captured_queries)
+        return consultas
+
+    def test_consultas_constantes_por_admin(self):
+        self.client.force_login(self.admin)
+        self.crear_filas(0, 2)
+        pocas = self.consultas_por_changelist()
+        self.crear_filas(2, 8)
+        muchas = self.consultas_por_changelist()
+
+        for modelo, consultas in pocas.items():
+            with self.subTest(admin=type(admin.site._registry[modelo]).__name__):
+                self.assertEqual(muchas[modelo], consultas)
+
+
+class ChangelistGrandeTests(TestCase):
+    """Pruebas del conteo estimado y la paginación por cursor del admin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            username='administrador', password='secreto123', phone_number='5512345678'
+        )
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=cls.admin, tipo='sistema', titulo=f'Aviso {i}', mensaje='Mensaje')
+            for i in range(NotificacionAdmin.list_per_page + 1)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_conteo_bajo_el_umbral_es_exacto(self):
+        paginador = PaginadorEstimado(Notificacion.objects.all(), 10, umbral=1000)
+        self.assertEqual(paginador.count, 101)
+        self.assertFalse(paginador.estimado)
+
+    def test_conteo_sobre_el_umbral_se_reutiliza_de_cache(self):
+        self.assertEqual(PaginadorEstimado(Notificacion.objects.all(), 10, umbral=100).count, 101)
+        Notificacion.objects.filter(titulo='Aviso 0').delete()
+
+        paginador = PaginadorEstimado(Notificacion.objects.all(), 10, umbral=100)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginador.count, 101)
+        self.assertTrue(paginador.estimado)
+        self.assertEqual(PaginadorEstimado(Notificacion.objects.all(), 10, umbral=100, exacto=True).count, 100)
+
+    @override_settings(ADMIN_CONTEO_UMBRAL=100)
+    def test_changelist_pagina_por_cursor(self):
+        url = reverse('admin:Homeinfo_notificacion_changelist')
+        respuesta = self.client.get(url)
+        cl = respuesta.context['cl']
+        self.assertTrue(cl.keyset)
+        self.assertEqual(len(cl.result_list), NotificacionAdmin.list_per_page)
+        self.assertIn('desde=', cl.url_siguiente)
+
+        segunda = self.client.get(url + cl.url_siguiente).context['cl']
+        self.assertEqual([n.titulo for n in segunda.result_list], ['Aviso 0'])
+        self.assertIsNone(segunda.url_siguiente)
+        self.assertTrue(segunda.conteo_estimado)
+
+        exacta = self.client.get(url + segunda.url_conteo_exacto).context['cl']
+        self.assertFalse(exacta.conteo_estimado)
+        self.assertEqual(exacta.result_count, 101)
+
+    @override_settings(ADMIN_CONTEO_UMBRAL=100)
+    def test_conteo_exacto_se_conserva_al_paginar(self):
+        url = reverse('admin:Homeinfo_notificacion_changelist')
+        primera = self.client.get(url, {'conteo': 'exacto'}).context['cl']
+        self.assertIn('conteo=exacto', primera.url_siguiente)
+
+        segunda = self.client.get(url + primera.url_siguiente).context['cl']
+        self.assertFalse(segunda.conteo_estimado)
+        self.assertEqual(segunda.result_count, 101)
+        self.assertIn('conteo=exacto', segunda.url_primera)
+
+    def test_pagina_por_cursor_sin_consultar_si_hay_siguiente(self):
+        url = reverse('admin:Homeinfo_notificacion_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            cl = self.client.get(url).context['cl']
+        self.assertIsNotNone(cl.url_siguiente)
+        tabla = Notificacion._meta.db_table
+        filas = [
+            q['sql'] for q in consultas
+            if f'FROM "{tabla}"' in q['sql'] and 'COUNT(' not in q['sql'].upper()
+        ]
+        self.assertEqual(len(filas), 1)
+        self.assertIn(f'LIMIT {NotificacionAdmin.list_per_page + 1}', filas[0])
+
+    def test_cursor_invalido_redirige_con_error(self):
+        respuesta = self.client.get(reverse('admin:Homeinfo_notificacion_changelist'), {'desde': 'basura'})
+        self.assertRedirects(respuesta, reverse('admin:Homeinfo_notificacion_changelist') + '?e=1',
+                             fetch_redirect_response=False)
+
+
+class RetencionNotificacionesTests(TestCase):
+    """Pruebas de la purga por lotes y el archivo de notificaciones"""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='vecino', phone_number='5512345678'
+        )
+        ahora = timezone.now()
+        casos = [
+            ('leida_antigua', True, 200),
+            ('no_leida_antigua', False, 200),
+            ('leida_reciente', True, 10),
+            ('no_leida_vencida', False, 400),
+        ]
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=self.usuario, tipo='sistema', titulo=titulo, mensaje='Mensaje',
+                         leida=leida, fecha_creacion=ahora - timedelta(days=dias))
+            for titulo, leida, dias in casos
+        ])
+        ContadorNotificaciones.objects.update_or_create(usuario=self.usuario, defaults={'no_leidas': 2})
+
+    def titulos(self, modelo=Notificacion):
+        return set(modelo.objects.values_list('titulo', flat=True))
+
+    def test_purga_leidas_vencidas_y_todas_las_muy_antiguas(self):
+        limite_leidas, limite_todas = retencion.limites(dias_leidas=90, meses=12)
+        resultado = retencion.purgar(limite_leidas, limite_todas, tamano_lote=1)
+
+        self.assertEqual(resultado['eliminadas'], 2)
+        self.assertEqual(self.titulos(), {'no_leida_antigua', 'leida_reciente'})
+        self.assertEqual(ContadorNotificaciones.objects.get(usuario=self.usuario).no_leidas, 1)
+
+    def test_archiva_en_tabla_fria(self):
+        call_command('purgar_notificaciones', '--archivar', 'tabla', stdout=StringIO())
+        self.assertEqual(self.titulos(NotificacionArchivada), {'leida_antigua', 'no_leida_vencida'})
+        self.assertEqual(
+            set(NotificacionArchivada.objects.values_list('usuario_id', flat=True)), {self.usuario.pk}
+        )
+
+    def test_archiva_notificacion_de_un_reporte(self):
+        reporte = Reporte.objects.create(
+            usuario=self.usuario, tipo_reporte='perdido', nombre_perro='Firulais', color='café',
+            tamano='mediano', descripcion='Perro con collar', latitud=19.43, longitud=-99.13,
+            direccion='Calle 1', zona='Centro', fecha_incidente=timezone.now(),
+            telefono_contacto='5512345678', email_contacto='dueno@example.com',
+        )
+        Notificacion.objects.filter(titulo='leida_antigua').update(reporte=reporte)
+
+        limite_leidas, limite_todas = retencion.limites(dias_leidas=90, meses=12)
+        retencion.purgar(limite_leidas, limite_todas, archivar=retencion.archivar_en_tabla)
+        self.assertEqual(NotificacionArchivada.objects.get(titulo='leida_antigua').reporte_id, reporte.pk)
+
+    def test_archiva_en_jsonl_comprimido(self):
+        descriptor, ruta = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(descriptor)
+        self.addCleanup(os.remove, ruta)
+
+        call_command('purgar_notificaciones', '--archivar', 'archivo', '--archivo', ruta, '--lote', '1',
+                     stdout=StringIO())
+        with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+            filas = [json.loads(linea) for linea in archivo]
+        self.assertEqual({fila['titulo'] for fila in filas}, {'leida_antigua', 'no_leida_vencida'})
+
+    def test_particionar_requiere_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("Solo aplica fuera de PostgreSQL")
+        with self.assertRaises(ImproperlyConfigured):
+            particiones.convertir()
+
+    def test_simular_no_elimina(self):
+        salida = StringIO()
+        call_command('purgar_notificaciones', '--simular', stdout=salida)
+        self.assertIn('2 notificación(es)', salida.getvalue())
+        self.assertEqual(Notificacion.objects.count(), 4)
+
+
+class BackendContado(locmem.EmailBackend):
+    """Backend en memoria que cuenta aperturas de conexión y envíos"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aperturas = 0
+        self.envios = 0
+
+    def open(self):
+        self.aperturas += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        self.envios += 1
+        return super().send_messages(messages)
+
+
+class ResumenesEmailTests(TestCase):
+    """Pruebas de los resúmenes de notificaciones por email"""
+
+    def setUp(self):
+        modelo = get_user_model()
+        self.usuarios = [
+            modelo.objects.create_user(
+                username=f'vecino{i}', email=f'vecino{i}@example.com',
+                phone_number=f'551234567{i}'
+            )
+            for i in range(3)
+        ]
+        self.sin_email = modelo.objects.create_user(
+            username='sin_email', phone_number='5500000000'
+        )
+        self.desactivado = modelo.objects.create_user(
+            username='desactivado', email='desactivado@example.com',
+            phone_number='5500000001'
+        )
+        ConfiguracionUsuario.objects.filter(usuario=self.desactivado).update(notificaciones_email=False)
+        for usuario in self.usuarios + [self.sin_email, self.desactivado]:
+            self.notificar(usuario, 2)
+
+    def notificar(self, usuario, cantidad, prefijo='Aviso'):
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=usuario, tipo='sistema', titulo=f'{prefijo} {i}', mensaje='Mensaje',
+                         url='/reportes/1/')
+            for i in range(cantidad)
+        ])
+
+    def test_un_resumen_por_usuario_en_lotes_por_una_conexion(self):
+        conexion = BackendContado()
+        resultado = resumenes.enviar_resumenes(conexion=conexion, tamano_lote=2)
+
+        self.assertEqual(resultado['mensajes'], 3)
+        self.assertEqual(resultado['notificaciones'], 6)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [u.email for u in self.usuarios])
+        self.assertEqual((conexion.aperturas, conexion.envios), (1, 2))
+        self.assertIn('Aviso 1', mail.outbox[0].body)
+        self.assertIn('http://localhost:8000/reportes/1/', mail.outbox[0].alternatives[0][0])
+
+    def test_respeta_la_ventana_y_solo_envia_lo_nuevo(self):
+        resumenes.enviar_resumenes()
+        self.notificar(self.usuarios[0], 1, prefijo='Nuevo')
+
+        self.assertEqual(resumenes.enviar_resumenes()['mensajes'], 0)
+
+        mail.outbox = []
+        resultado = resumenes.enviar_resumenes(ventana_minutos=0)
+        self.assertEqual(resultado['mensajes'], 1)
+        self.assertIn('Nuevo 0', mail.outbox[0].body)
+        self.assertNotIn('Aviso', mail.outbox[0].body)
+
+    def test_comando_reporta_rendimiento(self):
+        salida = StringIO()
+        call_command('enviar_resumenes_email', stdout=salida)
+        self.assertIn('3 resumen(es) con 6 notificación(es)', salida.getvalue())
+        self.assertIn('mensajes/s', salida.getvalue())
+
+
+class BrokerGrabado(eventos.Broker):
+    """Broker que guarda los eventos publicados"""
+
+    def __init__(self):
+        self.publicados = []
+
+    def publicar(self, canal, datos):
+        self.publicados.append((canal, datos))
+
+
+@override_settings(EVENTOS_LATIDO_SEGUNDOS=0.05)
+class EventosTiempoRealTests(TestCase):
+    """Pruebas del broker de eventos y del endpoint de Server-Sent Events"""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='oyente', phone_number='5512340000'
+        )
+
+    def tearDown(self):
+        eventos._brokers.clear()
+
+    async def test_broker_memoria_entrega_por_canal_desde_otro_hilo(self):
+        broker = eventos.BrokerMemoria()
+        suscripcion = broker.suscribir(['usuario:1', eventos.CANAL_MAPA], maximo=2)
+        otra = broker.suscribir(['usuario:2'])
+
+        hilo = threading.Thread(target=broker.publicar, args=('usuario:1', {'id': 1}))
+        hilo.start()
+        hilo.join()
+        self.assertEqual(await asyncio.wait_for(suscripcion.recibir(), 1), ('usuario:1', {'id': 1}))
+        self.assertTrue(otra.cola.empty())
+
+        # Con la cola llena se descarta el evento más viejo
+        for i in range(3):
+            broker.publicar(eventos.CANAL_MAPA, {'id': i})
+        self.assertEqual(suscripcion.descartados, 1)
+        self.assertEqual((await suscripcion.recibir())[1], {'id': 1})
+
+        suscripcion.cerrar()
+        self.assertEqual(broker.suscriptores(eventos.CANAL_MAPA), 0)
+
+    @override_settings(EVENTOS_BROKER='Homeinfo.tests.BrokerGrabado')
+    def test_notificaciones_se_publican_al_confirmar(self):
+        broker = eventos.obtener_broker()
+        with self.captureOnCommitCallbacks(execute=True):
+            with EscritorNotificaciones() as escritor:
+                escritor.agregar(usuario=self.usuario, tipo='sistema', titulo='Lote', mensaje='Mensaje')
+            Notificacion.objects.create(usuario=self.usuario, tipo='sistema', titulo='Sola', mensaje='Mensaje')
+            self.assertEqual(broker.publicados, [])
+
+        canal = eventos.canal_usuario(self.usuario.pk)
+        self.assertEqual(
+            [(c, datos['titulo']) for c, datos in broker.publicados], [(canal, 'Lote'), (canal, 'Sola')]
+        )
+
+    async def test_endpoint_envia_perdidas_eventos_y_latidos(self):
+        perdidas = [
+            await Notificacion.objects.acreate(usuario=self.usuario, tipo='sistema', titulo=f'N{i}', mensaje='M')
+            for i in range(2)
+        ]
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.usuario)
+        respuesta = await cliente.get(
+            reverse('Homeinfo:eventos'), {'bbox': '-100,19,-99,20'}, headers={'Last-Event-ID': str(perdidas[0].pk)}
+        )
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        contenido = aiter(respuesta.streaming_content)
+
+        async def siguiente():
+            return (await asyncio.wait_for(anext(contenido), 1)).decode()
+
+        self.assertTrue((await siguiente()).startswith('retry:'))
+        self.assertIn(f'id: {perdidas[1].pk}', await siguiente())
+
+        broker = eventos.obtener_broker()
+        broker.publicar(eventos.CANAL_MAPA, {'latitud': 45.0, 'longitud': -99.5})
+        broker.publicar(eventos.CANAL_MAPA, {'latitud': 19.5, 'longitud': -99.5})
+        broker.publicar(eventos.canal_usuario(self.usuario.pk + 1), {'id': 999})
+        self.assertIn('"latitud": 19.5', await siguiente())
+        self.assertEqual(await siguiente(), ': latido\n\n')
+        await contenido.aclose()
+
+    @override_settings(EVENTOS_SONDEO_SEGUNDOS=0.01, COLA_TAREAS_INMEDIATA=False)
+    async def test_endpoint_consulta_las_creadas_en_otro_proceso(self):
+        await Notificacion.objects.acreate(usuario=self.usuario, tipo='sistema', titulo='Vieja', mensaje='M')
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.usuario)
+        respuesta = await cliente.get(reverse('Homeinfo:eventos'), {'mapa': '0'})
+        contenido = aiter(respuesta.streaming_content)
+        self.assertTrue((await asyncio.wait_for(anext(contenido), 1)).decode().startswith('retry:'))
+
+        # bulk_create sin on_commit: como las crea procesar_cola, no se publican en este proceso
+        await Notificacion.objects.abulk_create([
+            Notificacion(usuario=self.usuario, tipo='sistema', titulo='Nueva', mensaje='M')
+        ])
+        evento = (await asyncio.wait_for(anext(contenido), 1)).decode()
+        self.assertIn('"titulo": "Nueva"', evento)
+        await contenido.aclose()
+
+    async def test_endpoint_requiere_sesion_sin_mapa(self):
+        respuesta = await AsyncClient().get(reverse('Homeinfo:eventos'), {'mapa': '0'})
+        self.assertEqual(respuesta.status_code, 401)
+
+
+class ManejadoresPruebaMixin:
+    """Registra manejadores de la cola solo durante la prueba"""
+
+    def registrar(self, tipo, funcion, lote=False):
+        cola.manejador(tipo, lote=lote)(funcion)
+        self.addCleanup(cola._manejadores.pop, tipo, None)
+        self.addCleanup(cola._manejadores_lote.discard, tipo)
+
+
+@override_settings(COLA_ESPERA_REINTENTO=10, COLA_TIEMPO_BLOQUEO=300)
+class ColaTareasTests(ManejadoresPruebaMixin, TestCase):
+    """Pruebas del reclamo, los reintentos y los manejadores por lote de la cola"""
+
+    def test_trabajadores_no_reclaman_la_misma_tarea(self):
+        Tarea.objects.bulk_create([Tarea(tipo='prueba', datos={'n': n}) for n in range(5)])
+
+        primeras = cola.reclamar_tareas(3, 'a')
+        segundas = cola.reclamar_tareas(3, 'b')
+
+        self.assertEqual(len(primeras), 3)
+        self.assertEqual(len(segundas), 2)
+        self.assertFalse({tarea.pk for tarea in primeras} & {tarea.pk for tarea in segundas})
+        self.assertEqual(cola.reclamar_tareas(3, 'c'), [])
+        self.assertTrue(all(tarea.intentos == 1 and tarea.bloqueada_por == 'a' for tarea in primeras))
+
+    def test_no_reclama_tareas_programadas_para_despues(self):
+        Tarea.objects.create(tipo='prueba', disponible_desde=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(cola.reclamar_tareas(10, 'a'), [])
+
+    def test_reclama_tareas_abandonadas(self):
+        tarea = Tarea.objects.create(tipo='prueba')
+        cola.reclamar_tareas(1, 'a')
+        self.assertEqual(cola.reclamar_tareas(1, 'b'), [])
+
+        Tarea.objects.filter(pk=tarea.pk).update(fecha_inicio=timezone.now() - timedelta(seconds=301))
+        [reclamada] = cola.reclamar_tareas(1, 'b')
+        self.assertEqual((reclamada.bloqueada_por, reclamada.intentos), ('b', 2))
+
+    def test_tarea_que_abandona_cada_intento_queda_fallida(self):
+        tarea = Tarea.objects.create(tipo='prueba', max_intentos=3)
+        for intento in range(1, 4):
+            [reclamada] = cola.reclamar_tareas(1, f'trabajador-{intento}')
+            self.assertEqual(reclamada.intentos, intento)
+            # El trabajador muere sin registrar el fallo
+            Tarea.objects.filter(pk=tarea.pk).update(fecha_inicio=timezone.now() - timedelta(seconds=301))
+
+        with self.assertLogs('Homeinfo.cola', 'ERROR'):
+            self.assertEqual(cola.reclamar_tareas(1, 'trabajador-4'), [])
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos, tarea.bloqueada_por), ('fallida', 3, ''))
+        self.assertIn('dejó de responder', tarea.ultimo_error)
+        self.assertEqual(cola.reclamar_tareas(1, 'trabajador-5'), [])
+
+    def test_reintento_con_espera_exponencial(self):
+        def falla(**datos):
+            raise RuntimeError('sin conexión')
+        self.registrar('prueba', falla)
+        tarea = Tarea.objects.create(tipo='prueba')
+
+        for intento, espera in [(1, 10), (2, 20), (3, 40)]:
+            Tarea.objects.filter(pk=tarea.pk).update(disponible_desde=timezone.now())
+            antes = timezone.now()
+            with self.assertLogs('Homeinfo.cola', 'ERROR'):
+                self.assertEqual(cola.procesar_lote(), (0, 1))
+            tarea.refresh_from_db()
+            self.assertEqual((tarea.estado, tarea.intentos, tarea.bloqueada_por), ('pendiente', intento, ''))
+            self.assertIn('sin conexión', tarea.ultimo_error)
+            self.assertGreaterEqual(tarea.disponible_desde, antes + timedelta(seconds=espera))
+            self.assertLess(tarea.disponible_desde, antes + timedelta(seconds=espera + 5))
+
+    def test_queda_fallida_al_agotar_intentos(self):
+        def falla(**datos):
+            raise RuntimeError('error permanente')
+        self.registrar('prueba', falla)
+        tarea = Tarea.objects.create(tipo='prueba', intentos=4, max_intentos=5)
+
+        with self.assertLogs('Homeinfo.cola', 'ERROR'):
+            cola.procesar_lote()
+
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 5))
+        self.assertEqual(cola.reclamar_tareas(10, 'a'), [])
+
+    def test_tarea_completada_se_elimina(self):
+        recibidos = []
+        self.registrar('prueba', lambda **datos: recibidos.append(datos))
+        Tarea.objects.create(tipo='prueba', datos={'n': 1})
+
+        self.assertEqual(cola.procesar_lote(), (1, 0))
+        self.assertEqual(recibidos, [{'n': 1}])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_fallo_en_lote_solo_afecta_a_la_tarea_culpable(self):
+        llamadas = []
+
+        def procesar(lote):
+            llamadas.append([datos['n'] for datos in lote])
+            Notificacion.objects.bulk_create([
+                Notificacion(usuario=self.usuario, tipo='sistema', titulo=str(datos['n']), mensaje='M')
+                for datos in lote
+            ])
+            if any(datos['n'] == 2 for datos in lote):
+                raise ValueError('dato inválido')
+        self.registrar('prueba_lote', procesar, lote=True)
+        self.usuario = get_user_model().objects.create_user(
+            username='cola', password='secreto123', phone_number='5512345678'
+        )
+        Tarea.objects.bulk_create([Tarea(tipo='prueba_lote', datos={'n': n}) for n in range(1, 4)])
+
+        with self.assertLogs('Homeinfo.cola', 'WARNING'):
+            self.assertEqual(cola.procesar_lote(), (2, 1))
+
+        self.assertEqual(llamadas, [[1, 2, 3], [1], [2], [3]])
+        # El intento fallido del lote completo se revirtió
+        self.assertEqual(
+            sorted(Notificacion.objects.values_list('titulo', flat=True)), ['1', '3']
+        )
+        fallida = Tarea.objects.get()
+        self.assertEqual((fallida.datos, fallida.estado), ({'n': 2}, 'pendiente'))
+        self.assertIn('dato inválido', fallida.ultimo_error)
+
+    def test_no_ejecuta_tareas_reclamadas_por_otro_trabajador(self):
+        recibidos = []
+
+        def primera(**datos):
+            recibidos.append(datos['n'])
+            # Otro trabajador reclama la segunda como si el bloqueo hubiera vencido
+            Tarea.objects.filter(datos__n=2).update(bloqueada_por='otro')
+        self.registrar('prueba', primera)
+        ahora = timezone.now()
+        Tarea.objects.create(tipo='prueba', datos={'n': 1}, disponible_desde=ahora - timedelta(seconds=2))
+        Tarea.objects.create(tipo='prueba', datos={'n': 2}, disponible_desde=ahora - timedelta(seconds=1))
+
+        self.assertEqual(cola.procesar_lote(trabajador='este'), (1, 0))
+        self.assertEqual(recibidos, [1])
+        self.assertEqual(Tarea.objects.get().bloqueada_por, 'otro')
+
+    def test_renovar_bloqueo(self):
+        Tarea.objects.bulk_create([Tarea(tipo='prueba'), Tarea(tipo='prueba')])
+        tareas = cola.reclamar_tareas(2, 'a')
+        Tarea.objects.filter(pk=tareas[1].pk).update(bloqueada_por='b')
+        Tarea.objects.update(fecha_inicio=timezone.now() - timedelta(seconds=200))
+
+        self.assertEqual(cola.renovar_bloqueo(tareas, 'a'), {tareas[0].pk})
+        renovada, ajena = Tarea.objects.get(pk=tareas[0].pk), Tarea.objects.get(pk=tareas[1].pk)
+        self.assertGreater(renovada.fecha_inicio, timezone.now() - timedelta(seconds=5))
+        self.assertLess(ajena.fecha_inicio, timezone.now() - timedelta(seconds=100))
+
+
+class LatidoColaTests(ManejadoresPruebaMixin, TransactionTestCase):
+    """El bloqueo de una tarea larga se renueva mientras se ejecuta"""
+
+    @override_settings(COLA_TIEMPO_BLOQUEO=0.3)
+    def test_tarea_larga_renueva_su_bloqueo(self):
+        def larga(**datos):
+            time.sleep(0.5)
+            raise RuntimeError('terminó')
+        self.registrar('prueba_larga', larga)
+        tarea = Tarea.objects.create(tipo='prueba_larga')
+
+        inicio = timezone.now()
+        with self.assertLogs('Homeinfo.cola', 'ERROR'):
+            cola.procesar_lote(trabajador='este')
+
+        # _registrar_fallo no toca fecha_inicio: la última renovación quedó
+        # registrada después de que venciera el bloqueo original
+        tarea.refresh_from_db()
+        self.assertGreater(tarea.fecha_inicio, inicio + timedelta(seconds=0.3))
+
+
+class ContadoresNoLeidasTests(TestCase):
+    """Pruebas del contador de notificaciones no leídas y su cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = get_user_model().objects.create_user(username='vecino', phone_number='5512345678')
+
+    def notificar(self, cantidad=1, usuario=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            with EscritorNotificaciones() as escritor:
+                for i in range(cantidad):
+                    escritor.agregar(usuario=usuario or self.usuario, tipo='sistema', titulo=f'Aviso {i}', mensaje='M')
+
+    def contador(self):
+        return ContadorNotificaciones.objects.get(usuario=self.usuario).no_leidas
+
+    def test_primera_lectura_crea_el_contador_y_la_siguiente_usa_el_cache(self):
+        Notificacion.objects.bulk_create([
+            Notificacion(usuario=self.usuario, tipo='sistema', titulo='Aviso', mensaje='M', leida=leida)
+            for leida in (False, False, True)
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 2)
+        self.assertEqual(self.contador(), 2)
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 2)
+
+    def test_nuevas_notificaciones_incrementan_y_descartan_el_cache(self):
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 0)
+        contadores.obtener_no_leidas(self.usuario.pk)
+
+        self.notificar(3)
+
+        self.assertEqual(self.contador(), 3)
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 3)
+
+    def test_marcar_como_leida_decrementa(self):
+        self.notificar(3)
+        contadores.obtener_no_leidas(self.usuario.pk)
+        notificacion = Notificacion.objects.filter(usuario=self.usuario).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notificacion.marcar_como_leida()
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 2)
+
+        # Marcarla otra vez no descuenta dos veces
+        with self.captureOnCommitCallbacks(execute=True):
+            Notificacion.objects.get(pk=notificacion.pk).marcar_como_leida()
+            Notificacion.objects.filter(usuario=self.usuario).marcar_como_leidas()
+        self.assertEqual(self.contador(), 0)
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notificacion.objects.filter(pk=notificacion.pk).marcar_como_no_leidas()
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 1)
+
+    def test_lectura_concurrente_con_un_cambio_no_guarda_un_valor_viejo(self):
+        self.notificar(2)
+        contadores.recalcular(self.usuario.pk)
+        cambios = []
+
+        def cambiar_durante_la_lectura(execute, sql, params, many, context):
+            resultado = execute(sql, params, many, context)
+            if 'contador_notificaciones' in sql and not cambios:
+                # Otro proceso confirma una notificación nueva justo después de la lectura
+                cambios.append(True)
+                self.notificar(1)
+            return resultado
+
+        with connection.execute_wrapper(cambiar_durante_la_lectura):
+            self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 2)
+
+        self.assertIsNone(cache.get(contadores.clave_cache(self.usuario.pk)))
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 3)
+
+    def test_recalcular_cuenta_al_escribir(self):
+        self.notificar(2)
+        ContadorNotificaciones.objects.filter(usuario=self.usuario).update(no_leidas=9)
+        cache.set(contadores.clave_cache(self.usuario.pk), 9)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(contadores.recalcular(self.usuario.pk), 2)
+        self.assertEqual(self.contador(), 2)
+        self.assertIsNone(cache.get(contadores.clave_cache(self.usuario.pk)))
+
+    def test_comando_reconciliar(self):
+        otro = get_user_model().objects.create_user(username='otro', phone_number='5512345679')
+        self.notificar(2)
+        self.notificar(1, usuario=otro)
+        contadores.obtener_no_leidas(self.usuario.pk)
+        contadores.obtener_no_leidas(otro.pk)
+        ContadorNotificaciones.objects.filter(usuario=self.usuario).update(no_leidas=7)
+        cache.set(contadores.clave_cache(self.usuario.pk), 7)
+
+        salida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconciliar_contadores', '--lote', '1', stdout=salida)
+
+        self.assertIn('1 contador(es) corregido(s)', salida.getvalue())
+        self.assertEqual(
+            dict(ContadorNotificaciones.objects.values_list('usuario_id', 'no_leidas')),
+            {self.usuario.pk: 2, otro.pk: 1},
+        )
+        self.assertEqual(contadores.obtener_no_leidas(self.usuario.pk), 2)
@@ -5,4 +5,8 @@ app_name = "Homeinfo"
 
 urlpatterns = [
     path('', views.home, name='home'),
-]
\ No newline at end of file
+    path('notificaciones/', views.bandeja_notificaciones, name='notificaciones'),
+    path('notificaciones/eventos/', views.eventos, name='eventos'),
+    path('notificaciones/marcar-leidas/', views.marcar_notificaciones_leidas, name='marcar_notificaciones_leidas'),
+    path('cache/estadisticas/', views.estadisticas_cache, name='estadisticas_cache'),
+]
@@ -1,7 +1,256 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET, require_POST
+
+from pawtohome import eventos as canales
+from pawtohome.cache_respuestas import cache_respuesta, estadisticas
+from pawtohome.paginacion import CursorInvalido, paginar_por_cursor
+from .contadores import obtener_no_leidas
+from .models import Notificacion
+from .notificaciones import serializar_notificacion
+
+LIMITE_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+LATIDO_SEGUNDOS = 20
+# Segundos entre consultas de notificaciones nuevas cuando el broker no las
+# recibe de procesar_cola (ver ``eventos``)
+SONDEO_SEGUNDOS = 5
+# Milisegundos que el navegador espera antes de reconectar el EventSource
+REINTENTO_MS = 3000
 
 # Create your views here.
 
+@cache_respuesta('home', parametros=())
 def home(request):
     """Vista principal de la aplicación PawsToHome"""
     return render(request, 'Homeinfo/home.html')
+
+def _no_autenticado():
+    return JsonResponse({'error': 'Debe iniciar sesión.'}, status=401)
+
+@require_GET
+def bandeja_notificaciones(request):
+    """
+    Bandeja de notificaciones del usuario en JSON, paginada por cursor.
+
+    Parámetros: cursor (valor de ``siguiente`` de la página anterior),
+    limite, tipo y leida (true/false).
+    """
+    if not request.user.is_authenticated:
+        return _no_autenticado()
+
+    notificaciones = Notificacion.objects.filter(usuario=request.user)
+
+    tipo = request.GET.get('tipo')
+    if tipo:
+        if tipo not in dict(Notificacion.TIPO_NOTIFICACION_CHOICES):
+            return JsonResponse({'error': "El parámetro 'tipo' no es válido."}, status=400)
+        notificaciones = notificaciones.filter(tipo=tipo)
+
+    leida = request.GET.get('leida')
+    if leida:
+        if leida not in ('true', 'false'):
+            return JsonResponse({'error': "El parámetro 'leida' debe ser true o false."}, status=400)
+        notificaciones = notificaciones.filter(leida=(leida == 'true'))
+
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'error': "El parámetro 'limite' debe ser numérico."}, status=400)
+    try:
+        filas, siguiente = paginar_por_cursor(
+            notificaciones, 'fecha_creacion', request.GET.get('cursor'), limite
+        )
+    except CursorInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse({
+        'resultados': [serializar_notificacion(notificacion) for notificacion in filas],
+        'siguiente': siguiente,
+        'no_leidas': obtener_no_leidas(request.user.pk),
+    })
+
+@require_POST
+def marcar_notificaciones_leidas(request):
+    """
+    Marca como leídas las notificaciones del usuario con un solo UPDATE.
+    Recibe ``ids`` (lista en JSON o repetido en el formulario) o
+    ``todas=true`` para marcar todas.
+    """
+    if not request.user.is_authenticated:
+        return _no_autenticado()
+
+    if request.content_type == 'application/json':
+        try:
+            datos = json.loads(request.body or '{}')
+        except ValueError:
+            return JsonResponse({'error': 'El cuerpo no es JSON válido.'}, status=400)
+        if not isinstance(datos, dict):
+            return JsonResponse({'error': 'El cuerpo debe ser un objeto JSON.'}, status=400)
+        ids = datos.get('ids') or []
+        todas = datos.get('todas') is True
+        if not isinstance(ids, list):
+            return JsonResponse({'error': "El parámetro 'ids' debe ser una lista de enteros."}, status=400)
+    else:
+        ids = request.POST.getlist('ids')
+        todas = request.POST.get('todas') == 'true'
+
+    notificaciones = Notificacion.objects.filter(usuario=request.user)
+    if not todas:
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return JsonResponse({'error': "El parámetro 'ids' debe ser una lista de enteros."}, status=400)
+        if not ids:
+            return JsonResponse({'error': "Indique 'ids' o 'todas'."}, status=400)
+        notificaciones = notificaciones.filter(pk__in=ids)
+
+    actualizadas = notificaciones.marcar_como_leidas()
+    return JsonResponse({
+        'actualizadas': actualizadas,
+        'no_leidas': obtener_no_leidas(request.user.pk),
+    })
+
+@require_GET
+def estadisticas_cache(request):
+    """Aciertos y fallos del cache de respuestas por vista (solo personal)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No tiene permiso para ver esta información.'}, status=403)
+    return JsonResponse(estadisticas())
+
+def _bbox_eventos(valor):
+    """Lee el filtro ``bbox`` (oeste,sur,este,norte); retorna None si no es válido"""
+    try:
+        oeste, sur, este, norte = (float(parte) for parte in valor.split(','))
+    except ValueError:
+        return None
+    if not (-180.0 <= oeste <= este <= 180.0 and -90.0 <= sur <= norte <= 90.0):
+        return None
+    return oeste, sur, este, norte
+
+def _en_bbox(datos, bbox):
+    if bbox is None:
+        return True
+    oeste, sur, este, norte = bbox
+    try:
+        latitud, longitud = float(datos['latitud']), float(datos['longitud'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return sur <= latitud <= norte and oeste <= longitud <= este
+
+def _evento(tipo, datos, id=None):
+    lineas = [f"event: {tipo}"]
+    if id is not None:
+        lineas.append(f"id: {id}")
+    lineas.append(f"data: {json.dumps(datos, default=str)}")
+    return "\n".join(lineas) + "\n\n"
+
+def _ultima_notificacion(usuario_id):
+    return Notificacion.objects.filter(usuario_id=usuario_id).aggregate(ultima=Max('pk'))['ultima'] or 0
+
+def _notificaciones_perdidas(usuario_id, ultimo_id):
+    return [
+        serializar_notificacion(notificacion)
+        for notificacion in Notificacion.objects.filter(
+            usuario_id=usuario_id, pk__gt=ultimo_id
+        ).order_by('pk')[:LIMITE_MAXIMO]
+    ]
+
+async def eventos(request):
+    """
+    Server-Sent Events con las notificaciones del usuario y los cambios
+    del mapa. Requiere un servidor ASGI (ver README).
+
+    Parámetros: bbox (oeste,sur,este,norte) limita los eventos del mapa,
+    mapa=0 los omite. Al reconectar, las notificaciones posteriores a
+    ``Last-Event-ID`` (o ``ultimo``) se envían antes de las nuevas.
+
+    Las notificaciones las crea ``procesar_cola`` en otro proceso; si el
+    broker no reparte eventos entre procesos (``BrokerMemoria``) y la cola
+    no es inmediata, la conexión además consulta las notificaciones nuevas
+    cada ``EVENTOS_SONDEO_SEGUNDOS``.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+
+    usuario = await request.auser()
+    con_mapa = request.GET.get('mapa') != '0'
+    if not usuario.is_authenticated and not con_mapa:
+        return _no_autenticado()
+
+    bbox = None
+    if request.GET.get('bbox'):
+        bbox = _bbox_eventos(request.GET['bbox'])
+        if bbox is None:
+            return JsonResponse({'error': "El parámetro 'bbox' debe tener el formato oeste,sur,este,norte."}, status=400)
+
+    try:
+        ultimo_id = int(request.headers.get('Last-Event-ID') or request.GET.get('ultimo') or 0)
+    except ValueError:
+        return JsonResponse({'error': "El parámetro 'ultimo' debe ser numérico."}, status=400)
+
+    canales_suscritos = []
+    if usuario.is_authenticated:
+        canales_suscritos.append(canales.canal_usuario(usuario.pk))
+    if con_mapa:
+        canales_suscritos.append(canales.CANAL_MAPA)
+    latido = getattr(settings, 'EVENTOS_LATIDO_SEGUNDOS', LATIDO_SEGUNDOS)
+    broker = canales.obtener_broker()
+    sondeo = None
+    if usuario.is_authenticated and not broker.entre_procesos and not getattr(settings, 'COLA_TAREAS_INMEDIATA', False):
+        sondeo = getattr(settings, 'EVENTOS_SONDEO_SEGUNDOS', SONDEO_SEGUNDOS)
+    espera = min(latido, sondeo) if sondeo else latido
+
+    async def flujo():
+        # La suscripción se crea antes de consultar lo perdido para no
+        # perder lo que se publique entre ambas cosas
+        suscripcion = broker.suscribir(canales_suscritos)
+        loop = asyncio.get_running_loop()
+        try:
+            enviada = ultimo_id
+            if sondeo and not ultimo_id:
+                # Una conexión nueva solo recibe lo creado desde que se abrió
+                enviada = await sync_to_async(_ultima_notificacion)(usuario.pk)
+            yield f"retry: {REINTENTO_MS}\n\n"
+            ultimo_envio = loop.time()
+            if usuario.is_authenticated and ultimo_id:
+                for datos in await sync_to_async(_notificaciones_perdidas)(usuario.pk, ultimo_id):
+                    enviada = datos['id']
+                    yield _evento('notificacion', datos, id=datos['id'])
+
+            while True:
+                try:
+                    canal, datos = await asyncio.wait_for(suscripcion.recibir(), espera)
+                except asyncio.TimeoutError:
+                    if sondeo:
+                        for datos in await sync_to_async(_notificaciones_perdidas)(usuario.pk, enviada):
+                            enviada = datos['id']
+                            yield _evento('notificacion', datos, id=datos['id'])
+                            ultimo_envio = loop.time()
+                    if loop.time() - ultimo_envio >= latido:
+                        # Mantiene viva la conexión a través de proxies
+                        yield ": latido\n\n"
+                        ultimo_envio = loop.time()
+                    continue
+                if canal == canales.CANAL_MAPA:
+                    if _en_bbox(datos, bbox):
+                        yield _evento('mapa', datos)
+                        ultimo_envio = loop.time()
+                elif datos['id'] > enviada:
+                    enviada = datos['id']
+                    yield _evento('notificacion', datos, id=datos['id'])
+                    ultimo_envio = loop.time()
+        finally:
+            suscripcion.cerrar()
+
+    respuesta = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
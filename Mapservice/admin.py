@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import CeldaCalor
 
 # Register your models here.
+
+@admin.register(CeldaCalor)
+class CeldaCalorAdmin(admin.ModelAdmin):
+    list_display = ['zoom', 'columna', 'fila', 'peso', 'total']
+    list_filter = ['zoom']
+    readonly_fields = ['zoom', 'columna', 'fila', 'peso', 'total']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MapserviceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Mapservice'
+    
+    def ready(self):
+        import Mapservice.signals
@@ -0,0 +1,239 @@
+"""
+Mapa de calor de avistamientos por teselas.
+
+Cada tesela Web Mercator se divide en ``CELDAS_POR_LADO`` x
+``CELDAS_POR_LADO`` celdas y cada celda acumula la confianza (1-10) de los
+avistamientos que caen en ella, en todos los zooms hasta
+``CALOR_ZOOM_MAXIMO``. Las celdas se guardan en ``CeldaCalor``:
+
+- En línea: las señales de Avistamiento encolan ``actualizar_calor`` con
+  los incrementos de cada alta, cambio o baja; el trabajador de la cola
+  los suma por celda y los aplica en una sola transacción.
+- En lote: ``manage.py reconstruir_calor`` recalcula todas las celdas a
+  partir de los avistamientos con operaciones vectorizadas.
+
+El mapa pide las teselas ya agregadas en JSON o PNG, nunca los
+avistamientos.
+"""
+import io
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+
+from Homeinfo.cola import manejador
+from .models import CeldaCalor
+from .teselas import LATITUD_MAXIMA
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy es opcional
+    np = None
+
+# Celdas por lado de cada tesela (32 x 32 celdas de 8 px)
+CELDAS_POR_LADO = 32
+
+# Zoom máximo con celdas precalculadas; más cerca conviene mostrar los puntos
+ZOOM_MAXIMO_CALOR = 16
+
+# Filas por INSERT al reconstruir las celdas
+TAMANO_LOTE = 5000
+
+
+def zoom_maximo():
+    return getattr(settings, 'CALOR_ZOOM_MAXIMO', ZOOM_MAXIMO_CALOR)
+
+
+def celda_de_punto(latitud, longitud, zoom):
+    """Retorna (columna, fila) global de la celda que contiene el punto en ``zoom``"""
+    latitud = min(max(latitud, -LATITUD_MAXIMA), LATITUD_MAXIMA)
+    n = 2 ** zoom * CELDAS_POR_LADO
+    columna = int((longitud + 180.0) / 360.0 * n)
+    fila = int((1.0 - math.asinh(math.tan(math.radians(latitud))) / math.pi) / 2.0 * n)
+    return min(max(columna, 0), n - 1), min(max(fila, 0), n - 1)
+
+
+def celdas_de_puntos(latitudes, longitudes, zoom):
+    """
+    Versión vectorizada de ``celda_de_punto``: retorna los arreglos
+    (columnas, filas) de todos los puntos. Requiere NumPy.
+    """
+    n = 2 ** zoom * CELDAS_POR_LADO
+    latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -LATITUD_MAXIMA, LATITUD_MAXIMA)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    columnas = ((longitudes + 180.0) / 360.0 * n).astype(np.int64)
+    filas = ((1.0 - np.arcsinh(np.tan(np.radians(latitudes))) / np.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(columnas, 0, n - 1), np.clip(filas, 0, n - 1)
+
+
+def incrementos(latitud, longitud, confianza, signo=1):
+    """
+    Retorna los incrementos [zoom, columna, fila, peso, total] que un
+    avistamiento suma (``signo=1``) o resta (``signo=-1``) en cada zoom
+    """
+    return [
+        [zoom, *celda_de_punto(latitud, longitud, zoom), signo * confianza, signo]
+        for zoom in range(zoom_maximo() + 1)
+    ]
+
+
+@manejador('actualizar_calor', lote=True)
+def actualizar_calor(lote):
+    """
+    Aplica los incrementos de varias tareas. Los de una misma celda se
+    suman antes de escribir y las celdas que quedan vacías se eliminan.
+    """
+    acumulados = defaultdict(lambda: [0, 0])
+    for datos in lote:
+        for zoom, columna, fila, peso, total in datos['incrementos']:
+            acumulado = acumulados[(zoom, columna, fila)]
+            acumulado[0] += peso
+            acumulado[1] += total
+
+    por_zoom = defaultdict(dict)
+    for (zoom, columna, fila), (peso, total) in acumulados.items():
+        if peso or total:
+            por_zoom[zoom][(columna, fila)] = (peso, total)
+
+    with transaction.atomic():
+        nuevas = []
+        restadas = []
+        for zoom, celdas in por_zoom.items():
+            existentes = {
+                (columna, fila): pk
+                for pk, columna, fila in CeldaCalor.objects.filter(
+                    zoom=zoom,
+                    columna__in={columna for columna, _ in celdas},
+                    fila__in={fila for _, fila in celdas},
+                ).values_list('pk', 'columna', 'fila')
+            }
+            for clave, (peso, total) in celdas.items():
+                pk = existentes.get(clave)
+                if pk is None:
+                    if total > 0:
+                        nuevas.append(CeldaCalor(
+                            zoom=zoom, columna=clave[0], fila=clave[1], peso=peso, total=total
+                        ))
+                    continue
+                CeldaCalor.objects.filter(pk=pk).update(peso=F('peso') + peso, total=F('total') + total)
+                if total < 0:
+                    restadas.append(pk)
+
+        CeldaCalor.objects.bulk_create(nuevas)
+        if restadas:
+            CeldaCalor.objects.filter(pk__in=restadas, total__lte=0).delete()
+
+
+def _agregar_numpy(latitudes, longitudes, confianzas, zoom):
+    columnas, filas = celdas_de_puntos(latitudes, longitudes, zoom)
+    n = 2 ** zoom * CELDAS_POR_LADO
+    claves, inversos = np.unique(columnas * n + filas, return_inverse=True)
+    pesos = np.bincount(inversos, weights=confianzas)
+    totales = np.bincount(inversos)
+    for clave, peso, total in zip(claves.tolist(), pesos.tolist(), totales.tolist()):
+        yield CeldaCalor(zoom=zoom, columna=clave // n, fila=clave % n, peso=int(peso), total=total)
+
+
+def _agregar_python(latitudes, longitudes, confianzas, zoom):
+    celdas = defaultdict(lambda: [0, 0])
+    for latitud, longitud, confianza in zip(latitudes, longitudes, confianzas):
+        celda = celdas[celda_de_punto(latitud, longitud, zoom)]
+        celda[0] += confianza
+        celda[1] += 1
+    for (columna, fila), (peso, total) in celdas.items():
+        yield CeldaCalor(zoom=zoom, columna=columna, fila=fila, peso=peso, total=total)
+
+
+def reconstruir_calor(tamano_lote=TAMANO_LOTE):
+    """
+    Recalcula desde cero las celdas de todos los zooms a partir de los
+    avistamientos. Retorna la tupla (avistamientos, celdas).
+    """
+    from reportsservice.models import Avistamiento
+
+    latitudes, longitudes, confianzas = [], [], []
+    for latitud, longitud, confianza in Avistamiento.objects.order_by().values_list(
+        'latitud', 'longitud', 'confianza'
+    ).iterator(chunk_size=10000):
+        latitudes.append(latitud)
+        longitudes.append(longitud)
+        confianzas.append(confianza)
+
+    if np is not None:
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        confianzas = np.asarray(confianzas, dtype=np.float64)
+        agregar = _agregar_numpy
+    else:
+        agregar = _agregar_python
+
+    total = 0
+    with transaction.atomic():
+        CeldaCalor.objects.all().delete()
+        if len(latitudes):
+            for zoom in range(zoom_maximo() + 1):
+                filas = []
+                for celda in agregar(latitudes, longitudes, confianzas, zoom):
+                    filas.append(celda)
+                    if len(filas) >= tamano_lote:
+                        CeldaCalor.objects.bulk_create(filas)
+                        total += len(filas)
+                        filas = []
+                CeldaCalor.objects.bulk_create(filas)
+                total += len(filas)
+    return len(latitudes), total
+
+
+def celdas_tesela(zoom, x, y):
+    """
+    Retorna [(columna, fila, peso, total)] de las celdas no vacías de una
+    tesela, con columna y fila relativas a la tesela
+    """
+    columna_min = x * CELDAS_POR_LADO
+    fila_min = y * CELDAS_POR_LADO
+    return [
+        (columna - columna_min, fila - fila_min, peso, total)
+        for columna, fila, peso, total in CeldaCalor.objects.filter(
+            zoom=zoom,
+            columna__range=(columna_min, columna_min + CELDAS_POR_LADO - 1),
+            fila__range=(fila_min, fila_min + CELDAS_POR_LADO - 1),
+        ).values_list('columna', 'fila', 'peso', 'total')
+    ]
+
+
+def peso_maximo(zoom):
+    """Retorna el mayor peso de una celda en ``zoom``, para normalizar la intensidad"""
+    return CeldaCalor.objects.filter(zoom=zoom).aggregate(maximo=Max('peso'))['maximo'] or 0
+
+
+def _color(intensidad):
+    """Rampa azul -> amarillo -> rojo con transparencia proporcional"""
+    if intensidad < 0.5:
+        t = intensidad * 2
+        rojo, verde, azul = int(255 * t), int(255 * t), int(255 * (1 - t))
+    else:
+        t = (intensidad - 0.5) * 2
+        rojo, verde, azul = 255, int(255 * (1 - t)), 0
+    return rojo, verde, azul, int(64 + 191 * intensidad)
+
+
+def png_tesela(celdas, maximo):
+    """
+    Dibuja las celdas como un PNG RGBA de ``CELDAS_POR_LADO`` píxeles por
+    lado (un píxel por celda); el mapa lo escala al tamaño de la tesela.
+    La intensidad es la raíz del peso relativo a ``maximo``.
+    """
+    from PIL import Image
+
+    pixeles = bytearray(CELDAS_POR_LADO * CELDAS_POR_LADO * 4)
+    for columna, fila, peso, _ in celdas:
+        inicio = (fila * CELDAS_POR_LADO + columna) * 4
+        pixeles[inicio:inicio + 4] = bytes(_color(math.sqrt(min(peso / maximo, 1.0))))
+
+    salida = io.BytesIO()
+    Image.frombytes('RGBA', (CELDAS_POR_LADO, CELDAS_POR_LADO), bytes(pixeles)).save(
+        salida, 'PNG', optimize=True
+    )
+    return salida.getvalue()
@@ -0,0 +1,108 @@
+"""
+Agrupación (clustering) de reportes y avistamientos por teselas.
+
+Cada tesela se divide en una rejilla de ``CELDAS_POR_LADO`` x
+``CELDAS_POR_LADO`` celdas; los puntos de cada celda se agregan en la base
+de datos y se devuelven como un solo cluster con su conteo, centroide y
+desglose por tipo. El resultado de cada tesela se guarda en el cache y las
+señales de Reporte y Avistamiento lo invalidan.
+
+Cada invalidación incrementa una generación global antes de borrar las
+teselas; una tesela calculada mientras cambió la generación se entrega
+pero no se guarda, porque pudo leer la base de datos antes del cambio.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F
+from django.db.models.functions import Floor
+
+from reportsservice.models import Reporte, Avistamiento
+from .teselas import limites_tesela, teselas_de_punto
+
+# Celdas por lado de la rejilla de cada tesela (8 x 8 celdas de 32 px)
+CELDAS_POR_LADO = 8
+
+# Segundos que un cluster permanece en el cache si no se invalida antes
+TTL_CLUSTERS_SEGUNDOS = 3600
+
+CLAVE_GENERACION = 'mapa:clusters:generacion'
+
+
+def clave_cache(zoom, x, y):
+    return f"mapa:clusters:{zoom}:{x}:{y}"
+
+
+def _agregar(queryset, lat_min, lat_max, lon_min, lon_max, campo_tipo=None):
+    alto = (lat_max - lat_min) / CELDAS_POR_LADO
+    ancho = (lon_max - lon_min) / CELDAS_POR_LADO
+    campos = ['fila', 'columna'] + ([campo_tipo] if campo_tipo else [])
+    return (
+        queryset
+        .filter(latitud__gte=lat_min, latitud__lt=lat_max,
+                longitud__gte=lon_min, longitud__lt=lon_max)
+        .annotate(
+            fila=Floor((F('latitud') - lat_min) / alto),
+            columna=Floor((F('longitud') - lon_min) / ancho),
+        )
+        .order_by()
+        .values(*campos)
+        .annotate(total=Count('pk'), lat=Avg('latitud'), lon=Avg('longitud'))
+    )
+
+
+def calcular_clusters(zoom, x, y):
+    """Calcula los clusters de una tesela consultando la base de datos"""
+    limites = limites_tesela(x, y, zoom)
+    celdas = {}
+
+    def acumular(fila, tipo):
+        clave = (fila['fila'], fila['columna'])
+        celda = celdas.setdefault(clave, {'total': 0, 'suma_lat': 0.0, 'suma_lon': 0.0, 'desglose': {}})
+        celda['total'] += fila['total']
+        celda['suma_lat'] += fila['lat'] * fila['total']
+        celda['suma_lon'] += fila['lon'] * fila['total']
+        celda['desglose'][tipo] = celda['desglose'].get(tipo, 0) + fila['total']
+
+    reportes = Reporte.objects.filter(visible=True, estado='activo')
+    for fila in _agregar(reportes, *limites, campo_tipo='tipo_reporte'):
+        acumular(fila, fila['tipo_reporte'])
+
+    avistamientos = Avistamiento.objects.filter(reporte__visible=True, reporte__estado='activo')
+    for fila in _agregar(avistamientos, *limites):
+        acumular(fila, 'avistamiento')
+
+    return [
+        {
+            'latitud': celda['suma_lat'] / celda['total'],
+            'longitud': celda['suma_lon'] / celda['total'],
+            'total': celda['total'],
+            'desglose': celda['desglose'],
+        }
+        for celda in celdas.values()
+    ]
+
+
+def clusters_tesela(zoom, x, y):
+    """Retorna los clusters de una tesela, usando el cache si es posible"""
+    clave = clave_cache(zoom, x, y)
+    clusters = cache.get(clave)
+    if clusters is None:
+        cache.add(CLAVE_GENERACION, time.time_ns(), None)
+        generacion = cache.get(CLAVE_GENERACION)
+        clusters = calcular_clusters(zoom, x, y)
+        if cache.get(CLAVE_GENERACION) == generacion:
+            cache.set(clave, clusters, getattr(settings, 'CLUSTERS_CACHE_TTL', TTL_CLUSTERS_SEGUNDOS))
+    return clusters
+
+
+def invalidar_punto(latitud, longitud):
+    """Elimina del cache las teselas que contienen el punto en todos los zooms"""
+    try:
+        cache.incr(CLAVE_GENERACION)
+    except ValueError:
+        cache.set(CLAVE_GENERACION, time.time_ns(), None)
+    cache.delete_many([
+        clave_cache(zoom, x, y) for zoom, x, y in teselas_de_punto(latitud, longitud)
+    ])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Mapservice.calor import reconstruir_calor
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde cero las celdas del mapa de calor de avistamientos "
+        "en todos los niveles de zoom."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000,
+                            help="Filas por INSERT")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        avistamientos, celdas = reconstruir_calor(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{avistamientos} avistamientos agregados en {celdas} celdas "
+            f"en {time.perf_counter() - inicio:.2f}s"
+        ))
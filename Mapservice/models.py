@@ -1,3 +1,50 @@
 from django.db import models
 
 # Create your models here.
+
+class CeldaCalor(models.Model):
+    """
+    Celda del mapa de calor de avistamientos en un nivel de zoom.
+
+    ``columna`` y ``fila`` son coordenadas globales de la rejilla: cada
+    tesela Web Mercator del zoom se divide en ``CELDAS_POR_LADO`` x
+    ``CELDAS_POR_LADO`` celdas (ver Mapservice.calor). ``peso`` es la suma
+    de la confianza de los avistamientos de la celda.
+    """
+    
+    zoom = models.PositiveSmallIntegerField(
+        verbose_name="Zoom"
+    )
+    
+    columna = models.IntegerField(
+        verbose_name="Columna"
+    )
+    
+    fila = models.IntegerField(
+        verbose_name="Fila"
+    )
+    
+    peso = models.IntegerField(
+        default=0,
+        verbose_name="Peso",
+        help_text="Suma de la confianza de los avistamientos"
+    )
+    
+    total = models.IntegerField(
+        default=0,
+        verbose_name="Avistamientos"
+    )
+    
+    class Meta:
+        verbose_name = "Celda de Mapa de Calor"
+        verbose_name_plural = "Celdas de Mapa de Calor"
+        db_table = "celda_calor"
+        # (zoom, columna, fila) también resuelve la consulta por rango de una tesela
+        unique_together = [['zoom', 'columna', 'fila']]
+        indexes = [
+            # Peso máximo por zoom para normalizar la intensidad
+            models.Index(fields=['zoom', 'peso']),
+        ]
+    
+    def __str__(self):
+        return f"z{self.zoom} ({self.columna}, {self.fila}): {self.peso}"
@@ -0,0 +1,178 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from Homeinfo.cola import encolar
+from pawtohome import cache_respuestas, eventos
+from reportsservice.models import Reporte, Avistamiento
+from reportsservice.signals import reportes_importados
+from .calor import incrementos
+from .clusters import invalidar_punto
+from .teselas import etiquetas_punto
+
+@receiver(post_save, sender=Reporte)
+@receiver(post_delete, sender=Reporte)
+def invalidar_clusters_reporte(sender, instance, created=False, **kwargs):
+    """
+    Signal para invalidar los clusters y las respuestas en cache de las
+    teselas que contienen un reporte que se creó, modificó o eliminó
+    """
+    puntos = [(instance.latitud, instance.longitud)]
+    if not created and kwargs.get('signal') is post_save:
+        if instance.has_changed('latitud') or instance.has_changed('longitud'):
+            # También la tesela donde estaba antes
+            puntos.append((instance.valor_original('latitud'), instance.valor_original('longitud')))
+        if instance.has_changed('estado') or instance.has_changed('visible'):
+            # Un cambio de estado o visibilidad también afecta a sus avistamientos
+            puntos += list(instance.avistamientos.values_list('latitud', 'longitud'))
+
+    def invalidar():
+        for latitud, longitud in puntos:
+            invalidar_punto(latitud, longitud)
+            cache_respuestas.invalidar(*etiquetas_punto(latitud, longitud))
+
+    transaction.on_commit(invalidar)
+
+@receiver(reportes_importados, sender=Reporte)
+def invalidar_clusters_importados(sender, reportes, **kwargs):
+    """
+    Signal para invalidar una sola vez las teselas que contienen los
+    reportes de un lote importado
+    """
+    puntos = {(reporte.latitud, reporte.longitud) for reporte in reportes}
+
+    def invalidar():
+        etiquetas = set()
+        for latitud, longitud in puntos:
+            invalidar_punto(latitud, longitud)
+            etiquetas.update(etiquetas_punto(latitud, longitud))
+        cache_respuestas.invalidar(*etiquetas)
+
+    transaction.on_commit(invalidar)
+
+@receiver(post_save, sender=Avistamiento)
+@receiver(post_delete, sender=Avistamiento)
+def invalidar_clusters_avistamiento(sender, instance, **kwargs):
+    """
+    Signal para invalidar los clusters y las respuestas en cache de las
+    teselas que contienen un avistamiento que se creó, modificó o eliminó
+    """
+    puntos = {(instance.latitud, instance.longitud)}
+    if instance.tiene_valor_original('latitud') and instance.tiene_valor_original('longitud'):
+        # También la tesela donde estaba antes
+        puntos.add((instance.valor_original('latitud'), instance.valor_original('longitud')))
+
+    def invalidar():
+        for latitud, longitud in puntos:
+            invalidar_punto(latitud, longitud)
+            cache_respuestas.invalidar(*etiquetas_punto(latitud, longitud))
+
+    transaction.on_commit(invalidar)
+
+CAMPOS_CALOR = ('latitud', 'longitud', 'confianza')
+
+@receiver(pre_save, sender=Avistamiento)
+def recordar_avistamiento_anterior(sender, instance, **kwargs):
+    """
+    Signal para conocer la ubicación y confianza anteriores de un
+    avistamiento que no se cargó de la base de datos
+    """
+    if instance._state.adding or all(instance.tiene_valor_original(campo) for campo in CAMPOS_CALOR):
+        instance._calor_anterior = None
+        return
+    instance._calor_anterior = Avistamiento.objects.filter(pk=instance.pk).values_list(*CAMPOS_CALOR).first()
+
+@receiver(post_save, sender=Avistamiento)
+def actualizar_calor_avistamiento(sender, instance, created, **kwargs):
+    """
+    Signal para encolar la actualización del mapa de calor cuando un
+    avistamiento se crea o cambia de ubicación o confianza
+    """
+    actual = tuple(getattr(instance, campo) for campo in CAMPOS_CALOR)
+    if created:
+        anterior = None
+    elif getattr(instance, '_calor_anterior', None) is not None:
+        anterior = instance._calor_anterior
+    else:
+        anterior = tuple(instance.valor_original(campo) for campo in CAMPOS_CALOR)
+    if anterior == actual:
+        return
+
+    cambios = incrementos(*actual)
+    if anterior is not None:
+        cambios += incrementos(*anterior, signo=-1)
+    encolar('actualizar_calor', incrementos=cambios)
+
+@receiver(post_delete, sender=Avistamiento)
+def restar_calor_avistamiento(sender, instance, **kwargs):
+    """
+    Signal para encolar la resta de un avistamiento eliminado del mapa de calor
+    """
+    encolar('actualizar_calor', incrementos=incrementos(
+        *(instance.valor_original(campo) for campo in CAMPOS_CALOR), signo=-1
+    ))
+
+# Campos de un reporte que cambian cómo se dibuja en el mapa
+CAMPOS_MAPA = ('latitud', 'longitud', 'estado', 'visible', 'tipo_reporte')
+
+@receiver(post_save, sender=Reporte)
+@receiver(post_delete, sender=Reporte)
+def publicar_cambio_reporte(sender, instance, created=False, **kwargs):
+    """
+    Signal para enviar a los mapas conectados los reportes visibles que se
+    crean o cambian, y los que se ocultan o eliminan
+    """
+    if kwargs.get('signal') is post_delete:
+        accion = 'eliminado'
+    elif created:
+        if not instance.visible:
+            return
+        accion = 'creado'
+    elif not any(instance.has_changed(campo) for campo in CAMPOS_MAPA):
+        return
+    elif not instance.visible:
+        if not instance.has_changed('visible'):
+            return
+        accion = 'eliminado'
+    else:
+        accion = 'actualizado'
+
+    eventos.publicar_al_confirmar(eventos.CANAL_MAPA, {
+        'tipo': 'reporte',
+        'accion': accion,
+        'id': str(instance.pk),
+        'latitud': instance.latitud,
+        'longitud': instance.longitud,
+        'tipo_reporte': instance.tipo_reporte,
+        'estado': instance.estado,
+    })
+
+@receiver(post_save, sender=Avistamiento)
+@receiver(post_delete, sender=Avistamiento)
+def publicar_cambio_avistamiento(sender, instance, created=False, **kwargs):
+    """
+    Signal para enviar a los mapas conectados los avistamientos de reportes
+    visibles que se crean, mueven o eliminan
+    """
+    if kwargs.get('signal') is post_delete:
+        accion = 'eliminado'
+    elif created:
+        accion = 'creado'
+    elif instance.has_changed('latitud') or instance.has_changed('longitud'):
+        accion = 'actualizado'
+    else:
+        return
+
+    datos = {
+        'tipo': 'avistamiento',
+        'accion': accion,
+        'id': instance.pk,
+        'reporte_id': str(instance.reporte_id),
+        'latitud': instance.latitud,
+        'longitud': instance.longitud,
+    }
+
+    def publicar():
+        if Reporte.objects.filter(pk=instance.reporte_id, visible=True).exists():
+            eventos.publicar(eventos.CANAL_MAPA, datos)
+
+    transaction.on_commit(publicar)
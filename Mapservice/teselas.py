@@ -0,0 +1,81 @@
+"""
+Cálculos de teselas (tiles) en la proyección Web Mercator que usa Leaflet.
+"""
+import math
+
+# Latitud máxima representable en Web Mercator
+LATITUD_MAXIMA = 85.05112878
+
+# Zoom máximo de los mapas de Leaflet con OpenStreetMap
+ZOOM_MAXIMO = 19
+
+
+def tesela_de_punto(latitud, longitud, zoom):
+    """Retorna (x, y) de la tesela que contiene el punto en ``zoom``"""
+    latitud = min(max(latitud, -LATITUD_MAXIMA), LATITUD_MAXIMA)
+    n = 2 ** zoom
+    x = int((longitud + 180.0) / 360.0 * n)
+    lat_rad = math.radians(latitud)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def limites_tesela(x, y, zoom):
+    """Retorna (lat_min, lat_max, lon_min, lon_max) de una tesela"""
+    n = 2 ** zoom
+    lon_min = x / n * 360.0 - 180.0
+    lon_max = (x + 1) / n * 360.0 - 180.0
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def teselas_en_bbox(lon_min, lat_min, lon_max, lat_max, zoom):
+    """Retorna las teselas (x, y) que cubren el rectángulo en ``zoom``"""
+    x_min, y_min = tesela_de_punto(lat_max, lon_min, zoom)
+    x_max, y_max = tesela_de_punto(lat_min, lon_max, zoom)
+    return [
+        (x, y)
+        for x in range(x_min, x_max + 1)
+        for y in range(y_min, y_max + 1)
+    ]
+
+
+def teselas_de_punto(latitud, longitud, zoom_maximo=ZOOM_MAXIMO):
+    """Retorna (zoom, x, y) de las teselas que contienen el punto en cada zoom"""
+    return [
+        (zoom,) + tesela_de_punto(latitud, longitud, zoom)
+        for zoom in range(zoom_maximo + 1)
+    ]
+
+
+# Zoom más cercano de las etiquetas de cache de respuestas del mapa
+ZOOM_ETIQUETAS = 10
+
+# Máximo de etiquetas de tesela por respuesta cacheada
+ETIQUETAS_MAXIMAS = 16
+
+
+def etiquetas_punto(latitud, longitud):
+    """Retorna las etiquetas de cache de las teselas que contienen el punto"""
+    return [
+        f"mapa:{zoom}:{x}:{y}"
+        for zoom, x, y in teselas_de_punto(latitud, longitud, ZOOM_ETIQUETAS)
+    ]
+
+
+def etiquetas_bbox(lon_min, lat_min, lon_max, lat_max, zoom=ZOOM_ETIQUETAS):
+    """
+    Retorna las etiquetas de cache de las teselas que cubren el rectángulo,
+    en el zoom más cercano (hasta ``zoom``) con a lo más ETIQUETAS_MAXIMAS
+    teselas. Si ``lon_min`` es mayor que ``lon_max`` el rectángulo cruza el
+    antimeridiano.
+    """
+    if lon_min > lon_max:
+        rectangulos = [(lon_min, lat_min, 180.0, lat_max), (-180.0, lat_min, lon_max, lat_max)]
+    else:
+        rectangulos = [(lon_min, lat_min, lon_max, lat_max)]
+    for z in range(min(zoom, ZOOM_ETIQUETAS), -1, -1):
+        teselas = [tesela for rectangulo in rectangulos for tesela in teselas_en_bbox(*rectangulo, z)]
+        if len(teselas) <= ETIQUETAS_MAXIMAS or z == 0:
+            return [f"mapa:{z}:{x}:{y}" for x, y in teselas]
@@ -1,3 +1,350 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from reportsservice.geo import bounding_box
+from reportsservice.models import Avistamiento, Reporte
+from .calor import celda_de_punto, celdas_de_puntos, reconstruir_calor
+from .clusters import CELDAS_POR_LADO, clave_cache, clusters_tesela, invalidar_punto
+from .models import CeldaCalor
+from .teselas import ZOOM_MAXIMO, limites_tesela, tesela_de_punto, teselas_de_punto
+from .views import filtrar_por_bounding_box
+
+# Grados de latitud por kilómetro
+GRADOS_POR_KM = 1 / 111.195
 
 # Create your tests here.
+
+@override_settings(COLA_TAREAS_INMEDIATA=True, CALOR_ZOOM_MAXIMO=4)
+class MapaCalorTests(TestCase):
+    """Pruebas del mapa de calor de avistamientos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        modelo = get_user_model()
+        dueno = modelo.objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+        cls.vecino = modelo.objects.create_user(
+            username='vecino', password='secreto123', phone_number='5587654321'
+        )
+        cls.reporte = Reporte.objects.create(
+            usuario=dueno, tipo_reporte='perdido', nombre_perro='Firulais',
+            color='café', tamano='mediano', descripcion='Perro con collar rojo',
+            latitud=19.4326, longitud=-99.1332, direccion='Av. Reforma 1',
+            zona='Centro', fecha_incidente=timezone.now(),
+            telefono_contacto='5512345678', email_contacto='dueno@example.com',
+        )
+
+    def crear_avistamiento(self, **campos):
+        datos = {
+            'reporte': self.reporte,
+            'usuario': self.vecino,
+            'latitud': 19.4326,
+            'longitud': -99.1332,
+            'direccion': 'Av. Juárez 5',
+            'fecha_avistamiento': timezone.now(),
+            'descripcion': 'Corría hacia el parque',
+            'confianza': 7,
+        }
+        datos.update(campos)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Avistamiento.objects.create(**datos)
+
+    def celdas(self):
+        return set(CeldaCalor.objects.values_list('zoom', 'columna', 'fila', 'peso', 'total'))
+
+    def test_celdas_vectorizadas_coinciden_con_las_escalares(self):
+        latitudes = [19.4326, -33.45, 89.9, -89.9, 0.0]
+        longitudes = [-99.1332, -70.66, 180.0, -180.0, 0.0]
+        for zoom in (0, 5, 16):
+            columnas, filas = celdas_de_puntos(latitudes, longitudes, zoom)
+            self.assertEqual(
+                list(zip(columnas.tolist(), filas.tolist())),
+                [celda_de_punto(lat, lon, zoom) for lat, lon in zip(latitudes, longitudes)],
+            )
+
+    def test_alta_cambio_y_baja_actualizan_las_celdas(self):
+        avistamiento = self.crear_avistamiento()
+        self.crear_avistamiento(confianza=3)
+        self.assertEqual({(peso, total) for *_, peso, total in self.celdas()}, {(10, 2)})
+        self.assertEqual(CeldaCalor.objects.count(), 5)
+
+        avistamiento = Avistamiento.objects.get(pk=avistamiento.pk)
+        avistamiento.latitud = -33.45
+        avistamiento.longitud = -70.66
+        with self.captureOnCommitCallbacks(execute=True):
+            avistamiento.save()
+        incremental = self.celdas()
+        reconstruir_calor()
+        self.assertEqual(self.celdas(), incremental)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            avistamiento.delete()
+        self.assertEqual({(peso, total) for *_, peso, total in self.celdas()}, {(3, 1)})
+
+    def test_tesela_json_y_png(self):
+        self.crear_avistamiento()
+        zoom = 4
+        columna, fila = celda_de_punto(19.4326, -99.1332, zoom)
+        x, y = columna // 32, fila // 32
+
+        respuesta = self.client.get(f'/maps/calor/{zoom}/{x}/{y}.json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['celdas'], [[columna % 32, fila % 32, 7, 1]])
+        self.assertEqual(respuesta.json()['maximo'], 7)
+
+        respuesta = self.client.get(f'/maps/calor/{zoom}/{x}/{y}.png')
+        self.assertEqual(respuesta['Content-Type'], 'image/png')
+
+        self.assertEqual(self.client.get('/maps/calor/5/0/0.json').status_code, 400)
+        self.assertEqual(self.client.get('/maps/calor/4/0/0.gif').status_code, 404)
+
+
+def crear_reporte(usuario, latitud, longitud, **campos):
+    datos = {
+        'usuario': usuario, 'tipo_reporte': 'perdido', 'nombre_perro': 'Firulais',
+        'color': 'café', 'tamano': 'mediano', 'descripcion': 'Perro con collar rojo',
+        'latitud': latitud, 'longitud': longitud, 'direccion': 'Av. Reforma 1',
+        'zona': 'Centro', 'fecha_incidente': timezone.now(),
+        'telefono_contacto': '5512345678', 'email_contacto': 'dueno@example.com',
+    }
+    datos.update(campos)
+    return Reporte.objects.create(**datos)
+
+
+class ReportesCercanosTests(TestCase):
+    """Pruebas de la búsqueda de reportes por radio en /maps/reportes/"""
+
+    LAT, LNG = 19.4326, -99.1332
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+        # Al norte del centro a 4, 1 y 6 km
+        cls.a_4km = crear_reporte(cls.usuario, cls.LAT + 4 * GRADOS_POR_KM, cls.LNG)
+        cls.a_1km = crear_reporte(cls.usuario, cls.LAT + 1 * GRADOS_POR_KM, cls.LNG, tipo_reporte='encontrado')
+        cls.a_6km = crear_reporte(cls.usuario, cls.LAT + 6 * GRADOS_POR_KM, cls.LNG)
+
+    def setUp(self):
+        cache.clear()
+
+    def buscar(self, **parametros):
+        parametros = {'lat': self.LAT, 'lng': self.LNG, 'radio': 5, **parametros}
+        return self.client.get(reverse('Mapservice:reportes_cercanos'), parametros)
+
+    def ids(self, **parametros):
+        respuesta = self.buscar(**parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [fila['id'] for fila in respuesta.json()['resultados']]
+
+    def test_filtra_por_radio_y_ordena_por_distancia(self):
+        datos = self.buscar().json()
+
+        self.assertEqual(datos['total'], 2)
+        self.assertEqual([fila['id'] for fila in datos['resultados']], [str(self.a_1km.pk), str(self.a_4km.pk)])
+        self.assertAlmostEqual(datos['resultados'][0]['distancia_km'], 1.0, places=2)
+        self.assertAlmostEqual(datos['resultados'][1]['distancia_km'], 4.0, places=2)
+        self.assertEqual(len(self.ids(radio=10)), 3)
+
+    def test_excluye_ocultos_y_no_activos(self):
+        Reporte.objects.filter(pk=self.a_1km.pk).update(visible=False)
+        Reporte.objects.filter(pk=self.a_4km.pk).update(estado='cerrado')
+        self.assertEqual(self.ids(radio=10), [str(self.a_6km.pk)])
+
+    def test_filtros_opcionales(self):
+        self.assertEqual(self.ids(tipo_reporte='encontrado'), [str(self.a_1km.pk)])
+        self.assertEqual(self.ids(tamano='grande'), [])
+
+        ayer = timezone.now() - timedelta(days=1)
+        Reporte.objects.filter(pk=self.a_4km.pk).update(fecha_reporte=ayer - timedelta(days=3))
+        self.assertEqual(self.ids(desde=ayer.date().isoformat()), [str(self.a_1km.pk)])
+        self.assertEqual(self.ids(hasta=(ayer - timedelta(days=1)).date().isoformat()), [str(self.a_4km.pk)])
+
+    def test_paginacion(self):
+        primera = self.buscar(radio=10, por_pagina=2).json()
+        segunda = self.buscar(radio=10, por_pagina=2, pagina=2).json()
+
+        self.assertEqual(primera['total'], 3)
+        self.assertEqual([fila['id'] for fila in primera['resultados']], [str(self.a_1km.pk), str(self.a_4km.pk)])
+        self.assertEqual([fila['id'] for fila in segunda['resultados']], [str(self.a_6km.pk)])
+        self.assertEqual(self.buscar(radio=10, por_pagina=2, pagina=3).json()['resultados'], [])
+
+    def test_radio_que_cruza_el_antimeridiano(self):
+        oeste = crear_reporte(self.usuario, 0.0, -179.99)
+        crear_reporte(self.usuario, 0.0, -179.9)
+        self.assertEqual(self.ids(lat=0.0, lng=179.99, radio=5), [str(oeste.pk)])
+
+    def test_parametros_invalidos(self):
+        for parametros in ({'lat': 'norte'}, {'lat': 91}, {'radio': 51}, {'radio': -1},
+                           {'pagina': 0}, {'tipo_reporte': 'robado'}, {'desde': 'ayer'}):
+            respuesta = self.buscar(**parametros)
+            self.assertEqual(respuesta.status_code, 400, parametros)
+            self.assertIn('error', respuesta.json())
+        respuesta = self.client.get(reverse('Mapservice:reportes_cercanos'), {'lng': self.LNG})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_valores_no_finitos(self):
+        for parametros in ({'pagina': 'inf'}, {'por_pagina': '-inf'}, {'lat': 'nan'},
+                           {'lng': 'NaN'}, {'radio': 'nan'}, {'radio': 'infinity'}):
+            respuesta = self.buscar(**parametros)
+            self.assertEqual(respuesta.status_code, 400, parametros)
+            self.assertIn('finito', respuesta.json()['error'])
+
+    @skipUnless(connection.vendor == 'sqlite', "El plan de consulta se revisa con SQLite")
+    def test_prefiltro_usa_el_indice_de_coordenadas(self):
+        reportes = filtrar_por_bounding_box(
+            Reporte.objects.filter(visible=True, estado='activo'), *bounding_box(self.LAT, self.LNG, 5)
+        ).order_by().values_list('pk', 'latitud', 'longitud')
+        plan = reportes.explain()
+        self.assertIn('latitud', plan)
+        self.assertIn('INDEX', plan)
+        self.assertNotIn('SCAN reporte', plan)
+
+
+class ClustersTests(TestCase):
+    """Pruebas de la agrupación de reportes y avistamientos por tesela"""
+
+    ZOOM = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+        cls.x, cls.y = tesela_de_punto(19.4326, -99.1332, cls.ZOOM)
+        lat_min, lat_max, lon_min, lon_max = limites_tesela(cls.x, cls.y, cls.ZOOM)
+        cls.alto = (lat_max - lat_min) / CELDAS_POR_LADO
+        cls.ancho = (lon_max - lon_min) / CELDAS_POR_LADO
+        cls.origen = (lat_min, lon_min)
+
+    def setUp(self):
+        cache.clear()
+
+    def punto(self, fila, columna, dentro=0.5):
+        """Punto en la celda (fila, columna) de la tesela de prueba"""
+        return (self.origen[0] + (fila + dentro) * self.alto, self.origen[1] + (columna + dentro) * self.ancho)
+
+    def crear(self, fila, columna, dentro=0.5, **campos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return crear_reporte(self.usuario, *self.punto(fila, columna, dentro), **campos)
+
+    def avistar(self, reporte, fila, columna):
+        latitud, longitud = self.punto(fila, columna)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Avistamiento.objects.create(
+                reporte=reporte, usuario=self.usuario, latitud=latitud, longitud=longitud,
+                direccion='Av. Juárez 5', fecha_avistamiento=timezone.now(),
+                descripcion='Corría hacia el parque', confianza=7,
+            )
+
+    def por_total(self):
+        return sorted(clusters_tesela(self.ZOOM, self.x, self.y), key=lambda cluster: -cluster['total'])
+
+    def test_agrega_por_celda_con_centroide_y_desglose(self):
+        primero = self.crear(2, 3, dentro=0.25)
+        self.crear(2, 3, dentro=0.75, tipo_reporte='encontrado')
+        self.avistar(primero, 2, 3)
+        self.crear(6, 1)
+
+        grande, chico = self.por_total()
+
+        self.assertEqual(grande['total'], 3)
+        self.assertEqual(grande['desglose'], {'perdido': 1, 'encontrado': 1, 'avistamiento': 1})
+        self.assertAlmostEqual(grande['latitud'], self.punto(2, 3)[0])
+        self.assertAlmostEqual(grande['longitud'], self.punto(2, 3)[1])
+        self.assertEqual((chico['total'], chico['desglose']), (1, {'perdido': 1}))
+
+    def test_excluye_ocultos_no_activos_y_otras_teselas(self):
+        self.crear(1, 1, visible=False)
+        oculto = self.crear(1, 2, estado='cerrado')
+        self.avistar(oculto, 1, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_reporte(self.usuario, self.origen[0] - self.alto, self.origen[1])
+
+        self.assertEqual(self.por_total(), [])
+
+    def test_usa_el_cache_y_las_senales_lo_invalidan(self):
+        self.crear(4, 4)
+        self.assertEqual(self.por_total()[0]['total'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.por_total()[0]['total'], 1)
+
+        reporte = self.crear(4, 4, dentro=0.3)
+        self.assertEqual(self.por_total()[0]['total'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte.delete()
+        self.assertEqual(self.por_total()[0]['total'], 1)
+
+    def test_mover_un_reporte_invalida_la_tesela_anterior(self):
+        reporte = self.crear(4, 4)
+        self.assertEqual(len(self.por_total()), 1)
+
+        reporte = Reporte.objects.get(pk=reporte.pk)
+        reporte.latitud, reporte.longitud = -33.45, -70.66
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte.save()
+        self.assertEqual(self.por_total(), [])
+
+    def test_invalidar_punto_en_todos_los_zooms(self):
+        latitud, longitud = self.punto(4, 4)
+        teselas = teselas_de_punto(latitud, longitud)
+        self.assertEqual(len(teselas), ZOOM_MAXIMO + 1)
+        for zoom, x, y in teselas:
+            clusters_tesela(zoom, x, y)
+        lejana = tesela_de_punto(-33.45, -70.66, self.ZOOM)
+        clusters_tesela(self.ZOOM, *lejana)
+
+        invalidar_punto(latitud, longitud)
+
+        for zoom, x, y in teselas:
+            self.assertIsNone(cache.get(clave_cache(zoom, x, y)), zoom)
+        self.assertIsNotNone(cache.get(clave_cache(self.ZOOM, *lejana)))
+
+    def test_invalidacion_durante_el_calculo_no_guarda_la_tesela(self):
+        self.crear(4, 4)
+        cambios = []
+
+        def crear_durante_el_calculo(execute, sql, params, many, context):
+            resultado = execute(sql, params, many, context)
+            if not cambios:
+                # Otro proceso crea un reporte en la tesela después de la primera lectura
+                cambios.append(True)
+                self.crear(4, 4, dentro=0.3)
+            return resultado
+
+        with connection.execute_wrapper(crear_durante_el_calculo):
+            self.assertEqual(self.por_total()[0]['total'], 1)
+
+        self.assertIsNone(cache.get(clave_cache(self.ZOOM, self.x, self.y)))
+        self.assertEqual(self.por_total()[0]['total'], 2)
+
+    def test_vista_clusters(self):
+        self.crear(4, 4)
+        lat_min, lat_max, lon_min, lon_max = limites_tesela(self.x, self.y, self.ZOOM)
+        # Un bbox un poco menor que la tesela solo la incluye a ella
+        margen = self.alto / 10
+        bbox = f"{lon_min + margen},{lat_min + margen},{lon_max - margen},{lat_max - margen}"
+
+        respuesta = self.client.get(reverse('Mapservice:clusters'), {'zoom': self.ZOOM, 'bbox': bbox})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([cluster['total'] for cluster in respuesta.json()['clusters']], [1])
+
+    def test_vista_clusters_parametros_invalidos(self):
+        url = reverse('Mapservice:clusters')
+        for parametros in ({'zoom': 3}, {'zoom': 3, 'bbox': '1,2,3'}, {'zoom': 3, 'bbox': '10,0,0,10'},
+                           {'zoom': 20, 'bbox': '0,0,1,1'}, {'zoom': 12, 'bbox': '-100,15,-90,25'},
+                           {'zoom': 'nan', 'bbox': '0,0,1,1'}, {'zoom': 'inf', 'bbox': '0,0,1,1'},
+                           {'zoom': 3, 'bbox': 'nan,0,1,1'}):
+            respuesta = self.client.get(url, parametros)
+            self.assertEqual(respuesta.status_code, 400, parametros)
@@ -4,6 +4,9 @@ from . import views
 app_name = "Mapservice"
 
 urlpatterns = [
-    
+    path('reportes/', views.reportes_cercanos, name='reportes_cercanos'),
+    path('clusters/', views.clusters, name='clusters'),
+    path('calor/<int:zoom>/<int:x>/<int:y>.<str:formato>', views.calor, name='calor'),
+
     # Otras rutas de la aplicación
-]
\ No newline at end of file
+]
@@ -1,3 +1,219 @@
-from django.shortcuts import render
+import math
+from datetime import datetime, time
 
-# Create your views here.
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+
+from pawtohome.cache_respuestas import cache_respuesta, etiquetar
+from reportsservice.geo import bounding_box, puntos_en_radio
+from reportsservice.models import Reporte
+from reportsservice.serializadores import serializar_reporte
+from .calor import CELDAS_POR_LADO, celdas_tesela, peso_maximo, png_tesela, zoom_maximo
+from .clusters import clusters_tesela
+from .teselas import ZOOM_MAXIMO, etiquetas_bbox, teselas_en_bbox
+
+RADIO_MAXIMO_KM = 50.0
+POR_PAGINA_DEFECTO = 20
+POR_PAGINA_MAXIMO = 100
+TESELAS_MAXIMAS = 64
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _float(request, nombre, defecto=None, minimo=None, maximo=None):
+    valor = request.GET.get(nombre)
+    if valor in (None, ''):
+        if defecto is None:
+            raise ParametroInvalido(f"El parámetro '{nombre}' es obligatorio.")
+        return defecto
+    try:
+        numero = float(valor)
+    except ValueError:
+        raise ParametroInvalido(f"El parámetro '{nombre}' debe ser numérico.")
+    # float() acepta 'inf' y 'nan', y NaN pasa cualquier comparación de rango
+    if not math.isfinite(numero):
+        raise ParametroInvalido(f"El parámetro '{nombre}' debe ser un número finito.")
+    if minimo is not None and numero < minimo:
+        raise ParametroInvalido(f"El parámetro '{nombre}' debe ser mayor o igual a {minimo}.")
+    if maximo is not None and numero > maximo:
+        raise ParametroInvalido(f"El parámetro '{nombre}' debe ser menor o igual a {maximo}.")
+    return numero
+
+
+def _entero(request, nombre, defecto, minimo, maximo):
+    return int(_float(request, nombre, defecto, minimo, maximo))
+
+
+def _bbox(request):
+    """Lee ``bbox`` en el formato de Leaflet: oeste,sur,este,norte"""
+    try:
+        oeste, sur, este, norte = (float(valor) for valor in request.GET['bbox'].split(','))
+    except KeyError:
+        raise ParametroInvalido("El parámetro 'bbox' es obligatorio.")
+    except ValueError:
+        raise ParametroInvalido("El parámetro 'bbox' debe tener el formato oeste,sur,este,norte.")
+    if not (-180.0 <= oeste <= este <= 180.0 and -90.0 <= sur <= norte <= 90.0):
+        raise ParametroInvalido("El parámetro 'bbox' está fuera de rango.")
+    return oeste, sur, este, norte
+
+
+def _fecha(request, nombre, fin_del_dia=False):
+    """Acepta fechas (2025-08-30) o fechas con hora en formato ISO 8601"""
+    valor = request.GET.get(nombre)
+    if not valor:
+        return None
+    fecha_hora = parse_datetime(valor)
+    if fecha_hora is None:
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ParametroInvalido(f"El parámetro '{nombre}' debe ser una fecha ISO 8601.")
+        fecha_hora = datetime.combine(fecha, time.max if fin_del_dia else time.min)
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+
+def filtrar_por_parametros(queryset, request):
+    """Aplica los filtros opcionales tipo_reporte, tamano, desde y hasta"""
+    tipo_reporte = request.GET.get('tipo_reporte')
+    if tipo_reporte:
+        if tipo_reporte not in dict(Reporte.TIPO_REPORTE_CHOICES):
+            raise ParametroInvalido("El parámetro 'tipo_reporte' no es válido.")
+        queryset = queryset.filter(tipo_reporte=tipo_reporte)
+
+    tamano = request.GET.get('tamano')
+    if tamano:
+        if tamano not in dict(Reporte.TAMANO_CHOICES):
+            raise ParametroInvalido("El parámetro 'tamano' no es válido.")
+        queryset = queryset.filter(tamano=tamano)
+
+    desde = _fecha(request, 'desde')
+    if desde:
+        queryset = queryset.filter(fecha_reporte__gte=desde)
+    hasta = _fecha(request, 'hasta', fin_del_dia=True)
+    if hasta:
+        queryset = queryset.filter(fecha_reporte__lte=hasta)
+    return queryset
+
+
+def filtrar_por_bounding_box(queryset, lat_min, lat_max, lon_min, lon_max):
+    """Filtra por rectángulo usando el índice (latitud, longitud)"""
+    queryset = queryset.filter(latitud__range=(lat_min, lat_max))
+    if lon_min > lon_max:
+        # El rectángulo cruza el antimeridiano
+        return queryset.filter(Q(longitud__gte=lon_min) | Q(longitud__lte=lon_max))
+    return queryset.filter(longitud__range=(lon_min, lon_max))
+
+
+@require_GET
+@cache_respuesta('reportes_cercanos')
+def reportes_cercanos(request):
+    """
+    Retorna en JSON los reportes visibles y activos a ``radio`` km o menos
+    de (lat, lng), ordenados por distancia y paginados.
+
+    Parámetros: lat, lng, radio (km), tipo_reporte, tamano, desde, hasta,
+    pagina y por_pagina.
+    """
+    try:
+        lat = _float(request, 'lat', minimo=-90.0, maximo=90.0)
+        lng = _float(request, 'lng', minimo=-180.0, maximo=180.0)
+        radio = _float(request, 'radio', 5.0, minimo=0.0, maximo=RADIO_MAXIMO_KM)
+        pagina = _entero(request, 'pagina', 1, 1, None)
+        por_pagina = _entero(request, 'por_pagina', POR_PAGINA_DEFECTO, 1, POR_PAGINA_MAXIMO)
+        reportes = filtrar_por_parametros(
+            Reporte.objects.filter(visible=True, estado='activo'), request
+        )
+    except ParametroInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    lat_min, lat_max, lon_min, lon_max = bounding_box(lat, lng, radio)
+    etiquetar(request, *etiquetas_bbox(lon_min, lat_min, lon_max, lat_max))
+
+    # Prefiltro por bounding box en la base de datos; solo se leen las
+    # columnas necesarias para calcular la distancia exacta
+    candidatos = list(
+        filtrar_por_bounding_box(reportes, lat_min, lat_max, lon_min, lon_max)
+        .order_by()
+        .values_list('pk', 'latitud', 'longitud')
+    )
+    indices, distancias = puntos_en_radio(
+        (lat, lng), radio,
+        [c[1] for c in candidatos],
+        [c[2] for c in candidatos],
+    )
+    cercanos = sorted(
+        ((float(distancia), candidatos[i][0]) for i, distancia in zip(indices, distancias)),
+        key=lambda par: par[0],
+    )
+
+    inicio = (pagina - 1) * por_pagina
+    pagina_actual = cercanos[inicio:inicio + por_pagina]
+    por_id = Reporte.objects.select_related('raza').in_bulk([pk for _, pk in pagina_actual])
+
+    return JsonResponse({
+        'total': len(cercanos),
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'resultados': [
+            serializar_reporte(por_id[pk], distancia_km=round(distancia, 3))
+            for distancia, pk in pagina_actual
+            if pk in por_id
+        ],
+    })
+
+
+@require_GET
+@cache_respuesta('clusters')
+def clusters(request):
+    """
+    Retorna en JSON los clusters de reportes y avistamientos de las teselas
+    que cubren ``bbox`` (oeste,sur,este,norte) en el nivel ``zoom``.
+    Cada cluster incluye su conteo, centroide y desglose por tipo.
+    """
+    try:
+        zoom = _entero(request, 'zoom', None, 0, ZOOM_MAXIMO)
+        bbox = _bbox(request)
+        teselas = teselas_en_bbox(*bbox, zoom)
+    except ParametroInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if len(teselas) > TESELAS_MAXIMAS:
+        return JsonResponse({'error': "El área solicitada es demasiado grande para este zoom."}, status=400)
+
+    etiquetar(request, *etiquetas_bbox(*bbox, zoom))
+    resultados = []
+    for x, y in teselas:
+        resultados.extend(clusters_tesela(zoom, x, y))
+    return JsonResponse({'zoom': zoom, 'clusters': resultados})
+
+
+@require_GET
+def calor(request, zoom, x, y, formato):
+    """
+    Retorna la tesela (zoom, x, y) del mapa de calor de avistamientos.
+
+    En JSON, ``celdas`` lista [columna, fila, peso, total] de las celdas no
+    vacías dentro de una rejilla de ``lado`` x ``lado``; ``maximo`` es el
+    mayor peso del zoom para normalizar igual todas las teselas. En PNG,
+    cada píxel es una celda ya coloreada.
+    """
+    if formato not in ('json', 'png'):
+        raise Http404("Formato no soportado")
+    if zoom > zoom_maximo():
+        return JsonResponse({'error': f"El zoom máximo del mapa de calor es {zoom_maximo()}."}, status=400)
+    if x >= 2 ** zoom or y >= 2 ** zoom:
+        return JsonResponse({'error': "La tesela está fuera de rango para este zoom."}, status=400)
+
+    celdas = celdas_tesela(zoom, x, y)
+    maximo = peso_maximo(zoom) if celdas else 0
+    if formato == 'png':
+        return HttpResponse(png_tesela(celdas, maximo), content_type='image/png')
+    return JsonResponse(
+        {'zoom': zoom, 'x': x, 'y': y, 'lado': CELDAS_POR_LADO, 'maximo': maximo, 'celdas': celdas},
+        json_dumps_params={'separators': (',', ':')},
+    )
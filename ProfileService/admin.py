@@ -13,6 +13,8 @@ class ConfiguracionUsuarioAdmin(admin.ModelAdmin):
         'notificar_perdidos', 'notificar_encontrados'
     ]
     search_fields = ['usuario__username', 'usuario__email']
+    list_select_related = ['usuario']
+    raw_id_fields = ['usuario']
     
     fieldsets = (
         ('Usuario', {
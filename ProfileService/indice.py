@@ -0,0 +1,255 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.exceptions import ImproperlyConfigured
+
+from reportsservice.geo import bounding_box
+
+# Tamaño por defecto de cada celda de la rejilla, en grados (~11 km de latitud)
+TAMANO_CELDA_GRADOS = 0.1
+
+# Segundos tras los cuales el índice se reconstruye desde la base de datos
+TTL_INDICE_SEGUNDOS = 300
+
+# Versión de los suscriptores en la cache compartida. Cada cambio de
+# configuración la incrementa y cada proceso reconstruye su índice al usarlo
+# si la versión con la que lo construyó ya no es la actual.
+CLAVE_VERSION = 'indice_suscriptores:version'
+
+# Backends cuyo contenido no ven los demás procesos
+BACKENDS_CACHE_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+Suscriptor = namedtuple('Suscriptor', [
+    'usuario_id', 'latitud', 'longitud', 'radio',
+    'notificar_perdidos', 'notificar_encontrados',
+])
+
+
+class IndiceSuscriptores:
+    """
+    Índice espacial en memoria de los usuarios que reciben notificaciones
+    por proximidad.
+
+    El mundo se divide en una rejilla de celdas de ``tamano_celda`` grados.
+    Cada suscriptor se registra en todas las celdas que toca el círculo
+    definido por su ubicación preferida y su radio de notificaciones, de modo
+    que para un punto dado basta con consultar la única celda que lo contiene.
+    """
+
+    def __init__(self, tamano_celda=TAMANO_CELDA_GRADOS):
+        self.tamano_celda = tamano_celda
+        self._filas = int(math.ceil(180.0 / tamano_celda))
+        self._columnas = int(math.ceil(360.0 / tamano_celda))
+        self._celdas = {}
+        self._celdas_por_usuario = {}
+        self._suscriptores = {}
+        self._lock = threading.RLock()
+        self.construido_en = None
+        self.version = None
+
+    def __len__(self):
+        return len(self._suscriptores)
+
+    def _fila(self, latitud):
+        fila = int(math.floor((latitud + 90.0) / self.tamano_celda))
+        return min(max(fila, 0), self._filas - 1)
+
+    def _columna(self, longitud):
+        return int(math.floor((longitud + 180.0) / self.tamano_celda)) % self._columnas
+
+    def celda(self, latitud, longitud):
+        """Retorna la clave (fila, columna) de la celda que contiene el punto"""
+        return (self._fila(latitud), self._columna(longitud))
+
+    def celdas_cubiertas(self, latitud, longitud, radio_km):
+        """
+        Retorna las claves de las celdas que intersectan el rectángulo que
+        envuelve el círculo de radio ``radio_km`` alrededor del punto
+        """
+        lat_min, lat_max, lon_min, lon_max = bounding_box(latitud, longitud, radio_km)
+        filas = range(self._fila(lat_min), self._fila(lat_max) + 1)
+
+        if lon_min == -180.0 and lon_max == 180.0:
+            columnas = range(self._columnas)
+        else:
+            inicio = self._columna(lon_min)
+            fin = self._columna(lon_max)
+            if fin < inicio:
+                # El rectángulo cruza el antimeridiano
+                fin += self._columnas
+            columnas = [c % self._columnas for c in range(inicio, fin + 1)]
+
+        return [(fila, columna) for fila in filas for columna in columnas]
+
+    def agregar(self, suscriptor):
+        """Agrega o reemplaza un suscriptor en el índice"""
+        with self._lock:
+            self._eliminar(suscriptor.usuario_id)
+            claves = self.celdas_cubiertas(
+                suscriptor.latitud, suscriptor.longitud, suscriptor.radio
+            )
+            for clave in claves:
+                self._celdas.setdefault(clave, {})[suscriptor.usuario_id] = suscriptor
+            self._celdas_por_usuario[suscriptor.usuario_id] = claves
+            self._suscriptores[suscriptor.usuario_id] = suscriptor
+
+    def eliminar(self, usuario_id):
+        """Elimina un suscriptor del índice si existe"""
+        with self._lock:
+            self._eliminar(usuario_id)
+
+    def _eliminar(self, usuario_id):
+        claves = self._celdas_por_usuario.pop(usuario_id, ())
+        for clave in claves:
+            celda = self._celdas.get(clave)
+            if celda is not None:
+                celda.pop(usuario_id, None)
+                if not celda:
+                    del self._celdas[clave]
+        self._suscriptores.pop(usuario_id, None)
+
+    def cargar(self, suscriptores):
+        """Reemplaza todo el contenido del índice"""
+        with self._lock:
+            self._celdas = {}
+            self._celdas_por_usuario = {}
+            self._suscriptores = {}
+            for suscriptor in suscriptores:
+                self.agregar(suscriptor)
+            self.construido_en = time.monotonic()
+
+    def candidatos(self, latitud, longitud):
+        """
+        Retorna los suscriptores cuya área de notificación podría contener
+        el punto. La distancia exacta debe verificarse después.
+        """
+        with self._lock:
+            return list(self._celdas.get(self.celda(latitud, longitud), {}).values())
+
+
+def suscriptor_desde_configuracion(config):
+    """
+    Convierte una ConfiguracionUsuario en un Suscriptor, o retorna None si
+    el usuario no debe aparecer en el índice
+    """
+    if not config.tiene_ubicacion_preferida():
+        return None
+    if not (config.notificar_perdidos or config.notificar_encontrados):
+        return None
+    return Suscriptor(
+        config.usuario_id,
+        config.latitud_preferida,
+        config.longitud_preferida,
+        config.radio_notificaciones,
+        config.notificar_perdidos,
+        config.notificar_encontrados,
+    )
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def _cargar_desde_bd(indice):
+    from .models import ConfiguracionUsuario
+
+    filas = ConfiguracionUsuario.objects.filter(
+        latitud_preferida__isnull=False,
+        longitud_preferida__isnull=False,
+    ).exclude(
+        notificar_perdidos=False,
+        notificar_encontrados=False,
+    ).values_list(
+        'usuario_id', 'latitud_preferida', 'longitud_preferida',
+        'radio_notificaciones', 'notificar_perdidos', 'notificar_encontrados',
+    )
+    indice.cargar(Suscriptor(*fila) for fila in filas.iterator())
+
+
+def _version_compartida():
+    # Una clave nueva (o desalojada) nunca coincide con una versión anterior
+    cache.add(CLAVE_VERSION, time.time_ns(), None)
+    return cache.get(CLAVE_VERSION)
+
+
+def verificar_cache_compartida():
+    """
+    Lanza ImproperlyConfigured si el cache por defecto no se comparte entre
+    procesos. El índice se usa en ``procesar_cola``, y con un cache local
+    ese proceso no ve las versiones que incrementan los procesos web.
+    """
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+    if backend in BACKENDS_CACHE_LOCALES:
+        raise ImproperlyConfigured(
+            f"El cache por defecto ({backend}) es local al proceso: los cambios de "
+            "configuración hechos en otros procesos no llegarían al índice de "
+            "suscriptores de este trabajador. Configure un cache compartido "
+            "(CACHE_DIR o REDIS_URL) o use COLA_TAREAS_INMEDIATA = True."
+        )
+
+
+def obtener_indice():
+    """
+    Retorna el índice del proceso actual, construyéndolo desde la base de
+    datos la primera vez y reconstruyéndolo cuando expira su TTL o cuando
+    otro proceso cambió la configuración de algún suscriptor
+    """
+    global _indice
+    ttl = getattr(settings, 'INDICE_SUSCRIPTORES_TTL', TTL_INDICE_SEGUNDOS)
+    # La versión se lee antes que la base de datos: un cambio confirmado
+    # durante la carga a lo sumo provoca una reconstrucción de más
+    version = _version_compartida()
+    with _indice_lock:
+        indice = _indice
+        if indice is None:
+            indice = IndiceSuscriptores(
+                getattr(settings, 'INDICE_SUSCRIPTORES_TAMANO_CELDA', TAMANO_CELDA_GRADOS)
+            )
+        if (indice.construido_en is None or indice.version != version or
+                time.monotonic() - indice.construido_en > ttl):
+            _cargar_desde_bd(indice)
+            indice.version = version
+        _indice = indice
+        return indice
+
+
+def actualizar_suscriptor(usuario_id, suscriptor):
+    """
+    Registra un cambio ya confirmado en la configuración de ``usuario_id``;
+    ``suscriptor`` es None si el usuario debe salir del índice.
+
+    Incrementa la versión compartida para que los demás procesos
+    reconstruyan su índice y actualiza en su lugar el del proceso actual.
+    """
+    try:
+        nueva = cache.incr(CLAVE_VERSION)
+    except ValueError:
+        nueva = None
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+    with _indice_lock:
+        indice = _indice
+        if indice is None:
+            return
+        if suscriptor is None:
+            indice.eliminar(usuario_id)
+        else:
+            indice.agregar(suscriptor)
+        # Si este fue el único cambio desde la construcción, el índice
+        # local sigue completo y no hace falta reconstruirlo
+        if nueva is not None and indice.version == nueva - 1:
+            indice.version = nueva
+
+
+def invalidar_indice():
+    """Descarta el índice del proceso; se reconstruirá en el siguiente uso"""
+    global _indice
+    with _indice_lock:
+        _indice = None
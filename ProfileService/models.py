@@ -1,14 +1,40 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from pawtohome.seguimiento import SeguimientoCambiosMixin
 
-class ConfiguracionUsuario(models.Model):
+# Filas por INSERT al crear configuraciones en lote
+TAMANO_LOTE_CONFIGURACIONES = 1000
+
+class ConfiguracionUsuarioQuerySet(models.QuerySet):
+    
+    def crear_para_usuarios(self, usuarios, tamano_lote=TAMANO_LOTE_CONFIGURACIONES):
+        """
+        Crea con bulk_create la configuración por defecto de los usuarios
+        que aún no la tienen, para importaciones masivas donde no se
+        disparan las señales de post_save. Retorna las configuraciones
+        enviadas a insertar.
+        """
+        return self.bulk_create(
+            [self.model(usuario_id=getattr(usuario, 'pk', usuario)) for usuario in usuarios],
+            batch_size=tamano_lote,
+            ignore_conflicts=True,
+        )
+
+class ConfiguracionUsuario(SeguimientoCambiosMixin, models.Model):
     """
     Modelo de Configuración de Usuario basado en el ER de PawsToHome
     Representa la entidad CONFIGURACION_USUARIO del diagrama
     Relación 1:1 con Usuario
     """
     
+    # Campos cuyo valor al cargar se recuerda para detectar cambios (has_changed)
+    campos_seguidos = (
+        'notificaciones_email', 'notificaciones_push', 'radio_notificaciones',
+        'latitud_preferida', 'longitud_preferida',
+        'notificar_perdidos', 'notificar_encontrados',
+    )
+    
     usuario = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -64,6 +90,8 @@ class ConfiguracionUsuario(models.Model):
         verbose_name="Notificar Mascotas Encontradas"
     )
     
+    objects = ConfiguracionUsuarioQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Configuración de Usuario"
         verbose_name_plural = "Configuraciones de Usuario"
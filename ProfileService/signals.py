@@ -1,24 +1,53 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
+from .indice import actualizar_suscriptor, suscriptor_desde_configuracion
 from .models import ConfiguracionUsuario
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def crear_configuracion_usuario(sender, instance, created, **kwargs):
+def guardar_configuracion_usuario(sender, instance, created, **kwargs):
     """
-    Signal para crear automáticamente la configuración de usuario
-    cuando se crea un nuevo usuario
+    Signal para crear la configuración de un usuario nuevo con un solo
+    INSERT y, al actualizar el usuario, guardar su configuración solo si
+    ya estaba cargada y tiene cambios.
+
+    Guardar un usuario (p. ej. last_login) no consulta ni escribe su
+    configuración. Los usuarios creados sin señales (bulk_create) obtienen
+    la suya con ``ConfiguracionUsuario.objects.crear_para_usuarios()``.
     """
     if created:
         ConfiguracionUsuario.objects.create(usuario=instance)
+        return
 
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def guardar_configuracion_usuario(sender, instance, **kwargs):
+    configuracion = instance._state.fields_cache.get('configuracion')
+    if configuracion is None:
+        return
+    if configuracion._state.adding:
+        configuracion.save()
+        return
+    cambios = configuracion.cambios()
+    if cambios:
+        configuracion.save(update_fields=list(cambios))
+
+@receiver(post_save, sender=ConfiguracionUsuario)
+def actualizar_indice_suscriptores(sender, instance, **kwargs):
+    """
+    Signal para mantener sincronizado el índice espacial de suscriptores
+    cuando cambia la configuración de un usuario
     """
-    Signal para asegurar que la configuración de usuario se guarde
-    cuando se actualiza el usuario
+    def actualizar():
+        actualizar_suscriptor(instance.usuario_id, suscriptor_desde_configuracion(instance))
+
+    transaction.on_commit(actualizar)
+
+@receiver(post_delete, sender=ConfiguracionUsuario)
+def eliminar_de_indice_suscriptores(sender, instance, **kwargs):
     """
-    if hasattr(instance, 'configuracion'):
-        instance.configuracion.save()
-    else:
-        ConfiguracionUsuario.objects.create(usuario=instance)
\ No newline at end of file
+    Signal para retirar del índice espacial a los usuarios cuya
+    configuración se elimina
+    """
+    def eliminar():
+        actualizar_suscriptor(instance.usuario_id, None)
+
+    transaction.on_commit(eliminar)
@@ -1,3 +1,178 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import indice
+from .indice import IndiceSuscriptores, Suscriptor
+from .models import ConfiguracionUsuario
 
 # Create your tests here.
+
+class EscriturasConfiguracionTests(TestCase):
+    """Pruebas de las escrituras de ConfiguracionUsuario al guardar usuarios"""
+
+    def crear_usuario(self, username='dueno'):
+        return get_user_model().objects.create_user(
+            username=username, password='secreto123', phone_number='5512345678'
+        )
+
+    def test_crear_usuario_crea_configuracion_con_un_insert(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            # INSERT del usuario e INSERT de su configuración
+            with self.assertNumQueries(2):
+                usuario = self.crear_usuario()
+        self.assertTrue(ConfiguracionUsuario.objects.filter(usuario=usuario).exists())
+
+    def test_actualizar_usuario_no_toca_la_configuracion(self):
+        usuario = get_user_model().objects.get(pk=self.crear_usuario().pk)
+        usuario.last_login = timezone.now()
+        # Solo el UPDATE del usuario
+        with self.assertNumQueries(1):
+            usuario.save(update_fields=['last_login'])
+
+    def test_configuracion_cargada_sin_cambios_no_se_guarda(self):
+        usuario = get_user_model().objects.select_related('configuracion').get(pk=self.crear_usuario().pk)
+        usuario.first_name = 'Ana'
+        with self.assertNumQueries(1):
+            usuario.save()
+
+    def test_configuracion_cargada_con_cambios_guarda_solo_los_campos_cambiados(self):
+        usuario = get_user_model().objects.select_related('configuracion').get(pk=self.crear_usuario().pk)
+        usuario.configuracion.radio_notificaciones = 10.0
+        with self.captureOnCommitCallbacks(execute=False):
+            with self.assertNumQueries(2):
+                usuario.save()
+        self.assertEqual(ConfiguracionUsuario.objects.get(usuario=usuario).radio_notificaciones, 10.0)
+
+    def test_crear_para_usuarios_usa_un_solo_insert(self):
+        modelo = get_user_model()
+        modelo.objects.bulk_create([
+            modelo(username=f'importado{i}', phone_number=f'55000000{i:02d}') for i in range(20)
+        ])
+        usuarios = modelo.objects.filter(username__startswith='importado')
+        self.assertFalse(ConfiguracionUsuario.objects.filter(usuario__in=usuarios).exists())
+
+        ids = list(usuarios.values_list('pk', flat=True))
+        with self.assertNumQueries(1):
+            ConfiguracionUsuario.objects.crear_para_usuarios(ids)
+        self.assertEqual(ConfiguracionUsuario.objects.filter(usuario__in=usuarios).count(), 20)
+
+
+def suscriptor(usuario_id, latitud, longitud, radio):
+    return Suscriptor(usuario_id, latitud, longitud, radio, True, True)
+
+
+class CeldasIndiceSuscriptoresTests(SimpleTestCase):
+    """Pruebas de la rejilla del índice de suscriptores"""
+
+    def ids(self, indice_suscriptores, latitud, longitud):
+        return {s.usuario_id for s in indice_suscriptores.candidatos(latitud, longitud)}
+
+    def test_radio_que_cruza_el_borde_de_la_celda(self):
+        indice_suscriptores = IndiceSuscriptores(0.1)
+        # A 100 m del borde norte de su celda, con 1 km de radio
+        indice_suscriptores.agregar(suscriptor(1, 19.499, -99.15, 1))
+
+        self.assertNotEqual(indice_suscriptores.celda(19.499, -99.15), indice_suscriptores.celda(19.501, -99.15))
+        self.assertEqual(self.ids(indice_suscriptores, 19.501, -99.15), {1})
+        self.assertEqual(self.ids(indice_suscriptores, 19.499, -99.15), {1})
+        # Dos celdas al norte ya queda fuera del rectángulo del radio
+        self.assertEqual(self.ids(indice_suscriptores, 19.61, -99.15), set())
+
+    def test_radio_que_cruza_el_antimeridiano(self):
+        indice_suscriptores = IndiceSuscriptores(0.1)
+        indice_suscriptores.agregar(suscriptor(1, 0.0, 179.995, 2))
+
+        self.assertEqual(self.ids(indice_suscriptores, 0.0, -179.995), {1})
+        self.assertEqual(self.ids(indice_suscriptores, 0.0, -179.5), set())
+
+    def test_cambio_de_radio_reemplaza_las_celdas(self):
+        indice_suscriptores = IndiceSuscriptores(0.1)
+        indice_suscriptores.agregar(suscriptor(1, 19.45, -99.15, 1))
+        self.assertEqual(self.ids(indice_suscriptores, 19.65, -99.15), set())
+
+        indice_suscriptores.agregar(suscriptor(1, 19.45, -99.15, 30))
+        self.assertEqual(self.ids(indice_suscriptores, 19.65, -99.15), {1})
+
+        indice_suscriptores.agregar(suscriptor(1, 19.45, -99.15, 1))
+        self.assertEqual(self.ids(indice_suscriptores, 19.65, -99.15), set())
+        self.assertEqual(len(indice_suscriptores), 1)
+
+    def test_eliminar(self):
+        indice_suscriptores = IndiceSuscriptores(0.1)
+        indice_suscriptores.agregar(suscriptor(1, 19.45, -99.15, 5))
+        indice_suscriptores.eliminar(1)
+        self.assertEqual(self.ids(indice_suscriptores, 19.45, -99.15), set())
+        self.assertEqual(len(indice_suscriptores), 0)
+
+
+class IndiceSuscriptoresTests(TestCase):
+    """Pruebas de la sincronización del índice de suscriptores con la base de datos"""
+
+    def setUp(self):
+        indice.invalidar_indice()
+        self.addCleanup(indice.invalidar_indice)
+        self.usuario = get_user_model().objects.create_user(
+            username='vecino', password='secreto123', phone_number='5512345678'
+        )
+        self.configurar(latitud_preferida=19.45, longitud_preferida=-99.15, radio_notificaciones=1)
+
+    def configurar(self, **campos):
+        configuracion = ConfiguracionUsuario.objects.get(usuario=self.usuario)
+        for campo, valor in campos.items():
+            setattr(configuracion, campo, valor)
+        with self.captureOnCommitCallbacks(execute=True):
+            configuracion.save()
+
+    def ids(self, latitud, longitud):
+        return {s.usuario_id for s in indice.obtener_indice().candidatos(latitud, longitud)}
+
+    def test_cambio_de_radio_en_este_proceso_no_reconstruye(self):
+        self.assertEqual(self.ids(19.65, -99.15), set())
+
+        self.configurar(radio_notificaciones=30)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(19.65, -99.15), {self.usuario.pk})
+
+        self.configurar(notificar_perdidos=False, notificar_encontrados=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(19.45, -99.15), set())
+
+    def test_cambio_en_otro_proceso_reconstruye_el_indice(self):
+        self.assertEqual(self.ids(19.65, -99.15), set())
+
+        # Otro proceso guarda la configuración: la base de datos cambia y
+        # la versión compartida se incrementa, pero este índice no se toca
+        ConfiguracionUsuario.objects.filter(usuario=self.usuario).update(radio_notificaciones=30)
+        cache.incr(indice.CLAVE_VERSION)
+
+        self.assertEqual(self.ids(19.65, -99.15), {self.usuario.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(19.65, -99.15), {self.usuario.pk})
+
+    def test_version_desalojada_reconstruye_el_indice(self):
+        self.ids(19.45, -99.15)
+        ConfiguracionUsuario.objects.filter(usuario=self.usuario).delete()
+        cache.delete(indice.CLAVE_VERSION)
+
+        self.assertEqual(self.ids(19.45, -99.15), set())
+
+    def test_procesar_cola_exige_cache_compartido(self):
+        for backend in indice.BACKENDS_CACHE_LOCALES:
+            with self.subTest(backend=backend), override_settings(CACHES={'default': {'BACKEND': backend}}):
+                with self.assertRaisesMessage(CommandError, 'local al proceso'):
+                    call_command('procesar_cola', '--una-vez', stdout=StringIO())
+
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        cache_archivos = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio.name}
+        with override_settings(CACHES={'default': cache_archivos}):
+            salida = StringIO()
+            call_command('procesar_cola', '--una-vez', stdout=salida)
+        self.assertIn('0 tarea(s) completada(s)', salida.getvalue())
@@ -6,7 +6,10 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pawtohome.settings')
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE',
+        'pawtohome.settings_produccion' if os.getenv('ENTORNO') == 'produccion' else 'pawtohome.settings',
+    )
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
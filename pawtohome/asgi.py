@@ -11,6 +11,9 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pawtohome.settings')
+os.environ.setdefault(
+    'DJANGO_SETTINGS_MODULE',
+    'pawtohome.settings_produccion' if os.getenv('ENTORNO') == 'produccion' else 'pawtohome.settings',
+)
 
 application = get_asgi_application()
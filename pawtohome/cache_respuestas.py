@@ -0,0 +1,199 @@
+"""
+Cache de respuestas completas de vistas GET, invalidado por etiquetas.
+
+Cada respuesta se guarda bajo una clave propia de la vista, la ruta y los
+parámetros de la consulta, junto con las versiones de sus etiquetas
+(``'feed'``, ``'reporte:<id>'``, ``'mapa:<z>:<x>:<y>'``...). Las señales
+llaman a ``invalidar()`` con las etiquetas afectadas, lo que incrementa su
+versión; una entrada cuyas etiquetas ya no coinciden se descarta al leerla.
+Así una modificación solo invalida las respuestas que la incluyen.
+
+Las versiones de las etiquetas fijas de la vista se toman antes de
+ejecutarla: si una invalidación llega mientras se genera la respuesta, la
+entrada ya nace vencida. Las etiquetas que la vista agrega con
+``etiquetar()`` solo se conocen después de consultar, así que además cada
+invalidación incrementa una generación global; si cambió durante la vista,
+la respuesta se entrega pero no se guarda.
+
+Las respuestas llevan ETag y se contesta 304 si el cliente ya la tiene.
+Funciona con cualquier backend de ``CACHES`` (memoria local o archivos en
+un solo nodo). ``estadisticas()`` reporta los aciertos y fallos por vista.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+# Segundos que una respuesta permanece en el cache si no se invalida antes
+TTL_RESPUESTAS_SEGUNDOS = 300
+
+_vistas = set()
+
+CLAVE_GENERACION = 'respuesta:generacion'
+
+
+def _clave_etiqueta(etiqueta):
+    return f"respuesta:etiqueta:{etiqueta}"
+
+
+def _clave_contador(vista, tipo):
+    return f"respuesta:{tipo}:{vista}"
+
+
+def _incrementar(clave, inicial):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, inicial, None)
+
+
+def versiones(etiquetas):
+    """
+    Retorna {etiqueta: version} de las etiquetas. Las que no existen aún (o
+    que el cache descartó) empiezan con una versión basada en el reloj para
+    no repetir una anterior.
+    """
+    claves = {_clave_etiqueta(etiqueta): etiqueta for etiqueta in etiquetas}
+    actuales = cache.get_many(list(claves))
+    for clave in claves:
+        if clave not in actuales:
+            cache.add(clave, time.time_ns(), None)
+            actuales[clave] = cache.get(clave)
+    return {claves[clave]: version for clave, version in actuales.items()}
+
+
+def invalidar(*etiquetas):
+    """Invalida todas las respuestas guardadas con alguna de las etiquetas"""
+    if not etiquetas:
+        return
+    # La generación cambia antes que las etiquetas: una vista que ve la
+    # etiqueta nueva también ve la generación nueva y no guarda su respuesta
+    _incrementar(CLAVE_GENERACION, time.time_ns())
+    for etiqueta in etiquetas:
+        _incrementar(_clave_etiqueta(etiqueta), time.time_ns())
+
+
+def etiquetar(request, *etiquetas):
+    """Agrega etiquetas a la respuesta que la vista en curso va a guardar"""
+    actuales = getattr(request, 'etiquetas_cache', None)
+    if actuales is not None:
+        actuales.update(etiquetas)
+
+
+def _vigente(entrada):
+    etiquetas = entrada['etiquetas']
+    if not etiquetas:
+        return True
+    claves = {_clave_etiqueta(etiqueta): version for etiqueta, version in etiquetas.items()}
+    actuales = cache.get_many(list(claves))
+    return all(actuales.get(clave) == version for clave, version in claves.items())
+
+
+def clave_respuesta(vista, request, parametros=None):
+    """
+    Clave de la respuesta de ``vista`` para la ruta y los parámetros GET de
+    ``request`` (todos, o solo ``parametros`` si se indican). El personal
+    tiene claves propias porque puede ver datos ocultos.
+    """
+    consulta = sorted(
+        (nombre, valor)
+        for nombre, valores in request.GET.lists()
+        if parametros is None or nombre in parametros
+        for valor in valores
+    )
+    personal = request.user.is_staff if hasattr(request, 'user') else False
+    huella = hashlib.md5(repr((request.path, consulta, personal)).encode()).hexdigest()
+    return f"respuesta:{vista}:{huella}"
+
+
+def _responder(request, entrada):
+    if entrada['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = HttpResponse(entrada['contenido'], content_type=entrada['tipo'])
+    respuesta['ETag'] = entrada['etag']
+    return respuesta
+
+
+def cache_respuesta(vista, etiquetas=(), parametros=None, ttl=None):
+    """
+    Decorador que guarda en cache las respuestas 200 de una vista GET.
+
+    ``etiquetas`` son las que aplican a todas sus respuestas; la vista puede
+    agregar otras según su contenido con ``etiquetar(request, ...)``.
+    """
+    _vistas.add(vista)
+
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return funcion(request, *args, **kwargs)
+
+            clave = clave_respuesta(vista, request, parametros)
+            entrada = cache.get(clave)
+            if entrada is not None and _vigente(entrada):
+                _incrementar(_clave_contador(vista, 'aciertos'), 1)
+                return _responder(request, entrada)
+            _incrementar(_clave_contador(vista, 'fallos'), 1)
+
+            generacion = cache.get(CLAVE_GENERACION)
+            fijas = versiones(etiquetas)
+            request.etiquetas_cache = set(etiquetas)
+            respuesta = funcion(request, *args, **kwargs)
+            if respuesta.status_code != 200 or respuesta.streaming or respuesta.has_header('Set-Cookie'):
+                return respuesta
+
+            entrada = {
+                'contenido': respuesta.content,
+                'tipo': respuesta['Content-Type'],
+                'etag': '"%s"' % hashlib.md5(respuesta.content).hexdigest(),
+                'etiquetas': {**versiones(request.etiquetas_cache - set(fijas)), **fijas},
+            }
+            if cache.get(CLAVE_GENERACION) == generacion:
+                cache.set(clave, entrada, ttl or getattr(settings, 'CACHE_RESPUESTAS_TTL', TTL_RESPUESTAS_SEGUNDOS))
+            if entrada['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+                respuesta = HttpResponseNotModified()
+            respuesta['ETag'] = entrada['etag']
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def estadisticas():
+    """
+    Retorna los aciertos, fallos y proporción de aciertos de cada vista y
+    del total. Con el backend en memoria local los contadores son por proceso.
+    """
+    claves = [
+        _clave_contador(vista, tipo)
+        for vista in sorted(_vistas)
+        for tipo in ('aciertos', 'fallos')
+    ]
+    contadores = cache.get_many(claves)
+
+    def resumen(aciertos, fallos):
+        total = aciertos + fallos
+        return {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'proporcion_aciertos': round(aciertos / total, 4) if total else None,
+        }
+
+    vistas = {}
+    for vista in sorted(_vistas):
+        vistas[vista] = resumen(
+            contadores.get(_clave_contador(vista, 'aciertos'), 0),
+            contadores.get(_clave_contador(vista, 'fallos'), 0),
+        )
+    return {
+        'vistas': vistas,
+        'total': resumen(
+            sum(datos['aciertos'] for datos in vistas.values()),
+            sum(datos['fallos'] for datos in vistas.values()),
+        ),
+    }
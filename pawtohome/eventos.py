@@ -0,0 +1,238 @@
+"""
+Publicación y suscripción de eventos en tiempo real.
+
+Las señales publican con ``publicar_al_confirmar(canal, datos)`` y cada
+conexión de Server-Sent Events (``Homeinfo.views.eventos``) se suscribe a
+sus canales: ``usuario:<id>`` para las notificaciones de un usuario y
+``mapa`` para los cambios del mapa. El broker se elige con
+``EVENTOS_BROKER``:
+
+- ``BrokerMemoria`` (por defecto) entrega los eventos dentro del proceso.
+  Alcanza cuando los eventos se publican en el mismo proceso que sirve
+  las conexiones (un solo proceso ASGI con ``COLA_TAREAS_INMEDIATA``).
+  Con la cola en ``procesar_cola`` las notificaciones se publican en el
+  proceso del trabajador; las conexiones las obtienen entonces consultando
+  la base de datos (``EVENTOS_SONDEO_SEGUNDOS``).
+- ``BrokerRedis`` reparte los eventos entre procesos con PUBLISH/PSUBSCRIBE
+  de Redis (``EVENTOS_REDIS_URL``); hace falta cuando las notificaciones
+  se crean en ``procesar_cola`` o hay varios procesos ASGI. Cada proceso
+  mantiene una sola suscripción a Redis y la reparte a sus conexiones.
+
+Una suscripción es una ``asyncio.Queue`` acotada atada al event loop que
+la creó; publicar desde otro hilo (las vistas y señales síncronas corren
+en hilos bajo ASGI) agenda una sola llamada por loop. Una conexión lenta
+que llena su cola pierde los eventos más viejos en lugar de frenar a las
+demás.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - Redis es opcional
+    redis = redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+BROKER_DEFECTO = 'pawtohome.eventos.BrokerMemoria'
+
+CANAL_MAPA = 'mapa'
+
+# Eventos que una suscripción guarda sin leer antes de descartar los más viejos
+MAXIMO_PENDIENTES = 100
+
+# Segundos de espera antes de reconectar a Redis
+ESPERA_RECONEXION = 1.0
+
+
+class Suscripcion:
+    """Eventos de uno o más canales para una conexión"""
+
+    def __init__(self, broker, canales, maximo=MAXIMO_PENDIENTES):
+        self.broker = broker
+        self.canales = tuple(canales)
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=maximo)
+        self.descartados = 0
+
+    def entregar(self, canal, datos):
+        """Agrega un evento a la cola; se llama desde el loop de la suscripción"""
+        if self.cola.full():
+            self.cola.get_nowait()
+            self.descartados += 1
+        self.cola.put_nowait((canal, datos))
+
+    async def recibir(self):
+        """Espera el siguiente evento y retorna (canal, datos)"""
+        return await self.cola.get()
+
+    def cerrar(self):
+        self.broker.cancelar(self)
+
+
+class Broker:
+    """Interfaz de los brokers de eventos"""
+
+    # Si los eventos publicados en un proceso llegan a las suscripciones de los demás
+    entre_procesos = False
+
+    def publicar(self, canal, datos):
+        """Publica ``datos`` (serializable a JSON) en ``canal``; se puede llamar desde cualquier hilo"""
+        raise NotImplementedError
+
+    def suscribir(self, canales, maximo=MAXIMO_PENDIENTES):
+        """Retorna una Suscripcion a ``canales``; se llama desde un event loop"""
+        raise NotImplementedError
+
+    def cancelar(self, suscripcion):
+        raise NotImplementedError
+
+
+class BrokerMemoria(Broker):
+    """Broker dentro del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = defaultdict(set)
+
+    def suscribir(self, canales, maximo=MAXIMO_PENDIENTES):
+        suscripcion = Suscripcion(self, canales, maximo)
+        with self._lock:
+            for canal in suscripcion.canales:
+                self._suscripciones[canal].add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            for canal in suscripcion.canales:
+                suscritas = self._suscripciones.get(canal)
+                if suscritas is not None:
+                    suscritas.discard(suscripcion)
+                    if not suscritas:
+                        del self._suscripciones[canal]
+
+    def suscriptores(self, canal):
+        with self._lock:
+            return len(self._suscripciones.get(canal, ()))
+
+    def publicar(self, canal, datos):
+        self.entregar_local(canal, datos)
+
+    def entregar_local(self, canal, datos):
+        """Entrega el evento a las suscripciones de este proceso"""
+        with self._lock:
+            destinos = list(self._suscripciones.get(canal, ()))
+        if not destinos:
+            return
+
+        por_loop = defaultdict(list)
+        for suscripcion in destinos:
+            por_loop[suscripcion.loop].append(suscripcion)
+        try:
+            actual = asyncio.get_running_loop()
+        except RuntimeError:
+            actual = None
+
+        for loop, suscripciones in por_loop.items():
+            if loop is actual:
+                _entregar(suscripciones, canal, datos)
+                continue
+            try:
+                loop.call_soon_threadsafe(_entregar, suscripciones, canal, datos)
+            except RuntimeError:
+                # El loop ya terminó: sus suscripciones no volverán a leer
+                for suscripcion in suscripciones:
+                    self.cancelar(suscripcion)
+
+
+def _entregar(suscripciones, canal, datos):
+    for suscripcion in suscripciones:
+        suscripcion.entregar(canal, datos)
+
+
+class BrokerRedis(BrokerMemoria):
+    """Broker entre procesos sobre PUBLISH/PSUBSCRIBE de Redis"""
+
+    prefijo = 'pawtohome:eventos:'
+    entre_procesos = True
+
+    def __init__(self, url=None):
+        if redis is None:
+            raise ImproperlyConfigured("BrokerRedis requiere el paquete redis.")
+        super().__init__()
+        self.url = url or getattr(settings, 'EVENTOS_REDIS_URL', None)
+        if not self.url:
+            raise ImproperlyConfigured("BrokerRedis requiere EVENTOS_REDIS_URL.")
+        self._cliente = redis.Redis.from_url(self.url)
+        self._oyentes = {}
+
+    def publicar(self, canal, datos):
+        self._cliente.publish(self.prefijo + canal, json.dumps(datos, default=str))
+
+    def suscribir(self, canales, maximo=MAXIMO_PENDIENTES):
+        suscripcion = super().suscribir(canales, maximo)
+        oyente = self._oyentes.get(suscripcion.loop)
+        if oyente is None or oyente.done():
+            self._oyentes[suscripcion.loop] = suscripcion.loop.create_task(self._escuchar())
+        return suscripcion
+
+    async def _escuchar(self):
+        """Reparte a las suscripciones locales los eventos publicados en Redis"""
+        while True:
+            cliente = redis_asyncio.Redis.from_url(self.url)
+            pubsub = cliente.pubsub()
+            try:
+                await pubsub.psubscribe(self.prefijo + '*')
+                async for mensaje in pubsub.listen():
+                    if mensaje['type'] != 'pmessage':
+                        continue
+                    canal = mensaje['channel'].decode()[len(self.prefijo):]
+                    self.entregar_local(canal, json.loads(mensaje['data']))
+            except redis.RedisError:
+                logger.exception("Se perdió la suscripción de eventos en Redis; reconectando")
+                await asyncio.sleep(ESPERA_RECONEXION)
+            finally:
+                await pubsub.aclose()
+                await cliente.aclose()
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def obtener_broker():
+    """Retorna el broker configurado en EVENTOS_BROKER (uno por proceso)"""
+    ruta = getattr(settings, 'EVENTOS_BROKER', BROKER_DEFECTO)
+    broker = _brokers.get(ruta)
+    if broker is None:
+        with _brokers_lock:
+            broker = _brokers.get(ruta)
+            if broker is None:
+                broker = _brokers[ruta] = import_string(ruta)()
+    return broker
+
+
+def publicar(canal, datos):
+    """Publica un evento; un error del broker se registra pero no se propaga"""
+    try:
+        obtener_broker().publicar(canal, datos)
+    except Exception:
+        logger.exception("No se pudo publicar el evento en %s", canal)
+
+
+def publicar_al_confirmar(canal, datos):
+    """Publica el evento cuando se confirme la transacción actual"""
+    transaction.on_commit(lambda: publicar(canal, datos))
+
+
+def canal_usuario(usuario_id):
+    return f"usuario:{usuario_id}"
@@ -0,0 +1,185 @@
+"""
+Instrumentación SQL por petición.
+
+``InstrumentacionSQLMiddleware`` envuelve la ejecución de consultas de
+una fracción de las peticiones (``INSTRUMENTACION_SQL_MUESTREO``) con
+``connection.execute_wrapper``, y por cada una registra el número de
+consultas, el tiempo total en la base de datos y cuántas veces se repitió
+cada consulta con los mismos placeholders. Una consulta repetida
+``INSTRUMENTACION_SQL_UMBRAL_N_MAS_1`` veces o más en una petición se
+reporta en el log como posible N+1.
+
+Los totales por vista se acumulan en memoria del proceso y se exponen en
+formato de texto de Prometheus con ``texto_prometheus()``; cada proceso
+del servidor reporta los suyos.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Fracción de peticiones instrumentadas (0 apaga la instrumentación)
+MUESTREO = 1.0
+
+# Ejecuciones de la misma consulta en una petición que se reportan como N+1
+UMBRAL_N_MAS_1 = 5
+
+# Límites superiores de los histogramas
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+LIMITES_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Listas de placeholders de IN (...) de cualquier longitud cuentan como la misma consulta
+_LISTA_PLACEHOLDERS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def huella(sql):
+    """Normaliza una consulta parametrizada para agrupar sus repeticiones"""
+    return _LISTA_PLACEHOLDERS.sub('(%s...)', sql)
+
+
+class RegistroPeticion:
+    """Consultas de una petición; se usa como ``execute_wrapper``"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.huellas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+            self.huellas[huella(sql)] += 1
+
+    def repetidas(self, umbral):
+        """Retorna [(huella, veces)] de las consultas repetidas ``umbral`` veces o más"""
+        return [(sql, veces) for sql, veces in self.huellas.most_common() if veces >= umbral]
+
+
+class _Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cubetas[i] += 1
+                break
+        else:
+            self.cubetas[-1] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Metricas:
+    """Histogramas de consultas y tiempo en BD por vista, en memoria del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._consultas = {}
+        self._segundos = {}
+        self._n_mas_1 = Counter()
+
+    def registrar(self, vista, registro, n_mas_1):
+        with self._lock:
+            if vista not in self._consultas:
+                self._consultas[vista] = _Histograma(LIMITES_CONSULTAS)
+                self._segundos[vista] = _Histograma(LIMITES_SEGUNDOS)
+            self._consultas[vista].observar(registro.consultas)
+            self._segundos[vista].observar(registro.segundos)
+            if n_mas_1:
+                self._n_mas_1[vista] += n_mas_1
+
+    def reiniciar(self):
+        with self._lock:
+            self._consultas.clear()
+            self._segundos.clear()
+            self._n_mas_1.clear()
+
+    def texto_prometheus(self):
+        """Retorna las métricas en el formato de texto de Prometheus 0.0.4"""
+        lineas = []
+        with self._lock:
+            for nombre, ayuda, histogramas in (
+                ('pawtohome_sql_consultas', 'Consultas SQL por petición', self._consultas),
+                ('pawtohome_sql_segundos', 'Tiempo en la base de datos por petición', self._segundos),
+            ):
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} histogram")
+                for vista in sorted(histogramas):
+                    histograma = histogramas[vista]
+                    etiqueta = _etiqueta(vista)
+                    acumulado = 0
+                    for limite, cantidad in zip(histograma.limites, histograma.cubetas):
+                        acumulado += cantidad
+                        lineas.append(f'{nombre}_bucket{{vista="{etiqueta}",le="{limite}"}} {acumulado}')
+                    lineas.append(f'{nombre}_bucket{{vista="{etiqueta}",le="+Inf"}} {histograma.total}')
+                    lineas.append(f'{nombre}_sum{{vista="{etiqueta}"}} {histograma.suma:.6g}')
+                    lineas.append(f'{nombre}_count{{vista="{etiqueta}"}} {histograma.total}')
+
+            lineas.append("# HELP pawtohome_sql_n_mas_1_total Consultas repetidas que superaron el umbral de N+1")
+            lineas.append("# TYPE pawtohome_sql_n_mas_1_total counter")
+            for vista in sorted(self._n_mas_1):
+                lineas.append(f'pawtohome_sql_n_mas_1_total{{vista="{_etiqueta(vista)}"}} {self._n_mas_1[vista]}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiqueta(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metricas = Metricas()
+
+
+def _nombre_vista(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return 'sin_ruta'
+    return coincidencia.view_name or coincidencia._func_path
+
+
+class InstrumentacionSQLMiddleware:
+    """
+    Registra las consultas de una muestra de las peticiones por vista.
+    Conviene ponerlo al inicio de MIDDLEWARE para contar también las
+    consultas de sesión y autenticación.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        muestreo = getattr(settings, 'INSTRUMENTACION_SQL_MUESTREO', MUESTREO)
+        if muestreo <= 0 or (muestreo < 1 and random.random() >= muestreo):
+            return self.get_response(request)
+
+        registro = RegistroPeticion()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(registro))
+            respuesta = self.get_response(request)
+
+        vista = _nombre_vista(request)
+        umbral = getattr(settings, 'INSTRUMENTACION_SQL_UMBRAL_N_MAS_1', UMBRAL_N_MAS_1)
+        repetidas = registro.repetidas(umbral)
+        for sql, veces in repetidas:
+            logger.warning(
+                "Posible N+1 en %s (%s %s): %d ejecuciones de %s",
+                vista, request.method, request.path, veces, sql[:300],
+            )
+        metricas.registrar(vista, registro, len(repetidas))
+        return respuesta
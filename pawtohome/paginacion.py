@@ -0,0 +1,165 @@
+"""
+Paginación por cursor (keyset) para listas ordenadas por fecha.
+
+En lugar de OFFSET, cada página se pide a partir de la última fila de la
+anterior: ``WHERE (fecha, id) < (fecha_cursor, id_cursor)``. Con un índice
+sobre (fecha, id) el costo de una página no depende de su profundidad.
+
+``PaginadorEstimado`` es un Paginator para tablas muy grandes: por encima
+de un umbral reporta el total que estima el planificador de PostgreSQL (o
+un conteo exacto guardado en cache en otros motores) en lugar de correr
+un COUNT(*) en cada página.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Filas a partir de las que se usa el total estimado
+UMBRAL_CONTEO = 100000
+
+# Segundos que se reutiliza un conteo exacto cuando no hay estimación del planificador
+CONTEO_CACHE_TTL = 600
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(fecha, pk):
+    """Codifica (fecha, pk) como una cadena opaca segura para URLs"""
+    datos = json.dumps([fecha.isoformat(), pk if isinstance(pk, int) else str(pk)])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna la tupla (fecha, pk) codificada en ``cursor``"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, pk = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        fecha = parse_datetime(fecha)
+    except (ValueError, TypeError):
+        raise CursorInvalido("El cursor no es válido.")
+    if fecha is None:
+        raise CursorInvalido("El cursor no es válido.")
+    return fecha, pk
+
+
+def filtrar_desde_cursor(queryset, campo_fecha, cursor=None):
+    """
+    Ordena ``queryset`` en orden descendente por (campo_fecha, pk) y deja
+    solo las filas que siguen a ``cursor``.
+    """
+    queryset = queryset.order_by(f'-{campo_fecha}', '-pk')
+    if cursor:
+        fecha, pk = decodificar_cursor(cursor)
+        # El cursor viene del cliente: un pk de otro tipo (un UUID alterado,
+        # por ejemplo) fallaría después al armar la consulta
+        try:
+            pk = queryset.model._meta.pk.to_python(pk)
+        except (ValidationError, ValueError, TypeError):
+            raise CursorInvalido("El cursor no es válido.")
+        if pk is None:
+            raise CursorInvalido("El cursor no es válido.")
+        # La condición fecha <= cursor permite recorrer el índice por rango;
+        # la segunda desempata las filas con la misma fecha
+        queryset = queryset.filter(**{f'{campo_fecha}__lte': fecha}).filter(
+            Q(**{f'{campo_fecha}__lt': fecha}) | Q(pk__lt=pk)
+        )
+    return queryset
+
+
+def paginar_por_cursor(queryset, campo_fecha, cursor=None, limite=20):
+    """
+    Retorna (filas, siguiente_cursor) de la página que sigue a ``cursor``,
+    en orden descendente por (campo_fecha, pk). ``siguiente_cursor`` es
+    None en la última página.
+    """
+    queryset = filtrar_desde_cursor(queryset, campo_fecha, cursor)
+    filas = list(queryset[:limite + 1])
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    ultima = filas[-1]
+    return filas, codificar_cursor(getattr(ultima, campo_fecha), ultima.pk)
+
+
+def estimar_filas(queryset):
+    """
+    Retorna el número de filas de ``queryset`` que estima el planificador,
+    o None si el motor no ofrece estimaciones (solo PostgreSQL las da).
+    Sin filtros se usa ``pg_class.reltuples``; con filtros, el plan de
+    EXPLAIN.
+    """
+    conexion = connections[queryset.db]
+    if conexion.vendor != 'postgresql':
+        return None
+    with conexion.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [conexion.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            fila = cursor.fetchone()
+            # reltuples es negativo o 0 si la tabla nunca se analizó
+            return int(fila[0]) if fila and fila[0] > 0 else None
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def clave_conteo(queryset):
+    """Clave de cache del conteo de ``queryset`` (misma consulta, misma clave)"""
+    sql, params = queryset.query.sql_with_params()
+    return 'conteo:' + hashlib.md5(f"{queryset.db}:{sql}:{params!r}".encode()).hexdigest()
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator que evita el COUNT(*) exacto en tablas grandes.
+
+    Si el planificador estima ``umbral`` filas o más, ``count`` es esa
+    estimación. Sin estimación (SQLite), los conteos exactos de ``umbral``
+    filas o más se guardan en cache ``ttl`` segundos. ``estimado`` indica
+    si ``count`` puede no ser exacto; ``exacto=True`` siempre cuenta.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 umbral=UMBRAL_CONTEO, exacto=False, ttl=CONTEO_CACHE_TTL):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.umbral = umbral
+        self.exacto = exacto
+        self.ttl = ttl
+        self.estimado = False
+
+    @cached_property
+    def count(self):
+        if self.exacto:
+            return super().count
+
+        estimacion = estimar_filas(self.object_list)
+        if estimacion is not None:
+            if estimacion >= self.umbral:
+                self.estimado = True
+                return estimacion
+            return super().count
+
+        clave = clave_conteo(self.object_list)
+        total = cache.get(clave)
+        if total is not None:
+            self.estimado = True
+            return total
+        total = super().count
+        if total >= self.umbral:
+            cache.set(clave, total, self.ttl)
+        return total
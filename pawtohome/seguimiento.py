@@ -0,0 +1,84 @@
+"""
+Seguimiento de cambios en instancias de modelos sin consultas adicionales.
+"""
+
+
+class SeguimientoCambiosMixin:
+    """
+    Mixin para modelos que recuerda los valores de ``campos_seguidos`` con
+    los que se cargó la instancia desde la base de datos, para poder saber
+    qué cambió antes de guardar sin volver a consultarla.
+
+    Uso::
+
+        class Reporte(SeguimientoCambiosMixin, models.Model):
+            campos_seguidos = ('estado',)
+
+        reporte.has_changed('estado')
+    """
+
+    campos_seguidos = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_valores_originales()
+        return instancia
+
+    def _attname(self, campo):
+        return self._meta.get_field(campo).attname
+
+    def _guardar_valores_originales(self, campos=None):
+        # Los campos diferidos (.only()/.defer()) no están en __dict__
+        originales = getattr(self, '_valores_originales', {})
+        for campo in self.campos_seguidos if campos is None else campos:
+            attname = self._attname(campo)
+            if attname in self.__dict__:
+                originales[campo] = self.__dict__[attname]
+        self._valores_originales = originales
+
+    def tiene_valor_original(self, campo):
+        """Indica si se conoce el valor con el que se cargó ``campo``"""
+        return campo in getattr(self, '_valores_originales', {})
+
+    def valor_original(self, campo):
+        """
+        Retorna el valor de ``campo`` al cargar la instancia, o el valor
+        actual si no se conoce
+        """
+        originales = getattr(self, '_valores_originales', {})
+        if campo in originales:
+            return originales[campo]
+        return getattr(self, self._attname(campo))
+
+    def has_changed(self, campo):
+        """
+        Indica si ``campo`` cambió desde que se cargó o guardó la instancia.
+        Si no se conoce el valor original (instancia nueva o campo diferido)
+        se asume que sí cambió.
+        """
+        if not self.tiene_valor_original(campo):
+            return True
+        return self._valores_originales[campo] != getattr(self, self._attname(campo))
+
+    def cambios(self):
+        """Retorna {campo: (original, actual)} de los campos seguidos que cambiaron"""
+        return {
+            campo: (self.valor_original(campo), getattr(self, self._attname(campo)))
+            for campo in self.campos_seguidos
+            if self.has_changed(campo)
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._guardar_valores_originales()
+        else:
+            self._guardar_valores_originales(
+                [campo for campo in self.campos_seguidos if campo in update_fields]
+            )
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._guardar_valores_originales()
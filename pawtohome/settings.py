@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'pawtohome.instrumentacion.InstrumentacionSQLMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,6 +80,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'Homeinfo.context_processors.notificaciones',
             ],
         },
     },
@@ -102,6 +104,31 @@ if os.getenv("DB_NAME"):
             'PORT': os.getenv("DB_PORT"),
         }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Cache: archivos en CACHE_DIR si se indica, memoria local si no (un solo
+# proceso; procesar_cola exige un cache compartido)
+if os.getenv("CACHE_DIR"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv("CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pawtohome',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -154,3 +181,80 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'loginservice.CustomUser'
+
+# Índice espacial en memoria de suscriptores a notificaciones por proximidad
+INDICE_SUSCRIPTORES_TAMANO_CELDA = 0.1  # Grados por celda de la rejilla
+INDICE_SUSCRIPTORES_TTL = 300  # Segundos antes de reconstruir desde la BD (los cambios lo reconstruyen antes)
+
+# Filas por INSERT al crear notificaciones en lote (bulk_create)
+NOTIFICACIONES_TAMANO_LOTE = 500
+
+# Cola de tareas en segundo plano (manage.py procesar_cola)
+COLA_TAREAS_INMEDIATA = False  # True ejecuta las tareas al confirmar la transacción, sin trabajador
+COLA_TIEMPO_BLOQUEO = 300  # Segundos antes de reclamar de nuevo una tarea abandonada
+COLA_ESPERA_REINTENTO = 10  # Segundos base del reintento exponencial
+
+# Segundos que los clusters del mapa permanecen en cache (las señales los invalidan antes)
+CLUSTERS_CACHE_TTL = 3600
+
+# Procesos del pool que genera las variantes de las fotos en cada trabajador.
+# Con 1 se generan en el propio trabajador; el total de procesos es este valor
+# por el --procesos de procesar_cola (None = número de CPUs)
+IMAGENES_PROCESOS = 1
+
+# Segundos que el contador de notificaciones no leídas permanece en cache
+CONTADOR_NOTIFICACIONES_TTL = 600
+
+# Correo: SMTP en EMAIL_HOST:EMAIL_PORT (para un servidor de depuración local,
+# EMAIL_PORT=1025); EMAIL_BACKEND permite usar el backend de consola
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "false") == "true"
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "PawsToHome <no-responder@pawstohome.local>")
+
+# URL pública del sitio para los enlaces de los correos
+SITIO_URL = os.getenv("SITIO_URL", "http://localhost:8000")
+
+# Eventos en tiempo real (Server-Sent Events en /notificaciones/eventos/, requiere ASGI)
+# BrokerMemoria entrega dentro del proceso: las notificaciones creadas por
+# procesar_cola se obtienen consultando cada EVENTOS_SONDEO_SEGUNDOS, y los
+# eventos del mapa de otros procesos ASGI no llegan. BrokerRedis (REDIS_URL)
+# reparte todo entre procesos sin consultar.
+EVENTOS_BROKER = 'pawtohome.eventos.BrokerMemoria'
+EVENTOS_REDIS_URL = os.getenv("REDIS_URL")
+EVENTOS_LATIDO_SEGUNDOS = 20  # Comentario SSE enviado si no hubo eventos en este intervalo
+EVENTOS_SONDEO_SEGUNDOS = 5  # Consulta de notificaciones nuevas sin broker entre procesos
+
+# Resúmenes de notificaciones por email (manage.py enviar_resumenes_email)
+RESUMEN_EMAIL_VENTANA_MINUTOS = 60  # Como máximo un resumen por usuario en este intervalo
+RESUMEN_EMAIL_ANTIGUEDAD_HORAS = 48  # Las notificaciones más antiguas ya no se envían
+RESUMEN_EMAIL_LOTE = 100  # Mensajes por lote enviado en la misma conexión SMTP
+
+# Retención de notificaciones (manage.py purgar_notificaciones)
+RETENCION_NOTIFICACIONES_LEIDAS_DIAS = 90  # Las leídas se eliminan después de estos días
+RETENCION_NOTIFICACIONES_MESES = 12  # Cualquier notificación se elimina después de estos meses
+
+# Motor de coincidencias entre reportes perdidos y encontrados
+COINCIDENCIAS_RADIO_KM = 5.0  # Distancia máxima entre los dos reportes
+COINCIDENCIAS_VENTANA_DIAS = 30  # Diferencia máxima entre las fechas de los incidentes
+COINCIDENCIAS_TOP_K = 10  # Coincidencias guardadas por reporte
+COINCIDENCIAS_PUNTUACION_MINIMA = 0.3
+
+# Zoom máximo con celdas precalculadas del mapa de calor de avistamientos
+CALOR_ZOOM_MAXIMO = 16
+
+# Segundos que una respuesta cacheada de home, mapa o feed permanece en cache
+# (las señales la invalidan antes si cambia algo que incluye)
+CACHE_RESPUESTAS_TTL = 300
+
+# Changelists del admin de tablas grandes (Homeinfo.changelist): filas a partir
+# de las que se muestra el total estimado en lugar de un COUNT(*) exacto
+ADMIN_CONTEO_UMBRAL = 100000
+
+# Instrumentación SQL por petición (pawtohome.instrumentacion)
+INSTRUMENTACION_SQL_MUESTREO = 1.0  # Fracción de peticiones instrumentadas
+INSTRUMENTACION_SQL_UMBRAL_N_MAS_1 = 5  # Repeticiones de una consulta que se reportan como N+1
+INSTRUMENTACION_METRICAS_TOKEN = os.getenv("METRICAS_TOKEN")  # Bearer para /metrics; sin él, solo personal
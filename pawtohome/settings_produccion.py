@@ -0,0 +1,118 @@
+"""
+Perfil de producción de pawtohome.
+
+Se selecciona con ``ENTORNO=produccion`` (manage.py, wsgi.py y asgi.py) o
+con ``DJANGO_SETTINGS_MODULE=pawtohome.settings_produccion``. Parte de
+``settings.py`` y cambia lo que no conviene en producción:
+
+- DEBUG apagado; SECRET_KEY, ALLOWED_HOSTS y DB_NAME obligatorios.
+- PostgreSQL con pool de conexiones de psycopg 3 (``psycopg_pool``) o, si
+  no está instalado, conexiones persistentes con CONN_MAX_AGE.
+- Cache compartido: Redis si hay REDIS_URL, archivos en CACHE_DIR si no.
+  Las sesiones usan ``cached_db``. Con REDIS_URL los eventos en tiempo
+  real se reparten entre procesos con ``BrokerRedis``.
+- Loader de templates con cache.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, TEMPLATES
+
+try:
+    import psycopg_pool
+except ImportError:  # pragma: no cover - el pool es opcional
+    psycopg_pool = None
+
+DEBUG = False
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    raise ImproperlyConfigured("SECRET_KEY es obligatorio en producción.")
+
+ALLOWED_HOSTS = [host.strip() for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host.strip()]
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured("ALLOWED_HOSTS es obligatorio en producción (separados por comas).")
+
+
+# Base de datos
+
+if not os.getenv("DB_NAME"):
+    raise ImproperlyConfigured("DB_NAME es obligatorio en producción.")
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv("DB_NAME"),
+        'USER': os.getenv("DB_USER"),
+        'PASSWORD': os.getenv("DB_PASSWORD"),
+        'HOST': os.getenv("DB_HOST"),
+        'PORT': os.getenv("DB_PORT"),
+        # Verifica una conexión reutilizada antes de usarla tras un error
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+if psycopg_pool is not None and os.getenv("DB_POOL", "true") == "true":
+    # Cada proceso mantiene entre DB_POOL_MIN y DB_POOL_MAX conexiones abiertas;
+    # Django no permite combinar el pool con CONN_MAX_AGE
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv("DB_POOL_MIN", 2)),
+            'max_size': int(os.getenv("DB_POOL_MAX", 10)),
+            'timeout': int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        },
+    }
+else:
+    # Sin pool: una conexión persistente por proceso durante CONN_MAX_AGE segundos
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("CONN_MAX_AGE", 600))
+
+
+# Cache
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    # Archivos compartidos por todos los procesos del nodo
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv("CACHE_DIR", str(BASE_DIR / 'cache')),
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+if os.getenv("REDIS_URL"):
+    EVENTOS_BROKER = 'pawtohome.eventos.BrokerRedis'
+
+
+# Templates: se compilan una vez por proceso
+
+TEMPLATES = [dict(TEMPLATES[0], APP_DIRS=False)]
+TEMPLATES[0]['OPTIONS'] = dict(TEMPLATES[0]['OPTIONS'], loaders=[
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+])
+
+
+# Instrumentación SQL: una muestra de las peticiones para mantener bajo el costo
+
+INSTRUMENTACION_SQL_MUESTREO = float(os.getenv("INSTRUMENTACION_SQL_MUESTREO", 0.05))
+
+
+# Seguridad
+
+SESSION_COOKIE_SECURE = os.getenv("COOKIES_SEGURAS", "true") == "true"
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
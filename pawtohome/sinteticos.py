@@ -0,0 +1,187 @@
+"""
+Datos sintéticos para benchmarks.
+
+Los puntos se concentran alrededor de ciudades (distribución normal con
+una desviación de ~15 km) y una fracción se dispersa por el país, como
+ocurre con los reportes reales. Todo se inserta con bulk_create, así que
+no se disparan señales: el índice de búsqueda, el mapa de calor y las
+coincidencias se reconstruyen con sus propios comandos si se necesitan.
+
+Los usuarios sintéticos usan el prefijo ``PREFIJO_USUARIO`` y se pueden
+borrar con ``eliminar_datos()``; el borrado en cascada elimina el resto.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+# Centros urbanos (lat, lon) alrededor de los que se concentran los datos
+CIUDADES = [
+    (19.4326, -99.1332), (20.6597, -103.3496), (25.6866, -100.3161),
+    (19.0414, -98.2063), (21.1619, -86.8515), (32.5149, -117.0382),
+    (20.9674, -89.5926), (21.8853, -102.2916), (16.7569, -93.1292),
+    (22.1565, -100.9855), (28.6330, -106.0691), (19.1738, -96.1342),
+]
+
+# Fracción de puntos alrededor de una ciudad; el resto se dispersa en el país
+FRACCION_URBANA = 0.8
+
+PREFIJO_USUARIO = 'sintetico_'
+
+COLORES = ['negro', 'blanco', 'café', 'café claro', 'gris', 'dorado', 'negro y blanco', 'canela', 'atigrado']
+NOMBRES = ['Firulais', 'Max', 'Luna', 'Rocky', 'Canela', 'Toby', 'Nala', 'Chispa', 'Bruno', 'Kira']
+ZONAS = ['Centro', 'Norte', 'Sur', 'Oriente', 'Poniente']
+
+TAMANO_LOTE = 2000
+
+
+def punto(rng, desviacion=0.15):
+    """Retorna (latitud, longitud) de un punto sintético"""
+    if rng.random() < FRACCION_URBANA:
+        centro = rng.choice(CIUDADES)
+        return rng.gauss(centro[0], desviacion), rng.gauss(centro[1], desviacion)
+    return rng.uniform(15.0, 32.0), rng.uniform(-117.0, -87.0)
+
+
+def cerca_de(rng, latitud, longitud, desviacion=0.01):
+    """Retorna un punto a ~1 km de (latitud, longitud)"""
+    return rng.gauss(latitud, desviacion), rng.gauss(longitud, desviacion)
+
+
+def _insertar(modelo, objetos, tamano_lote):
+    return modelo.objects.bulk_create(objetos, batch_size=tamano_lote)
+
+
+def sembrar(usuarios, reportes, avistamientos, comentarios, notificaciones,
+            semilla=42, dias=365, tamano_lote=TAMANO_LOTE):
+    """
+    Crea los datos sintéticos y retorna un diccionario con las cantidades
+    creadas de cada modelo. Crea además un superusuario
+    ``<PREFIJO_USUARIO>admin`` para medir el admin.
+    """
+    from Homeinfo.models import Notificacion
+    from ProfileService.models import ConfiguracionUsuario
+    from reportsservice.models import Avistamiento, Comentario, Reporte
+
+    User = get_user_model()
+    rng = random.Random(semilla)
+    ahora = timezone.now()
+
+    def fecha():
+        return ahora - timedelta(seconds=rng.uniform(0, dias * 86400))
+
+    with transaction.atomic():
+        admin = User(
+            username=f'{PREFIJO_USUARIO}admin', phone_number='0000000000',
+            is_staff=True, is_superuser=True,
+        )
+        admin.set_unusable_password()
+        cuentas = _insertar(User, [admin] + [
+            User(
+                username=f'{PREFIJO_USUARIO}{i}',
+                email=f'{PREFIJO_USUARIO}{i}@example.com',
+                phone_number=f'{rng.randrange(10 ** 10):010d}',
+                password='!',
+            )
+            for i in range(usuarios)
+        ], tamano_lote)
+        cuentas = cuentas[1:] or cuentas
+        ids_usuarios = [cuenta.pk for cuenta in cuentas]
+
+        configuraciones = []
+        for usuario_id in ids_usuarios:
+            latitud, longitud = punto(rng)
+            configuraciones.append(ConfiguracionUsuario(
+                usuario_id=usuario_id,
+                latitud_preferida=latitud,
+                longitud_preferida=longitud,
+                radio_notificaciones=rng.choice([1.0, 2.0, 5.0, 5.0, 10.0, 20.0]),
+                notificar_perdidos=rng.random() < 0.9,
+                notificar_encontrados=rng.random() < 0.7,
+            ))
+        _insertar(ConfiguracionUsuario, configuraciones, tamano_lote)
+
+        creados_reportes = []
+        for _ in range(reportes):
+            latitud, longitud = punto(rng)
+            incidente = fecha()
+            creados_reportes.append(Reporte(
+                usuario_id=rng.choice(ids_usuarios),
+                tipo_reporte='perdido' if rng.random() < 0.6 else 'encontrado',
+                estado=rng.choices(['activo', 'en_proceso', 'cerrado'], [0.7, 0.1, 0.2])[0],
+                nombre_perro=rng.choice(NOMBRES),
+                color=rng.choice(COLORES),
+                tamano=rng.choice(['pequeño', 'mediano', 'grande', 'gigante']),
+                descripcion=f"Perro {rng.choice(COLORES)} con collar",
+                latitud=latitud,
+                longitud=longitud,
+                direccion='Dirección sintética',
+                zona=rng.choice(ZONAS),
+                fecha_incidente=incidente,
+                fecha_reporte=incidente + timedelta(hours=rng.uniform(0, 48)),
+                telefono_contacto='0000000000',
+                email_contacto='sintetico@example.com',
+            ))
+        creados_reportes = _insertar(Reporte, creados_reportes, tamano_lote)
+
+        def reporte_al_azar():
+            return rng.choice(creados_reportes)
+
+        creados_avistamientos = []
+        for _ in range(avistamientos):
+            reporte = reporte_al_azar()
+            latitud, longitud = cerca_de(rng, reporte.latitud, reporte.longitud)
+            creados_avistamientos.append(Avistamiento(
+                reporte_id=reporte.pk,
+                usuario_id=rng.choice(ids_usuarios),
+                latitud=latitud,
+                longitud=longitud,
+                direccion='Dirección sintética',
+                fecha_avistamiento=reporte.fecha_incidente + timedelta(hours=rng.uniform(1, 240)),
+                descripcion='Avistamiento sintético',
+                confianza=rng.randint(1, 10),
+            ))
+        _insertar(Avistamiento, creados_avistamientos, tamano_lote)
+
+        tipos_comentario = [tipo for tipo, _ in Comentario.TIPO_COMENTARIO_CHOICES]
+        _insertar(Comentario, [
+            Comentario(
+                reporte_id=reporte_al_azar().pk,
+                usuario_id=rng.choice(ids_usuarios),
+                tipo=rng.choice(tipos_comentario),
+                contenido='Comentario sintético',
+                fecha_comentario=fecha(),
+            )
+            for _ in range(comentarios)
+        ], tamano_lote)
+
+        # Las notificaciones se concentran en pocos usuarios, como en la
+        # difusión real donde los vecinos de zonas densas reciben más
+        activos = ids_usuarios[:max(1, len(ids_usuarios) // 10)]
+        _insertar(Notificacion, [
+            Notificacion(
+                usuario_id=rng.choice(activos),
+                reporte_id=reporte_al_azar().pk,
+                tipo='nuevo_reporte',
+                titulo='Nuevo reporte cerca de ti',
+                mensaje='Notificación sintética',
+                fecha_creacion=fecha(),
+                leida=rng.random() < 0.5,
+            )
+            for _ in range(notificaciones)
+        ], tamano_lote)
+
+    return {
+        'usuarios': len(ids_usuarios),
+        'reportes': len(creados_reportes),
+        'avistamientos': avistamientos,
+        'comentarios': comentarios,
+        'notificaciones': notificaciones,
+    }
+
+
+def eliminar_datos():
+    """Elimina los usuarios sintéticos y, en cascada, todos sus datos"""
+    return get_user_model().objects.filter(username__startswith=PREFIJO_USUARIO).delete()
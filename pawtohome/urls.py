@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
+from . import views
 
 urlpatterns = [
     
@@ -33,6 +34,9 @@ urlpatterns = [
     
     # Admin
     path('admin/', admin.site.urls),
+    
+    # Métricas de instrumentación SQL para Prometheus
+    path('metrics', views.metricas, name='metricas'),
 
     # Ruta principal
 ]
@@ -1,4 +1,27 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import instrumentacion
 
 # Las vistas principales ahora están manejadas por las aplicaciones específicas
-# La vista home se ha movido a la aplicación Homeinfo
\ No newline at end of file
+# La vista home se ha movido a la aplicación Homeinfo
+
+def metricas(request):
+    """
+    Métricas de instrumentación SQL en formato de texto de Prometheus.
+    Requiere ``Authorization: Bearer <INSTRUMENTACION_METRICAS_TOKEN>`` si
+    el token está configurado, o una sesión del personal si no.
+    """
+    token = getattr(settings, 'INSTRUMENTACION_METRICAS_TOKEN', None)
+    if token:
+        autorizado = constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}")
+    else:
+        autorizado = request.user.is_staff
+    if not autorizado:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        instrumentacion.metricas.texto_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
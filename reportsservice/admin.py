@@ -1,6 +1,12 @@
 from django.contrib import admin
+from django.db.models import Q
 from django.utils.html import format_html
-from .models import Raza, Reporte, FotoReporte, Avistamiento, Comentario
+from Homeinfo.changelist import ChangelistGrandeMixin
+from .busqueda import buscar_reportes
+from .models import Raza, Reporte, FotoReporte, Avistamiento, Comentario, CoincidenciaReporte
+
+# Máximo de coincidencias de texto que se consideran en la búsqueda del admin
+LIMITE_BUSQUEDA_ADMIN = 1000
 
 @admin.register(Raza)
 class RazaAdmin(admin.ModelAdmin):
@@ -20,12 +26,14 @@ class AvistamientoInline(admin.TabularInline):
     extra = 0
     fields = ['usuario', 'fecha_avistamiento', 'confianza', 'verificado']
     readonly_fields = ['fecha_reporte_avistamiento']
+    raw_id_fields = ['usuario']
 
 class ComentarioInline(admin.TabularInline):
     model = Comentario
     extra = 0
     fields = ['usuario', 'tipo', 'contenido']
     readonly_fields = ['fecha_comentario']
+    raw_id_fields = ['usuario']
 
 @admin.register(Reporte)
 class ReporteAdmin(admin.ModelAdmin):
@@ -74,22 +82,45 @@ class ReporteAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('usuario', 'raza')
+    
+    def get_search_results(self, request, queryset, search_term):
+        # El texto se busca en el índice de texto completo; los datos del
+        # usuario y la zona solo por coincidencia exacta para usar índices
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        ids = [
+            reporte_id for reporte_id, _ in buscar_reportes(
+                search_term, limite=LIMITE_BUSQUEDA_ADMIN, solo_visibles=False
+            )
+        ]
+        return queryset.filter(
+            Q(pk__in=ids) |
+            Q(zona=search_term) |
+            Q(usuario__username=search_term) |
+            Q(usuario__email=search_term)
+        ), False
 
 @admin.register(FotoReporte)
 class FotoReporteAdmin(admin.ModelAdmin):
-    list_display = ['reporte', 'descripcion', 'es_principal', 'orden', 'fecha_subida']
-    list_filter = ['es_principal', 'fecha_subida']
+    list_display = ['reporte', 'descripcion', 'es_principal', 'orden', 'procesada', 'fecha_subida']
+    list_filter = ['es_principal', 'procesada', 'fecha_subida']
     search_fields = ['reporte__nombre_perro', 'descripcion']
-    readonly_fields = ['fecha_subida']
+    readonly_fields = ['fecha_subida', 'procesada', 'error_procesamiento']
+    list_select_related = ['reporte']
+    raw_id_fields = ['reporte']
     
     def imagen_thumbnail(self, obj):
+        miniatura = obj.variante('miniatura')
+        if miniatura:
+            return format_html('<img src="{}" width="{}" height="{}" />', miniatura.imagen.url, miniatura.ancho, miniatura.alto)
         if obj.imagen:
             return format_html('<img src="{}" width="100" height="100" />', obj.imagen.url)
         return "Sin imagen"
     imagen_thumbnail.short_description = "Vista previa"
 
 @admin.register(Avistamiento)
-class AvistamientoAdmin(admin.ModelAdmin):
+class AvistamientoAdmin(ChangelistGrandeMixin, admin.ModelAdmin):
     list_display = [
         'reporte', 'usuario', 'fecha_avistamiento', 
         'confianza', 'verificado', 'fecha_reporte_avistamiento'
@@ -100,6 +131,9 @@ class AvistamientoAdmin(admin.ModelAdmin):
         'descripcion', 'direccion'
     ]
     readonly_fields = ['fecha_reporte_avistamiento']
+    campo_keyset = 'fecha_avistamiento'
+    list_select_related = ['reporte', 'usuario']
+    raw_id_fields = ['reporte', 'usuario']
     
     fieldsets = (
         ('Información del Avistamiento', {
@@ -117,13 +151,17 @@ class AvistamientoAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Comentario)
-class ComentarioAdmin(admin.ModelAdmin):
+class ComentarioAdmin(ChangelistGrandeMixin, admin.ModelAdmin):
     list_display = ['reporte', 'usuario', 'tipo', 'fecha_comentario']
     list_filter = ['tipo', 'fecha_comentario']
     search_fields = [
         'reporte__nombre_perro', 'usuario__username', 'contenido'
     ]
     readonly_fields = ['fecha_comentario']
+    ordering = ['-fecha_comentario']
+    campo_keyset = 'fecha_comentario'
+    list_select_related = ['reporte', 'usuario']
+    raw_id_fields = ['reporte', 'usuario']
     
     fieldsets = (
         ('Información del Comentario', {
@@ -140,3 +178,10 @@ class ComentarioAdmin(admin.ModelAdmin):
             'fields': ('fecha_comentario',)
         }),
     )
+
+@admin.register(CoincidenciaReporte)
+class CoincidenciaReporteAdmin(admin.ModelAdmin):
+    list_display = ['reporte', 'candidato', 'puntuacion', 'distancia_km', 'diferencia_horas', 'fecha_calculo']
+    list_select_related = ['reporte', 'candidato']
+    raw_id_fields = ['reporte', 'candidato']
+    readonly_fields = ['puntuacion', 'distancia_km', 'diferencia_horas', 'fecha_calculo']
@@ -1,4 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def crear_indice_busqueda(sender, **kwargs):
+    from .busqueda import crear_indice
+    crear_indice()
+
 
 class ReportsserviceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -7,3 +14,4 @@ class ReportsserviceConfig(AppConfig):
     
     def ready(self):
         import reportsservice.signals
+        post_migrate.connect(crear_indice_busqueda, sender=self)
@@ -0,0 +1,255 @@
+"""
+Búsqueda de texto completo sobre los reportes.
+
+Indexa ``nombre_perro``, ``color``, ``descripcion`` y
+``caracteristicas_distintivas`` en una tabla auxiliar según el motor de
+base de datos:
+
+- PostgreSQL: tabla ``reporte_busqueda`` con una columna ``tsvector`` y un
+  índice GIN; los resultados se ordenan con ``ts_rank``.
+- SQLite: tabla virtual FTS5 ``reporte_fts``; se ordena con ``bm25``. El
+  rowid de cada fila se asigna en ``reporte_fts_id`` para que actualizar y
+  borrar un reporte busquen por rowid en lugar de recorrer la tabla.
+- Otros motores: búsqueda con ``icontains`` sin índice, como respaldo.
+
+Las señales de Reporte mantienen el índice al día y el comando
+``manage.py reconstruir_indice_busqueda`` lo vuelve a generar completo.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+# Campos indexados y su peso relativo en el ordenamiento
+CAMPOS_INDEXADOS = ['nombre_perro', 'color', 'descripcion', 'caracteristicas_distintivas']
+PESOS_POSTGRES = {'nombre_perro': 'A', 'color': 'B', 'caracteristicas_distintivas': 'C', 'descripcion': 'D'}
+PESOS_SQLITE = {'nombre_perro': 10.0, 'color': 4.0, 'descripcion': 1.0, 'caracteristicas_distintivas': 2.0}
+
+CONFIGURACION_POSTGRES = 'spanish'
+
+
+def _terminos(texto):
+    return re.findall(r'\w+', texto or '')
+
+
+class BusquedaPostgres:
+    """Índice tsvector con GIN en PostgreSQL"""
+
+    def crear_indice(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS reporte_busqueda (
+                    reporte_id uuid PRIMARY KEY REFERENCES reporte (id) ON DELETE CASCADE,
+                    documento tsvector NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS reporte_busqueda_documento_gin
+                ON reporte_busqueda USING gin (documento)
+            """)
+
+    def _documento(self):
+        return ' || '.join(
+            f"setweight(to_tsvector('{CONFIGURACION_POSTGRES}', coalesce({campo}, '')), '{peso}')"
+            for campo, peso in PESOS_POSTGRES.items()
+        )
+
+    def indexar(self, ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO reporte_busqueda (reporte_id, documento)
+                SELECT id, {self._documento()} FROM reporte WHERE id = ANY(%s)
+                ON CONFLICT (reporte_id) DO UPDATE SET documento = EXCLUDED.documento
+            """, [list(ids)])
+
+    def indexar_todo(self):
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE reporte_busqueda")
+            cursor.execute(f"""
+                INSERT INTO reporte_busqueda (reporte_id, documento)
+                SELECT id, {self._documento()} FROM reporte
+            """)
+
+    def eliminar(self, ids):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM reporte_busqueda WHERE reporte_id = ANY(%s)", [list(ids)])
+
+    def buscar(self, texto, limite, desplazamiento, solo_visibles):
+        condicion_visible = "AND r.visible" if solo_visibles else ""
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT b.reporte_id, ts_rank(b.documento, q.consulta) AS rango
+                FROM reporte_busqueda b
+                JOIN reporte r ON r.id = b.reporte_id,
+                     websearch_to_tsquery('{CONFIGURACION_POSTGRES}', %s) AS q(consulta)
+                WHERE b.documento @@ q.consulta {condicion_visible}
+                ORDER BY rango DESC, r.fecha_reporte DESC
+                LIMIT %s OFFSET %s
+            """, [texto, limite, desplazamiento])
+            return cursor.fetchall()
+
+
+class BusquedaSQLite:
+    """Tabla virtual FTS5 en SQLite, con rowid asignado por reporte"""
+
+    def crear_indice(self):
+        columnas = ', '.join(CAMPOS_INDEXADOS)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'reporte_fts_id'")
+            sin_ids = cursor.fetchone() is None
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS reporte_fts USING fts5(
+                    reporte_id UNINDEXED, {columnas},
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS reporte_fts_id (
+                    id INTEGER PRIMARY KEY,
+                    reporte_id char(32) NOT NULL UNIQUE
+                )
+            """)
+        if sin_ids:
+            # Las filas indexadas antes de existir reporte_fts_id tienen
+            # rowid que no corresponden a ningún reporte
+            self.indexar_todo()
+
+    def _insertar(self, cursor, condicion='', ids=()):
+        columnas = ', '.join(CAMPOS_INDEXADOS)
+        origen = ', '.join(f'r.{campo}' for campo in CAMPOS_INDEXADOS)
+        cursor.execute(f"""
+            INSERT INTO reporte_fts (rowid, reporte_id, {columnas})
+            SELECT i.id, r.id, {origen}
+            FROM reporte r JOIN reporte_fts_id i ON i.reporte_id = r.id {condicion}
+        """, ids)
+
+    def indexar(self, ids):
+        ids = [self._id(pk) for pk in ids]
+        marcadores = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR IGNORE INTO reporte_fts_id (reporte_id) VALUES {', '.join(['(%s)'] * len(ids))}",
+                ids
+            )
+            cursor.execute(f"""
+                DELETE FROM reporte_fts WHERE rowid IN (
+                    SELECT id FROM reporte_fts_id WHERE reporte_id IN ({marcadores})
+                )
+            """, ids)
+            self._insertar(cursor, f"WHERE r.id IN ({marcadores})", ids)
+
+    def indexar_todo(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM reporte_fts")
+            cursor.execute("DELETE FROM reporte_fts_id")
+            cursor.execute("INSERT INTO reporte_fts_id (reporte_id) SELECT id FROM reporte")
+            self._insertar(cursor)
+
+    def eliminar(self, ids):
+        ids = [self._id(pk) for pk in ids]
+        marcadores = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                DELETE FROM reporte_fts WHERE rowid IN (
+                    SELECT id FROM reporte_fts_id WHERE reporte_id IN ({marcadores})
+                )
+            """, ids)
+            cursor.execute(f"DELETE FROM reporte_fts_id WHERE reporte_id IN ({marcadores})", ids)
+
+    def buscar(self, texto, limite, desplazamiento, solo_visibles):
+        # Cada término se busca como prefijo y entre comillas para que la
+        # sintaxis de FTS5 en el texto del usuario no se interprete
+        consulta = ' '.join(f'"{termino}"*' for termino in _terminos(texto))
+        if not consulta:
+            return []
+        pesos = ', '.join(str(PESOS_SQLITE[campo]) for campo in CAMPOS_INDEXADOS)
+        condicion_visible = "AND r.visible" if solo_visibles else ""
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT f.reporte_id, -bm25(reporte_fts, 0.0, {pesos}) AS rango
+                FROM reporte_fts f
+                JOIN reporte r ON r.id = f.reporte_id
+                WHERE reporte_fts MATCH %s {condicion_visible}
+                ORDER BY rango DESC, r.fecha_reporte DESC
+                LIMIT %s OFFSET %s
+            """, [consulta, limite, desplazamiento])
+            return cursor.fetchall()
+
+    def _id(self, pk):
+        # SQLite guarda los UUID como 32 caracteres hexadecimales
+        from .models import Reporte
+        return Reporte._meta.pk.get_db_prep_value(pk, connection)
+
+
+class BusquedaBasica:
+    """Respaldo sin índice para otros motores"""
+
+    def crear_indice(self):
+        pass
+
+    def indexar(self, ids):
+        pass
+
+    def indexar_todo(self):
+        pass
+
+    def eliminar(self, ids):
+        pass
+
+    def buscar(self, texto, limite, desplazamiento, solo_visibles):
+        from .models import Reporte
+
+        reportes = Reporte.objects.all()
+        if solo_visibles:
+            reportes = reportes.filter(visible=True)
+        for termino in _terminos(texto):
+            condicion = Q()
+            for campo in CAMPOS_INDEXADOS:
+                condicion |= Q(**{f'{campo}__icontains': termino})
+            reportes = reportes.filter(condicion)
+        ids = reportes.values_list('pk', flat=True)[desplazamiento:desplazamiento + limite]
+        return [(pk, None) for pk in ids]
+
+
+def obtener_motor():
+    """Retorna el motor de búsqueda adecuado para la base de datos actual"""
+    if connection.vendor == 'postgresql':
+        return BusquedaPostgres()
+    if connection.vendor == 'sqlite':
+        return BusquedaSQLite()
+    return BusquedaBasica()
+
+
+def crear_indice():
+    obtener_motor().crear_indice()
+
+
+def indexar_reportes(ids):
+    """Agrega o actualiza los reportes indicados en el índice"""
+    ids = list(ids)
+    if ids:
+        obtener_motor().indexar(ids)
+
+
+def eliminar_reportes(ids):
+    """Retira los reportes indicados del índice"""
+    ids = list(ids)
+    if ids:
+        obtener_motor().eliminar(ids)
+
+
+def reconstruir_indice():
+    """Crea el índice si no existe y lo vuelve a llenar con todos los reportes"""
+    motor = obtener_motor()
+    motor.crear_indice()
+    motor.indexar_todo()
+
+
+def buscar_reportes(texto, limite=20, desplazamiento=0, solo_visibles=True):
+    """
+    Retorna una lista de (reporte_id, rango) ordenada de mayor a menor
+    relevancia
+    """
+    if not _terminos(texto):
+        return []
+    return obtener_motor().buscar(texto, limite, desplazamiento, solo_visibles)
@@ -0,0 +1,413 @@
+"""
+Motor de coincidencias entre reportes de perros perdidos y encontrados.
+
+Cada reporte se compara solo con los reportes activos del tipo contrario
+que caen dentro de una ventana espacio-temporal (``COINCIDENCIAS_RADIO_KM``
+alrededor del punto y ``COINCIDENCIAS_VENTANA_DIAS`` antes o después de
+``fecha_incidente``). A cada candidato se le asigna una puntuación entre 0
+y 1 a partir de la distancia, la diferencia entre las fechas de los
+incidentes, el tamaño, la raza y las palabras del color, y se guardan los
+``COINCIDENCIAS_TOP_K`` mejores en ``CoincidenciaReporte``.
+
+- En línea: la señal post_save de Reporte encola ``buscar_coincidencias``,
+  que consulta los candidatos con el índice
+  (tipo_reporte, estado, fecha_incidente, latitud).
+- En lote: ``manage.py recalcular_coincidencias`` carga todos los reportes
+  activos en una rejilla en memoria (``IndiceEspacioTemporal``) y reparte
+  la puntuación entre un pool de procesos.
+"""
+import heapq
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from Homeinfo.cola import manejador
+from .geo import RADIO_TIERRA_KM, bounding_box
+
+# Valores por defecto; se pueden cambiar en settings con el prefijo COINCIDENCIAS_
+RADIO_KM = 5.0
+VENTANA_DIAS = 30
+TOP_K = 10
+PUNTUACION_MINIMA = 0.3
+
+# Peso de cada criterio en la puntuación final (suman 1)
+PESOS = {
+    'distancia': 0.35,
+    'tiempo': 0.25,
+    'tamano': 0.15,
+    'raza': 0.15,
+    'color': 0.10,
+}
+
+ESTADOS_ACTIVOS = ('activo', 'en_proceso')
+
+ORDEN_TAMANOS = {'pequeño': 0, 'mediano': 1, 'grande': 2, 'gigante': 3}
+
+PALABRAS_VACIAS = {'y', 'e', 'o', 'con', 'de', 'del', 'el', 'la', 'los', 'las', 'un', 'una', 'en'}
+
+KM_POR_GRADO = math.pi * RADIO_TIERRA_KM / 180.0
+
+# Columnas de Reporte necesarias para armar un Perfil
+CAMPOS_PERFIL = (
+    'id', 'usuario_id', 'tipo_reporte', 'latitud', 'longitud',
+    'fecha_incidente', 'tamano', 'raza_id', 'color',
+)
+
+# Versión ligera de un reporte con lo necesario para puntuarlo; no depende
+# de la base de datos para poder enviarse a otros procesos
+Perfil = namedtuple('Perfil', [
+    'id', 'usuario_id', 'tipo_reporte', 'latitud', 'longitud',
+    'fecha', 'tamano', 'raza_id', 'colores',
+])
+
+Parametros = namedtuple('Parametros', ['radio_km', 'ventana_horas', 'top_k', 'minimo'])
+
+
+def obtener_parametros():
+    """Retorna los Parametros del motor según settings"""
+    return Parametros(
+        radio_km=getattr(settings, 'COINCIDENCIAS_RADIO_KM', RADIO_KM),
+        ventana_horas=getattr(settings, 'COINCIDENCIAS_VENTANA_DIAS', VENTANA_DIAS) * 24.0,
+        top_k=getattr(settings, 'COINCIDENCIAS_TOP_K', TOP_K),
+        minimo=getattr(settings, 'COINCIDENCIAS_PUNTUACION_MINIMA', PUNTUACION_MINIMA),
+    )
+
+
+def palabras_color(color):
+    """Normaliza el color a un conjunto de palabras sin acentos ni mayúsculas"""
+    texto = unicodedata.normalize('NFKD', (color or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return frozenset(p for p in re.findall(r'\w+', texto) if p not in PALABRAS_VACIAS)
+
+
+def perfil_desde_valores(valores):
+    """Arma un Perfil a partir de una fila con las columnas de CAMPOS_PERFIL"""
+    id, usuario_id, tipo_reporte, latitud, longitud, fecha, tamano, raza_id, color = valores
+    return Perfil(
+        id, usuario_id, tipo_reporte, latitud, longitud,
+        fecha.timestamp(), tamano, raza_id, palabras_color(color),
+    )
+
+
+def puntuar(a, b, parametros):
+    """
+    Compara dos perfiles. Retorna (puntuacion, distancia_km, diferencia_horas)
+    o None si no pueden ser el mismo perro o la puntuación no llega al mínimo.
+    """
+    if a.tipo_reporte == b.tipo_reporte or a.usuario_id == b.usuario_id:
+        return None
+
+    horas = abs(a.fecha - b.fecha) / 3600.0
+    if horas > parametros.ventana_horas:
+        return None
+
+    # Descarte rápido por latitud antes de calcular Haversine
+    if abs(a.latitud - b.latitud) * KM_POR_GRADO > parametros.radio_km:
+        return None
+    lat1, lat2 = math.radians(a.latitud), math.radians(b.latitud)
+    dlat = lat2 - lat1
+    dlon = math.radians(b.longitud - a.longitud)
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    distancia = 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+    if distancia > parametros.radio_km:
+        return None
+
+    diferencia_tamano = abs(ORDEN_TAMANOS.get(a.tamano, 1) - ORDEN_TAMANOS.get(b.tamano, 1))
+    if a.raza_id is None or b.raza_id is None:
+        raza = 0.5
+    else:
+        raza = 1.0 if a.raza_id == b.raza_id else 0.0
+    if a.colores and b.colores:
+        color = len(a.colores & b.colores) / len(a.colores | b.colores)
+    else:
+        color = 0.0
+
+    puntuacion = (
+        PESOS['distancia'] * (1.0 - distancia / parametros.radio_km) +
+        PESOS['tiempo'] * (1.0 - horas / parametros.ventana_horas) +
+        PESOS['tamano'] * (1.0 if diferencia_tamano == 0 else 0.5 if diferencia_tamano == 1 else 0.0) +
+        PESOS['raza'] * raza +
+        PESOS['color'] * color
+    )
+    if puntuacion < parametros.minimo:
+        return None
+    return puntuacion, distancia, horas
+
+
+def puntuar_candidatos(perfil, candidatos, parametros):
+    """
+    Retorna [(candidato_id, puntuacion, distancia_km, diferencia_horas)] de
+    todos los candidatos que pasan el mínimo
+    """
+    resultados = []
+    for candidato in candidatos:
+        resultado = puntuar(perfil, candidato, parametros)
+        if resultado is not None:
+            resultados.append((candidato.id,) + resultado)
+    return resultados
+
+
+def mejores(puntuados, top_k):
+    """Retorna los ``top_k`` resultados de mayor puntuación"""
+    return heapq.nlargest(top_k, puntuados, key=lambda resultado: resultado[1])
+
+
+class IndiceEspacioTemporal:
+    """
+    Rejilla en memoria de perfiles por tipo de reporte, celda geográfica y
+    periodo de tiempo.
+
+    Las celdas miden ``radio_km`` de alto y los periodos duran la ventana
+    de tiempo, así que los candidatos de un perfil están en las celdas del
+    rectángulo que envuelve su radio y en su periodo o los dos vecinos.
+    """
+
+    def __init__(self, radio_km, ventana_horas):
+        self.tamano_celda = radio_km / KM_POR_GRADO
+        self.radio_km = radio_km
+        self.periodo = ventana_horas * 3600.0
+        self._celdas = defaultdict(list)
+
+    def __len__(self):
+        return sum(len(perfiles) for perfiles in self._celdas.values())
+
+    def _clave(self, tipo_reporte, latitud, longitud, fecha):
+        return (
+            tipo_reporte,
+            int(math.floor(latitud / self.tamano_celda)),
+            int(math.floor(longitud / self.tamano_celda)),
+            int(math.floor(fecha / self.periodo)),
+        )
+
+    def agregar(self, perfil):
+        self._celdas[self._clave(
+            perfil.tipo_reporte, perfil.latitud, perfil.longitud, perfil.fecha
+        )].append(perfil)
+
+    def _columnas(self, lon_min, lon_max):
+        if lon_min <= lon_max:
+            return range(
+                int(math.floor(lon_min / self.tamano_celda)),
+                int(math.floor(lon_max / self.tamano_celda)) + 1,
+            )
+        # El rectángulo cruza el antimeridiano
+        return list(self._columnas(lon_min, 180.0)) + list(self._columnas(-180.0, lon_max))
+
+    def candidatos(self, perfil):
+        """Genera los perfiles del tipo contrario cercanos en espacio y tiempo"""
+        tipo = 'encontrado' if perfil.tipo_reporte == 'perdido' else 'perdido'
+        lat_min, lat_max, lon_min, lon_max = bounding_box(
+            perfil.latitud, perfil.longitud, self.radio_km
+        )
+        filas = range(
+            int(math.floor(lat_min / self.tamano_celda)),
+            int(math.floor(lat_max / self.tamano_celda)) + 1,
+        )
+        columnas = self._columnas(lon_min, lon_max)
+        periodo = int(math.floor(perfil.fecha / self.periodo))
+        for fila in filas:
+            for columna in columnas:
+                for p in (periodo - 1, periodo, periodo + 1):
+                    yield from self._celdas.get((tipo, fila, columna, p), ())
+
+
+def consultar_candidatos(perfil, parametros):
+    """
+    Retorna el queryset de reportes activos del tipo contrario dentro de la
+    ventana espacio-temporal de ``perfil``
+    """
+    from .models import Reporte
+
+    fecha = datetime.fromtimestamp(perfil.fecha, tz=dt_timezone.utc)
+    ventana = timedelta(hours=parametros.ventana_horas)
+    lat_min, lat_max, lon_min, lon_max = bounding_box(
+        perfil.latitud, perfil.longitud, parametros.radio_km
+    )
+    reportes = Reporte.objects.filter(
+        tipo_reporte='encontrado' if perfil.tipo_reporte == 'perdido' else 'perdido',
+        estado__in=ESTADOS_ACTIVOS,
+        fecha_incidente__range=(fecha - ventana, fecha + ventana),
+        latitud__range=(lat_min, lat_max),
+        visible=True,
+    ).exclude(usuario_id=perfil.usuario_id)
+    if lon_min > lon_max:
+        return reportes.filter(Q(longitud__gte=lon_min) | Q(longitud__lte=lon_max))
+    return reportes.filter(longitud__range=(lon_min, lon_max))
+
+
+def _filas_coincidencia(reporte_id, resultados):
+    from .models import CoincidenciaReporte
+
+    return [
+        CoincidenciaReporte(
+            reporte_id=reporte_id,
+            candidato_id=candidato_id,
+            puntuacion=puntuacion,
+            distancia_km=distancia,
+            diferencia_horas=horas,
+        )
+        for candidato_id, puntuacion, distancia, horas in resultados
+    ]
+
+
+def _actualizar_listas_candidatos(reporte_id, puntuados, top_k):
+    """
+    Agrega ``reporte_id`` a la lista de mejores coincidencias de cada
+    candidato donde le alcanza la puntuación, desplazando a la peor
+    """
+    from .models import CoincidenciaReporte
+
+    actuales = defaultdict(list)
+    for pk, candidato_id, puntuacion in CoincidenciaReporte.objects.filter(
+        reporte_id__in=[resultado[0] for resultado in puntuados]
+    ).values_list('pk', 'reporte_id', 'puntuacion'):
+        actuales[candidato_id].append((puntuacion, pk))
+
+    nuevas = []
+    desplazadas = []
+    for candidato_id, puntuacion, distancia, horas in puntuados:
+        lista = actuales.get(candidato_id, [])
+        if len(lista) >= top_k:
+            peor = min(lista)
+            if puntuacion <= peor[0]:
+                continue
+            desplazadas.append(peor[1])
+        nuevas.append((candidato_id, (reporte_id, puntuacion, distancia, horas)))
+
+    if desplazadas:
+        CoincidenciaReporte.objects.filter(pk__in=desplazadas).delete()
+    filas = []
+    for candidato_id, resultado in nuevas:
+        filas.extend(_filas_coincidencia(candidato_id, [resultado]))
+    CoincidenciaReporte.objects.bulk_create(filas)
+
+
+@manejador('buscar_coincidencias')
+def buscar_coincidencias(reporte_id):
+    """
+    Recalcula las mejores coincidencias de un reporte y lo agrega a las
+    listas de sus candidatos.
+
+    Las listas de las que el reporte deja de formar parte quedan con un
+    lugar menos hasta el siguiente recálculo en lote o del propio candidato.
+    """
+    from .models import CoincidenciaReporte, Reporte
+
+    fila = Reporte.objects.filter(pk=reporte_id).values_list(
+        *CAMPOS_PERFIL, 'estado', 'visible'
+    ).first()
+    if fila is None:
+        return
+    *valores, estado, visible = fila
+
+    with transaction.atomic():
+        CoincidenciaReporte.objects.filter(
+            Q(reporte_id=valores[0]) | Q(candidato_id=valores[0])
+        ).delete()
+        if estado not in ESTADOS_ACTIVOS or not visible:
+            return
+
+        parametros = obtener_parametros()
+        perfil = perfil_desde_valores(valores)
+        candidatos = [
+            perfil_desde_valores(valores_candidato)
+            for valores_candidato in consultar_candidatos(perfil, parametros).values_list(*CAMPOS_PERFIL)
+        ]
+        puntuados = puntuar_candidatos(perfil, candidatos, parametros)
+        CoincidenciaReporte.objects.bulk_create(
+            _filas_coincidencia(perfil.id, mejores(puntuados, parametros.top_k))
+        )
+        _actualizar_listas_candidatos(perfil.id, puntuados, parametros.top_k)
+
+
+# Estado de cada proceso del pool en el modo en lote
+_indice_trabajador = None
+_parametros_trabajador = None
+
+
+def _inicializar_trabajador(perfiles, parametros):
+    global _indice_trabajador, _parametros_trabajador
+    _parametros_trabajador = parametros
+    _indice_trabajador = IndiceEspacioTemporal(parametros.radio_km, parametros.ventana_horas)
+    for perfil in perfiles:
+        _indice_trabajador.agregar(perfil)
+
+
+def _puntuar_bloque(perfiles):
+    return [
+        (perfil.id, mejores(
+            puntuar_candidatos(perfil, _indice_trabajador.candidatos(perfil), _parametros_trabajador),
+            _parametros_trabajador.top_k,
+        ))
+        for perfil in perfiles
+    ]
+
+
+def puntuar_todos(perfiles, parametros, procesos=None, tamano_bloque=2000):
+    """
+    Genera (reporte_id, mejores) para cada perfil comparándolo con todos
+    los demás a través del índice espacio-temporal.
+
+    Con más de un proceso cada trabajador construye su propio índice una
+    sola vez al iniciar y recibe bloques de ``tamano_bloque`` perfiles.
+    """
+    procesos = procesos or os.cpu_count()
+    bloques = [perfiles[i:i + tamano_bloque] for i in range(0, len(perfiles), tamano_bloque)]
+
+    if procesos == 1:
+        _inicializar_trabajador(perfiles, parametros)
+        for bloque in bloques:
+            yield from _puntuar_bloque(bloque)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        initializer=_inicializar_trabajador,
+        initargs=(perfiles, parametros),
+    ) as pool:
+        for resultados in pool.map(_puntuar_bloque, bloques):
+            yield from resultados
+
+
+def cargar_perfiles_activos():
+    """Retorna los perfiles de todos los reportes activos y visibles"""
+    from .models import Reporte
+
+    return [
+        perfil_desde_valores(valores)
+        for valores in Reporte.objects.filter(
+            estado__in=ESTADOS_ACTIVOS, visible=True
+        ).values_list(*CAMPOS_PERFIL).iterator(chunk_size=5000)
+    ]
+
+
+def recalcular_coincidencias(procesos=None, tamano_bloque=2000, tamano_lote=5000):
+    """
+    Recalcula desde cero las coincidencias de todos los reportes activos.
+    Retorna la tupla (reportes, coincidencias).
+    """
+    from .models import CoincidenciaReporte
+
+    parametros = obtener_parametros()
+    perfiles = cargar_perfiles_activos()
+    total = 0
+    with transaction.atomic():
+        CoincidenciaReporte.objects.all().delete()
+        filas = []
+        for reporte_id, resultados in puntuar_todos(perfiles, parametros, procesos, tamano_bloque):
+            filas.extend(_filas_coincidencia(reporte_id, resultados))
+            if len(filas) >= tamano_lote:
+                CoincidenciaReporte.objects.bulk_create(filas)
+                total += len(filas)
+                filas = []
+        CoincidenciaReporte.objects.bulk_create(filas)
+        total += len(filas)
+    return len(perfiles), total
@@ -0,0 +1,164 @@
+"""
+Utilidades geográficas para cálculos de distancia sin PostGIS.
+
+Las funciones por lote usan NumPy cuando está instalado y recurren a una
+implementación en Python puro en caso contrario; ambas producen los mismos
+resultados.
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy es opcional
+    np = None
+
+# Radio de la Tierra en kilómetros
+RADIO_TIERRA_KM = 6371.0
+
+
+def calcular_distancia_haversine(lat1, lon1, lat2, lon2):
+    """
+    Calcula la distancia entre dos puntos usando la fórmula de Haversine
+    Retorna la distancia en kilómetros
+    """
+    # Convertir grados a radianes
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    # Diferencias
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    # Fórmula de Haversine
+    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+    return RADIO_TIERRA_KM * c
+
+
+def bounding_box(latitud, longitud, radio_km):
+    """
+    Retorna (lat_min, lat_max, lon_min, lon_max) del rectángulo que contiene
+    el círculo de ``radio_km`` alrededor del punto.
+
+    Si el rectángulo cruza el antimeridiano, ``lon_min`` es mayor que
+    ``lon_max``. Si alcanza un polo, cubre todas las longitudes.
+    """
+    distancia_angular = radio_km / RADIO_TIERRA_KM
+    delta_lat = math.degrees(distancia_angular)
+    lat_min = latitud - delta_lat
+    lat_max = latitud + delta_lat
+
+    if lat_min <= -90.0 or lat_max >= 90.0:
+        return max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0
+
+    seno = math.sin(distancia_angular) / math.cos(math.radians(latitud))
+    if seno >= 1.0:
+        return lat_min, lat_max, -180.0, 180.0
+
+    delta_lon = math.degrees(math.asin(seno))
+    lon_min = longitud - delta_lon
+    lon_max = longitud + delta_lon
+    if lon_min < -180.0:
+        lon_min += 360.0
+    if lon_max > 180.0:
+        lon_max -= 360.0
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def _como_arreglo(valores):
+    return np.ascontiguousarray(valores, dtype=np.float64)
+
+
+def distances_from(point, lat_array, lon_array):
+    """
+    Calcula la distancia en kilómetros desde ``point`` (latitud, longitud)
+    hasta cada par de ``lat_array``/``lon_array``.
+
+    Retorna un arreglo de NumPy si está disponible, o una lista en caso
+    contrario.
+    """
+    if np is None:
+        return _distancias_python(point, lat_array, lon_array)
+
+    lat1 = math.radians(point[0])
+    lon1 = math.radians(point[1])
+    lat2 = np.radians(_como_arreglo(lat_array))
+    lon2 = np.radians(_como_arreglo(lon_array))
+
+    a = (
+        np.sin((lat2 - lat1) * 0.5) ** 2
+        + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    )
+    # El redondeo puede dejar ``a`` apenas fuera de [0, 1] cerca de las antípodas
+    a = np.clip(a, 0.0, 1.0)
+    return 2.0 * RADIO_TIERRA_KM * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+
+def _distancias_python(point, lat_array, lon_array):
+    """Implementación en Python puro de distances_from"""
+    lat1 = math.radians(point[0])
+    lon1 = math.radians(point[1])
+    cos_lat1 = math.cos(lat1)
+    sin, cos, sqrt, atan2, radians = math.sin, math.cos, math.sqrt, math.atan2, math.radians
+
+    distancias = []
+    for lat, lon in zip(lat_array, lon_array):
+        lat2 = radians(lat)
+        a = sin((lat2 - lat1) * 0.5) ** 2 + cos_lat1 * cos(lat2) * sin((radians(lon) - lon1) * 0.5) ** 2
+        a = min(max(a, 0.0), 1.0)
+        distancias.append(2.0 * RADIO_TIERRA_KM * atan2(sqrt(a), sqrt(1.0 - a)))
+    return distancias
+
+
+def filtrar_bounding_box(point, radio_km, lat_array, lon_array):
+    """
+    Retorna los índices de los puntos que caen dentro del bounding box del
+    círculo de ``radio_km`` alrededor de ``point``
+    """
+    lat_min, lat_max, lon_min, lon_max = bounding_box(point[0], point[1], radio_km)
+    cruza_antimeridiano = lon_min > lon_max
+
+    if np is None:
+        indices = []
+        for i, (lat, lon) in enumerate(zip(lat_array, lon_array)):
+            if not lat_min <= lat <= lat_max:
+                continue
+            if cruza_antimeridiano:
+                if lon >= lon_min or lon <= lon_max:
+                    indices.append(i)
+            elif lon_min <= lon <= lon_max:
+                indices.append(i)
+        return indices
+
+    lats = _como_arreglo(lat_array)
+    lons = _como_arreglo(lon_array)
+    mascara = (lats >= lat_min) & (lats <= lat_max)
+    if cruza_antimeridiano:
+        mascara &= (lons >= lon_min) | (lons <= lon_max)
+    else:
+        mascara &= (lons >= lon_min) & (lons <= lon_max)
+    return np.flatnonzero(mascara)
+
+
+def puntos_en_radio(point, radio_km, lat_array, lon_array):
+    """
+    Retorna (indices, distancias) de los puntos a ``radio_km`` o menos de
+    ``point``, aplicando primero el filtro por bounding box
+    """
+    indices = filtrar_bounding_box(point, radio_km, lat_array, lon_array)
+
+    if np is None:
+        lats = [lat_array[i] for i in indices]
+        lons = [lon_array[i] for i in indices]
+        distancias = _distancias_python(point, lats, lons)
+        pares = [(i, d) for i, d in zip(indices, distancias) if d <= radio_km]
+        return [i for i, _ in pares], [d for _, d in pares]
+
+    lats = _como_arreglo(lat_array)[indices]
+    lons = _como_arreglo(lon_array)[indices]
+    distancias = distances_from(point, lats, lons)
+    dentro = distancias <= radio_km
+    return indices[dentro], distancias[dentro]
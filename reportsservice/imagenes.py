@@ -0,0 +1,158 @@
+"""
+Generación de variantes de las fotos de reportes.
+
+Cada foto se decodifica una sola vez y de esa imagen se derivan todas las
+variantes. El trabajo pesado se hace dentro del trabajador de la cola,
+nunca en el hilo de la petición; con ``IMAGENES_PROCESOS`` mayor que 1 se
+reparte en un pool de procesos (uno por trabajador, así que el total es
+``IMAGENES_PROCESOS`` por el ``--procesos`` de ``procesar_cola``).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from Homeinfo.cola import manejador
+
+logger = logging.getLogger(__name__)
+
+# (nombre, tamaño máximo, formato de Pillow, extensión, opciones de guardado)
+# Ordenadas de mayor a menor para derivar cada una de la anterior
+VARIANTES = [
+    ('mediana', (800, 600), 'JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    ('webp', (800, 600), 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('miniatura', (200, 200), 'JPEG', 'jpg', {'quality': 80, 'optimize': True}),
+]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def generar_variantes(ruta_origen, directorio_destino, prefijo):
+    """
+    Decodifica ``ruta_origen`` una vez y escribe todas las VARIANTES en
+    ``directorio_destino``. Retorna una lista de diccionarios con el nombre,
+    archivo, dimensiones, formato y tamaño de cada variante.
+
+    No accede a la base de datos, así que puede ejecutarse en otro proceso.
+    """
+    os.makedirs(directorio_destino, exist_ok=True)
+    resultados = []
+
+    with Image.open(ruta_origen) as original:
+        imagen = ImageOps.exif_transpose(original)
+        if imagen.mode not in ('RGB', 'L'):
+            imagen = imagen.convert('RGB')
+
+        actual = imagen
+        for nombre, tamano, formato, extension, opciones in VARIANTES:
+            if actual.width > tamano[0] or actual.height > tamano[1]:
+                actual = actual.copy()
+                actual.thumbnail(tamano, Image.Resampling.LANCZOS)
+
+            archivo = f"{prefijo}_{nombre}.{extension}"
+            ruta = os.path.join(directorio_destino, archivo)
+            actual.save(ruta, formato, **opciones)
+            resultados.append({
+                'nombre': nombre,
+                'archivo': archivo,
+                'ancho': actual.width,
+                'alto': actual.height,
+                'formato': formato.lower(),
+                'tamano_bytes': os.path.getsize(ruta),
+            })
+
+    return resultados
+
+
+def _procesos():
+    return getattr(settings, 'IMAGENES_PROCESOS', 1) or os.cpu_count()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_procesos())
+        return _pool
+
+
+def _generar_todas(trabajos):
+    """
+    Genera las variantes de cada trabajo y retorna, en el mismo orden, la
+    lista de variantes o la excepción que lanzó ese trabajo.
+    """
+    if len(trabajos) == 1 or _procesos() <= 1:
+        resultados = []
+        for trabajo in trabajos:
+            try:
+                resultados.append(generar_variantes(*trabajo))
+            except Exception as error:
+                resultados.append(error)
+        return resultados
+
+    futuros = [_obtener_pool().submit(generar_variantes, *trabajo) for trabajo in trabajos]
+    resultados = []
+    for futuro in futuros:
+        try:
+            resultados.append(futuro.result())
+        except Exception as error:
+            resultados.append(error)
+    return resultados
+
+
+def procesar_fotos(foto_ids):
+    """
+    Genera y registra las variantes de las fotos indicadas. Si una foto no
+    se puede procesar se registra el error en esa foto y las demás se
+    guardan normalmente.
+    """
+    from .models import FotoReporte, VarianteFotoReporte
+
+    fotos = [
+        foto for foto in FotoReporte.objects.filter(pk__in=foto_ids, procesada=False)
+        if foto.imagen
+    ]
+    if not fotos:
+        return
+
+    trabajos = []
+    for foto in fotos:
+        ruta_origen = foto.imagen.path
+        directorio = os.path.join(os.path.dirname(ruta_origen), 'variantes')
+        prefijo = os.path.splitext(os.path.basename(ruta_origen))[0]
+        trabajos.append((ruta_origen, directorio, prefijo))
+
+    procesadas = []
+    variantes = []
+    for foto, generadas in zip(fotos, _generar_todas(trabajos)):
+        if isinstance(generadas, Exception):
+            logger.error("No se pudieron generar las variantes de la foto %s: %s", foto.pk, generadas)
+            FotoReporte.objects.filter(pk=foto.pk).update(error_procesamiento=str(generadas) or repr(generadas))
+            continue
+        procesadas.append(foto)
+        directorio = os.path.dirname(foto.imagen.name)
+        for datos in generadas:
+            archivo = datos.pop('archivo')
+            variantes.append(VarianteFotoReporte(
+                foto=foto,
+                imagen=f"{directorio}/variantes/{archivo}",
+                **datos
+            ))
+
+    if not procesadas:
+        return
+    VarianteFotoReporte.objects.filter(foto__in=procesadas).delete()
+    VarianteFotoReporte.objects.bulk_create(variantes)
+    FotoReporte.objects.filter(pk__in=[foto.pk for foto in procesadas]).update(
+        procesada=True, error_procesamiento=''
+    )
+
+
+@manejador('procesar_foto', lote=True)
+def procesar_fotos_encoladas(lote):
+    """Manejador de la cola: procesa juntas todas las fotos reclamadas"""
+    procesar_fotos([datos['foto_id'] for datos in lote])
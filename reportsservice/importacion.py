@@ -0,0 +1,177 @@
+"""
+Importación masiva de reportes desde CSV o JSONL (``manage.py import_reportes``).
+
+El archivo se lee fila por fila y cada fila se valida con los validadores
+de los campos de ``Reporte`` y su ``clean()`` sin consultar la base de
+datos; la raza se indica por nombre. Las filas válidas se insertan con
+``bulk_create`` en lotes de ``tamano_lote``, cada lote en su propia
+transacción, así que la memoria no crece con el tamaño del archivo.
+
+``bulk_create`` no envía post_save: por cada lote se envía la señal
+``reportes_importados``, cuyos receptores encolan una sola tarea de
+notificaciones para el lote (el trabajador junta los lotes que reclama en
+un solo recorrido de suscriptores), las coincidencias, el índice de
+búsqueda y la invalidación del mapa y del feed.
+"""
+import csv
+import json
+import math
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Raza, Reporte
+from .signals import reportes_importados
+
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = 500
+
+# Columnas aceptadas; ``raza`` es el nombre de una Raza existente
+COLUMNAS = (
+    'tipo_reporte', 'estado', 'nombre_perro', 'color', 'tamano', 'raza',
+    'descripcion', 'caracteristicas_distintivas', 'latitud', 'longitud',
+    'direccion', 'zona', 'fecha_incidente', 'fecha_reporte',
+    'telefono_contacto', 'email_contacto', 'visible', 'verificado',
+)
+
+CAMPOS_FECHA = ('fecha_incidente', 'fecha_reporte')
+
+# Los validadores de rango no rechazan NaN (toda comparación con NaN es falsa)
+CAMPOS_COORDENADAS = ('latitud', 'longitud')
+
+# BooleanField solo acepta 'True'/'False'; las hojas de cálculo exportan 'TRUE' o 'true'
+CAMPOS_BOOLEANOS = ('visible', 'verificado')
+BOOLEANOS = {'true': True, 'false': False}
+
+
+class FormatoInvalido(ValueError):
+    pass
+
+
+def formato_de_ruta(ruta):
+    """Deduce el formato por la extensión del archivo"""
+    if ruta.endswith('.csv'):
+        return 'csv'
+    if ruta.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise FormatoInvalido(f"No se reconoce el formato de '{ruta}'; indique csv o jsonl.")
+
+
+def leer_filas(archivo, formato):
+    """
+    Genera (número de línea, fila) de un archivo de texto abierto. Las
+    filas CSV son diccionarios; las líneas JSONL se entregan sin decodificar
+    para que un error de JSON se reporte como fila inválida.
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        desconocidas = set(lector.fieldnames or ()) - set(COLUMNAS)
+        if desconocidas:
+            raise FormatoInvalido(f"Columnas desconocidas: {', '.join(sorted(desconocidas))}.")
+        for fila in lector:
+            yield lector.line_num, fila
+    elif formato == 'jsonl':
+        for numero, linea in enumerate(archivo, 1):
+            if linea.strip():
+                yield numero, linea
+    else:
+        raise FormatoInvalido(f"Formato '{formato}' no soportado; use csv o jsonl.")
+
+
+def construir_reporte(fila, usuario_id, razas):
+    """
+    Retorna un Reporte validado y sin guardar a partir de una fila.
+    ``razas`` relaciona el nombre de cada raza en
+    minúsculas con su id. Lanza ValidationError si la fila no es válida.
+    """
+    if isinstance(fila, str):
+        try:
+            fila = json.loads(fila)
+        except ValueError as error:
+            raise ValidationError(f"JSON inválido: {error}")
+        if not isinstance(fila, dict):
+            raise ValidationError("Cada línea debe ser un objeto JSON.")
+
+    desconocidas = set(fila) - set(COLUMNAS)
+    if desconocidas:
+        raise ValidationError(f"Columnas desconocidas: {', '.join(sorted(desconocidas))}.")
+    # Las celdas vacías toman el valor por defecto del campo
+    datos = {campo: valor for campo, valor in fila.items() if valor not in (None, '')}
+    for campo in CAMPOS_BOOLEANOS:
+        valor = datos.get(campo)
+        if isinstance(valor, str):
+            datos[campo] = BOOLEANOS.get(valor.strip().lower(), valor)
+
+    raza = datos.pop('raza', None)
+    reporte = Reporte(usuario_id=usuario_id, **datos)
+    if raza is not None:
+        reporte.raza_id = razas.get(str(raza).strip().lower())
+        if reporte.raza_id is None:
+            raise ValidationError({'raza': f"No existe la raza '{raza}'."})
+
+    # full_clean sin las validaciones que consultan la base de datos; las
+    # fechas sin zona horaria se interpretan en la zona del sitio antes de
+    # que clean() las compare
+    reporte.clean_fields(exclude=['usuario', 'raza'])
+    no_finitas = {
+        campo: "Debe ser un número finito."
+        for campo in CAMPOS_COORDENADAS if not math.isfinite(getattr(reporte, campo))
+    }
+    if no_finitas:
+        raise ValidationError(no_finitas)
+    for campo in CAMPOS_FECHA:
+        fecha = getattr(reporte, campo)
+        if timezone.is_naive(fecha):
+            setattr(reporte, campo, timezone.make_aware(fecha))
+    reporte.clean()
+    return reporte
+
+
+def _mensajes(error):
+    if hasattr(error, 'error_dict'):
+        return [f"{campo}: {mensaje}" for campo, mensajes in error.message_dict.items() for mensaje in mensajes]
+    return error.messages
+
+
+def _insertar(reportes):
+    with transaction.atomic():
+        Reporte.objects.bulk_create(reportes)
+        reportes_importados.send(sender=Reporte, reportes=reportes)
+
+
+def importar(filas, usuario_id, tamano_lote=TAMANO_LOTE, simular=False, al_error=None):
+    """
+    Valida e inserta los reportes de ``filas`` (ver ``leer_filas``) a nombre
+    de ``usuario_id``. Las filas inválidas se omiten y se pasan a
+    ``al_error(numero, mensajes)``. Con ``simular`` solo se validan.
+    Retorna un diccionario con las filas leídas, importadas e inválidas y
+    los segundos que tomó.
+    """
+    razas = {nombre.lower(): pk for pk, nombre in Raza.objects.values_list('pk', 'nombre')}
+    resultado = {'leidas': 0, 'importadas': 0, 'invalidas': 0}
+    inicio = time.perf_counter()
+
+    lote = []
+    for numero, fila in filas:
+        resultado['leidas'] += 1
+        try:
+            lote.append(construir_reporte(fila, usuario_id, razas))
+        except ValidationError as error:
+            resultado['invalidas'] += 1
+            if al_error is not None:
+                al_error(numero, _mensajes(error))
+            continue
+        if len(lote) >= tamano_lote:
+            if not simular:
+                _insertar(lote)
+            resultado['importadas'] += len(lote)
+            lote = []
+    if lote:
+        if not simular:
+            _insertar(lote)
+        resultado['importadas'] += len(lote)
+
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
@@ -0,0 +1,112 @@
+import os
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from pawtohome.sinteticos import CIUDADES, COLORES
+from reportsservice import coincidencias
+
+TAMANOS = list(coincidencias.ORDEN_TAMANOS)
+SEGUNDOS_POR_DIA = 86400.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el motor de coincidencias sobre un conjunto sintético de reportes "
+        "en memoria: índice espacio-temporal contra comparación exhaustiva, y "
+        "el recálculo completo con 1 y N procesos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reportes', type=int, default=500_000,
+                            help="Número de reportes sintéticos")
+        parser.add_argument('--dias', type=int, default=730,
+                            help="Días que abarcan las fechas de los incidentes")
+        parser.add_argument('--procesos', type=int, nargs='+',
+                            default=[1, os.cpu_count()],
+                            help="Tamaños del pool a comparar en el recálculo completo")
+        parser.add_argument('--muestra', type=int, default=50,
+                            help="Reportes usados para medir la comparación exhaustiva")
+
+    def _generar(self, cantidad, dias):
+        rng = random.Random(7)
+        perfiles = []
+        for i in range(cantidad):
+            if rng.random() < 0.8:
+                # 80 % alrededor de una ciudad y el resto disperso en el país
+                centro = rng.choice(CIUDADES)
+                latitud = rng.gauss(centro[0], 0.15)
+                longitud = rng.gauss(centro[1], 0.15)
+            else:
+                latitud = rng.uniform(15.0, 32.0)
+                longitud = rng.uniform(-117.0, -87.0)
+            perfiles.append(coincidencias.Perfil(
+                id=uuid.UUID(int=i),
+                usuario_id=rng.randrange(cantidad // 3 or 1),
+                tipo_reporte='perdido' if rng.random() < 0.55 else 'encontrado',
+                latitud=latitud,
+                longitud=longitud,
+                fecha=rng.uniform(0, dias * SEGUNDOS_POR_DIA),
+                tamano=rng.choice(TAMANOS),
+                raza_id=rng.choice([None, None] + list(range(1, 40))),
+                colores=coincidencias.palabras_color(rng.choice(COLORES)),
+            ))
+        return perfiles
+
+    def handle(self, *args, **options):
+        parametros = coincidencias.obtener_parametros()
+
+        inicio = time.perf_counter()
+        perfiles = self._generar(options['reportes'], options['dias'])
+        self.stdout.write(f"{len(perfiles)} reportes sintéticos generados en {time.perf_counter() - inicio:.2f}s")
+
+        inicio = time.perf_counter()
+        indice = coincidencias.IndiceEspacioTemporal(parametros.radio_km, parametros.ventana_horas)
+        for perfil in perfiles:
+            indice.agregar(perfil)
+        self.stdout.write(f"Índice espacio-temporal construido en {time.perf_counter() - inicio:.2f}s")
+
+        # Comparación exhaustiva contra el índice sobre la misma muestra
+        muestra = random.Random(11).sample(perfiles, min(options['muestra'], len(perfiles)))
+        inicio = time.perf_counter()
+        exhaustivos = [
+            coincidencias.mejores(
+                coincidencias.puntuar_candidatos(perfil, perfiles, parametros), parametros.top_k
+            )
+            for perfil in muestra
+        ]
+        t_exhaustivo = (time.perf_counter() - inicio) / len(muestra)
+
+        inicio = time.perf_counter()
+        revisados = 0
+        con_indice = []
+        for perfil in muestra:
+            candidatos = list(indice.candidatos(perfil))
+            revisados += len(candidatos)
+            con_indice.append(coincidencias.mejores(
+                coincidencias.puntuar_candidatos(perfil, candidatos, parametros), parametros.top_k
+            ))
+        t_indice = (time.perf_counter() - inicio) / len(muestra)
+
+        if exhaustivos != con_indice:
+            self.stderr.write("El índice omitió coincidencias que encontró la comparación exhaustiva")
+
+        self.stdout.write(
+            f"Por reporte: exhaustivo {t_exhaustivo * 1000:.1f} ms, "
+            f"con índice {t_indice * 1000:.3f} ms "
+            f"({revisados / len(muestra):.0f} candidatos revisados, "
+            f"{t_exhaustivo / t_indice:.0f}x)"
+        )
+
+        self.stdout.write(f"{'procesos':>9} {'tiempo (s)':>11} {'reportes/s':>11} {'coincidencias':>14}")
+        for procesos in sorted(set(options['procesos'])):
+            inicio = time.perf_counter()
+            total = 0
+            for _, resultados in coincidencias.puntuar_todos(perfiles, parametros, procesos):
+                total += len(resultados)
+            transcurrido = time.perf_counter() - inicio
+            self.stdout.write(
+                f"{procesos:>9} {transcurrido:>11.2f} {len(perfiles) / transcurrido:>11.0f} {total:>14}"
+            )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from reportsservice import geo
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara calcular_distancia_haversine (un par de puntos por llamada) "
+        "contra distances_from y el filtro por bounding box sobre arreglos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+',
+                            default=[10_000, 100_000, 1_000_000],
+                            help="Número de candidatos por corrida")
+        parser.add_argument('--radio', type=float, default=5.0,
+                            help="Radio en km para la prueba de bounding box")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        origen = (19.4326, -99.1332)
+        radio = options['radio']
+
+        if geo.np is None:
+            self.stdout.write(self.style.WARNING(
+                "NumPy no está instalado; distances_from usa la implementación en Python puro"
+            ))
+
+        self.stdout.write(
+            f"{'candidatos':>11} {'escalar (ms)':>13} {'python (ms)':>12} "
+            f"{'vectorial (ms)':>15} {'bbox+radio (ms)':>16} {'aceleración':>12}"
+        )
+        for tamano in options['tamanos']:
+            lats = [origen[0] + rng.uniform(-1.0, 1.0) for _ in range(tamano)]
+            lons = [origen[1] + rng.uniform(-1.0, 1.0) for _ in range(tamano)]
+
+            inicio = time.perf_counter()
+            escalares = [
+                geo.calcular_distancia_haversine(origen[0], origen[1], lat, lon)
+                for lat, lon in zip(lats, lons)
+            ]
+            t_escalar = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            geo._distancias_python(origen, lats, lons)
+            t_python = time.perf_counter() - inicio
+
+            if geo.np is not None:
+                # Los llamadores reales mantienen los datos en arreglos contiguos
+                lats_arr = geo.np.asarray(lats, dtype=geo.np.float64)
+                lons_arr = geo.np.asarray(lons, dtype=geo.np.float64)
+            else:
+                lats_arr, lons_arr = lats, lons
+
+            inicio = time.perf_counter()
+            vectoriales = geo.distances_from(origen, lats_arr, lons_arr)
+            t_vectorial = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            geo.puntos_en_radio(origen, radio, lats_arr, lons_arr)
+            t_radio = time.perf_counter() - inicio
+
+            error = max(abs(a - b) for a, b in zip(escalares[:1000], vectoriales[:1000]))
+            if error > 1e-6:
+                self.stderr.write(f"Diferencia máxima {error} km entre implementaciones")
+
+            self.stdout.write(
+                f"{tamano:>11} {t_escalar * 1000:>13.1f} {t_python * 1000:>12.1f} "
+                f"{t_vectorial * 1000:>15.1f} {t_radio * 1000:>16.1f} "
+                f"{t_escalar / t_vectorial:>11.1f}x"
+            )
@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.db import connection
+from django.utils import timezone
+
+from Homeinfo.models import Notificacion
+from ProfileService.indice import invalidar_indice
+from ProfileService.models import ConfiguracionUsuario
+from reportsservice.models import Reporte
+from reportsservice.notificaciones import notificar_nuevo_reporte
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuántos INSERT de notificaciones genera la difusión de un nuevo "
+        "reporte en un vecindario denso, con y sin escritura por lotes. Todos "
+        "los datos se crean dentro de una transacción que se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suscriptores', type=int, default=2000,
+                            help="Usuarios suscritos alrededor del reporte")
+        parser.add_argument('--lotes', type=int, nargs='+', default=[1, 100, 500],
+                            help="Tamaños de lote a comparar (1 equivale a un INSERT por fila)")
+        parser.add_argument('--latitud', type=float, default=19.4326)
+        parser.add_argument('--longitud', type=float, default=-99.1332)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            invalidar_indice()
+
+    def _ejecutar(self, options):
+        User = get_user_model()
+        rng = random.Random(42)
+        lat, lon = options['latitud'], options['longitud']
+
+        autor = User.objects.create_user(
+            username='bench_autor', password=None, phone_number='0000000000'
+        )
+        usuarios = User.objects.bulk_create([
+            User(username=f'bench_{i}', phone_number='0000000000')
+            for i in range(options['suscriptores'])
+        ])
+        ConfiguracionUsuario.objects.bulk_create([
+            ConfiguracionUsuario(
+                usuario=usuario,
+                latitud_preferida=lat + rng.uniform(-0.02, 0.02),
+                longitud_preferida=lon + rng.uniform(-0.02, 0.02),
+                radio_notificaciones=5.0,
+            )
+            for usuario in usuarios
+        ])
+        invalidar_indice()
+
+        tabla = Notificacion._meta.db_table
+        self.stdout.write(f"{'lote':>6} {'notificaciones':>15} {'INSERTs':>8} {'tiempo (ms)':>12}")
+        for tamano_lote in options['lotes']:
+            reporte = Reporte.objects.create(
+                usuario=autor,
+                tipo_reporte='perdido',
+                nombre_perro='Benchmark',
+                color='café',
+                tamano='mediano',
+                descripcion='Reporte de benchmark',
+                latitud=lat,
+                longitud=lon,
+                direccion='N/A',
+                zona='Centro',
+                fecha_incidente=timezone.now(),
+                telefono_contacto='0000000000',
+                email_contacto='bench@example.com',
+            )
+            # La difusión normalmente la ejecuta el trabajador de la cola
+            with override_settings(NOTIFICACIONES_TAMANO_LOTE=tamano_lote):
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    notificar_nuevo_reporte(reporte.pk)
+                    transcurrido = (time.perf_counter() - inicio) * 1000
+
+            inserts = sum(
+                1 for consulta in consultas.captured_queries
+                if consulta['sql'].startswith(f'INSERT INTO "{tabla}"')
+            )
+            creadas = Notificacion.objects.filter(reporte=reporte).count()
+            self.stdout.write(f"{tamano_lote:>6} {creadas:>15} {inserts:>8} {transcurrido:>12.1f}")
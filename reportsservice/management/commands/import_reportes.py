@@ -0,0 +1,69 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from reportsservice import importacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa reportes desde un archivo CSV o JSONL (una fila u objeto por "
+        "reporte) a nombre de un usuario, por ejemplo la cuenta de un refugio. "
+        "El archivo se lee fila por fila, cada fila se valida con los "
+        "validadores de Reporte y las válidas se insertan con bulk_create por "
+        "lotes. Las notificaciones a los suscriptores se encolan una vez por "
+        "lote en lugar de una por reporte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o - para leer de la entrada estándar")
+        parser.add_argument('--usuario', required=True,
+                            help="Nombre de usuario al que se asignan los reportes")
+        parser.add_argument('--formato', choices=importacion.FORMATOS, default=None,
+                            help="csv o jsonl (por defecto, según la extensión del archivo)")
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE,
+                            help="Reportes insertados por transacción")
+        parser.add_argument('--simular', action='store_true',
+                            help="Solo validar el archivo, sin insertar")
+
+    def handle(self, *args, **options):
+        usuario_id = get_user_model().objects.filter(
+            username=options['usuario']
+        ).values_list('pk', flat=True).first()
+        if usuario_id is None:
+            raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        ruta = options['archivo']
+        try:
+            formato = options['formato'] or importacion.formato_de_ruta(ruta)
+        except importacion.FormatoInvalido as error:
+            raise CommandError(str(error))
+
+        def al_error(numero, mensajes):
+            self.stderr.write(f"Línea {numero}: {'; '.join(mensajes)}")
+
+        # utf-8-sig descarta el BOM que agregan algunas hojas de cálculo
+        try:
+            archivo = sys.stdin if ruta == '-' else open(ruta, newline='', encoding='utf-8-sig')
+        except OSError as error:
+            raise CommandError(f"No se pudo abrir '{ruta}': {error.strerror}.")
+        try:
+            resultado = importacion.importar(
+                importacion.leer_filas(archivo, formato),
+                usuario_id,
+                tamano_lote=options['lote'],
+                simular=options['simular'],
+                al_error=al_error,
+            )
+        except importacion.FormatoInvalido as error:
+            raise CommandError(str(error))
+        finally:
+            if archivo is not sys.stdin:
+                archivo.close()
+
+        accion = "válido(s)" if options['simular'] else "importado(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['importadas']} reporte(s) {accion}, {resultado['invalidas']} fila(s) "
+            f"inválida(s) de {resultado['leidas']} en {resultado['segundos']:.2f} s"
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reportsservice.coincidencias import recalcular_coincidencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las coincidencias perdido/encontrado de todos los reportes "
+        "activos repartiendo el trabajo en un pool de procesos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=None,
+                            help="Procesos del pool (por defecto, el número de CPUs)")
+        parser.add_argument('--bloque', type=int, default=2000,
+                            help="Reportes por bloque enviado a cada proceso")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        reportes, coincidencias = recalcular_coincidencias(
+            procesos=options['procesos'], tamano_bloque=options['bloque']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{reportes} reportes activos, {coincidencias} coincidencias guardadas "
+            f"en {time.perf_counter() - inicio:.2f}s"
+        ))
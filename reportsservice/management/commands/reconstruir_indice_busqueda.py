@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from reportsservice import busqueda
+
+
+class Command(BaseCommand):
+    help = "Crea el índice de búsqueda de texto completo y lo llena con todos los reportes."
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            busqueda.reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice de búsqueda ({connection.vendor}) reconstruido en "
+            f"{time.perf_counter() - inicio:.2f}s"
+        ))
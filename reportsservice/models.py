@@ -3,8 +3,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
-from PIL import Image
-import os
+from pawtohome.seguimiento import SeguimientoCambiosMixin
 
 class Raza(models.Model):
     """
@@ -45,12 +44,19 @@ class Raza(models.Model):
     def __str__(self):
         return self.nombre
 
-class Reporte(models.Model):
+class Reporte(SeguimientoCambiosMixin, models.Model):
     """
     Modelo de Reporte basado en el ER de PawsToHome
     Representa la entidad REPORTE del diagrama
     """
     
+    # Campos cuyo valor al cargar se recuerda para detectar cambios (has_changed)
+    campos_seguidos = (
+        'estado', 'visible', 'latitud', 'longitud',
+        'nombre_perro', 'color', 'descripcion', 'caracteristicas_distintivas',
+        'tipo_reporte', 'tamano', 'raza', 'fecha_incidente', 'zona',
+    )
+    
     TIPO_REPORTE_CHOICES = [
         ('perdido', 'Perdido'),
         ('encontrado', 'Encontrado'),
@@ -205,8 +211,12 @@ class Reporte(models.Model):
         ordering = ['-fecha_reporte']
         indexes = [
             models.Index(fields=['tipo_reporte', 'estado']),
-            models.Index(fields=['fecha_reporte']),
+            # (fecha_reporte, id) también sirve para la paginación por cursor del feed
+            models.Index(fields=['fecha_reporte', 'id']),
             models.Index(fields=['latitud', 'longitud']),
+            # Búsqueda de coincidencias: tipo y estado fijos, rango de fechas
+            # y rango de latitud resuelto dentro del mismo índice
+            models.Index(fields=['tipo_reporte', 'estado', 'fecha_incidente', 'latitud']),
         ]
     
     def __str__(self):
@@ -273,6 +283,16 @@ class FotoReporte(models.Model):
         verbose_name="Orden"
     )
     
+    procesada = models.BooleanField(
+        default=False,
+        verbose_name="Variantes Generadas"
+    )
+    
+    error_procesamiento = models.TextField(
+        blank=True,
+        verbose_name="Error al Generar Variantes"
+    )
+    
     class Meta:
         verbose_name = "Foto de Reporte"
         verbose_name_plural = "Fotos de Reportes"
@@ -291,29 +311,93 @@ class FotoReporte(models.Model):
                 es_principal=True
             ).exclude(pk=self.pk).update(es_principal=False)
         
-        super().save(*args, **kwargs)
+        # Una imagen nueva todavía no tiene variantes; la señal post_save
+        # encola su procesamiento en segundo plano
+        if self.imagen and not self.imagen._committed:
+            self.procesada = False
+            self.error_procesamiento = ''
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'imagen' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'procesada', 'error_procesamiento'}
         
-        # Optimizar imagen después de guardar
-        if self.imagen:
-            self.optimizar_imagen()
-    
-    def optimizar_imagen(self):
-        """Optimiza el tamaño de la imagen para web"""
-        try:
-            with Image.open(self.imagen.path) as img:
-                # Redimensionar si es muy grande
-                if img.width > 800 or img.height > 600:
-                    img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-                    img.save(self.imagen.path, optimize=True, quality=85)
-        except Exception as e:
-            pass  # Si hay error, no optimizar
+        super().save(*args, **kwargs)
+    
+    def variante(self, nombre):
+        """Retorna la variante ``nombre`` de la foto, o None si no existe"""
+        for variante in self.variantes.all():
+            if variante.nombre == nombre:
+                return variante
+        return None
+
+def variante_foto_path(instance, filename):
+    """Función para generar el path de las variantes de fotos de reportes"""
+    return f"reportes/{instance.foto.reporte_id}/fotos/variantes/{filename}"
 
-class Avistamiento(models.Model):
+class VarianteFotoReporte(models.Model):
+    """
+    Versión redimensionada de una FotoReporte (miniatura, mediana, WebP),
+    generada en segundo plano a partir de la imagen original
+    """
+    
+    NOMBRE_CHOICES = [
+        ('miniatura', 'Miniatura'),
+        ('mediana', 'Mediana'),
+        ('webp', 'WebP'),
+    ]
+    
+    foto = models.ForeignKey(
+        FotoReporte,
+        on_delete=models.CASCADE,
+        related_name='variantes',
+        verbose_name="Foto"
+    )
+    
+    nombre = models.CharField(
+        max_length=20,
+        choices=NOMBRE_CHOICES,
+        verbose_name="Variante"
+    )
+    
+    imagen = models.ImageField(
+        upload_to=variante_foto_path,
+        verbose_name="Imagen"
+    )
+    
+    ancho = models.PositiveIntegerField(
+        verbose_name="Ancho (px)"
+    )
+    
+    alto = models.PositiveIntegerField(
+        verbose_name="Alto (px)"
+    )
+    
+    formato = models.CharField(
+        max_length=10,
+        verbose_name="Formato"
+    )
+    
+    tamano_bytes = models.PositiveIntegerField(
+        verbose_name="Tamaño (bytes)"
+    )
+    
+    class Meta:
+        verbose_name = "Variante de Foto"
+        verbose_name_plural = "Variantes de Fotos"
+        db_table = "variante_foto_reporte"
+        unique_together = [['foto', 'nombre']]
+    
+    def __str__(self):
+        return f"{self.get_nombre_display()} de la foto {self.foto_id} ({self.ancho}x{self.alto})"
+
+class Avistamiento(SeguimientoCambiosMixin, models.Model):
     """
     Modelo de Avistamiento basado en el ER de PawsToHome
     Representa la entidad AVISTAMIENTO del diagrama
     """
     
+    # Campos cuyo valor al cargar se recuerda para detectar cambios (has_changed)
+    campos_seguidos = ('latitud', 'longitud', 'confianza')
+    
     reporte = models.ForeignKey(
         Reporte,
         on_delete=models.CASCADE,
@@ -486,3 +570,55 @@ class Comentario(models.Model):
         else:
             self.latitud = None
             self.longitud = None
+
+class CoincidenciaReporte(models.Model):
+    """
+    Posible coincidencia entre un reporte y otro del tipo contrario
+    (perdido/encontrado), calculada por el motor de coincidencias.
+    Para cada reporte se guardan solo sus mejores candidatos.
+    """
+    
+    reporte = models.ForeignKey(
+        Reporte,
+        on_delete=models.CASCADE,
+        related_name='coincidencias',
+        verbose_name="Reporte"
+    )
+    
+    candidato = models.ForeignKey(
+        Reporte,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Reporte Candidato"
+    )
+    
+    puntuacion = models.FloatField(
+        verbose_name="Puntuación",
+        help_text="Similitud entre 0 y 1"
+    )
+    
+    distancia_km = models.FloatField(
+        verbose_name="Distancia (km)"
+    )
+    
+    diferencia_horas = models.FloatField(
+        verbose_name="Diferencia entre incidentes (horas)"
+    )
+    
+    fecha_calculo = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Fecha de Cálculo"
+    )
+    
+    class Meta:
+        verbose_name = "Coincidencia de Reporte"
+        verbose_name_plural = "Coincidencias de Reportes"
+        db_table = "coincidencia_reporte"
+        ordering = ['reporte', '-puntuacion']
+        unique_together = [['reporte', 'candidato']]
+        indexes = [
+            models.Index(fields=['reporte', '-puntuacion']),
+        ]
+    
+    def __str__(self):
+        return f"{self.reporte_id} ~ {self.candidato_id} ({self.puntuacion:.2f})"
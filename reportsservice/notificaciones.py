@@ -0,0 +1,129 @@
+"""
+Manejadores de la cola de tareas que generan las notificaciones de
+reportes, avistamientos y comentarios. Las señales de ``signals.py`` solo
+encolan las tareas; aquí se hace el trabajo fuera de la petición.
+"""
+from Homeinfo.cola import manejador
+from Homeinfo.notificaciones import EscritorNotificaciones
+from ProfileService.indice import obtener_indice
+from .geo import distances_from
+from .models import Reporte, Avistamiento, Comentario
+
+# Reportes cargados por consulta al notificar un lote importado
+TAMANO_BLOQUE_REPORTES = 500
+
+
+def notificar_suscriptores(reporte, escritor):
+    """
+    Agrega al escritor una notificación por cada suscriptor dentro del
+    radio de ``reporte`` que quiera recibir este tipo de reporte
+    """
+    # Consultar solo los suscriptores de la celda que contiene el reporte
+    # y que quieren este tipo de notificación
+    campo_tipo = (
+        'notificar_perdidos' if reporte.tipo_reporte == 'perdido'
+        else 'notificar_encontrados'
+    )
+    candidatos = [
+        suscriptor
+        for suscriptor in obtener_indice().candidatos(reporte.latitud, reporte.longitud)
+        if suscriptor.usuario_id != reporte.usuario_id and getattr(suscriptor, campo_tipo)
+    ]
+    if not candidatos:
+        return
+
+    # Calcular todas las distancias de una vez usando Haversine
+    distancias = distances_from(
+        (reporte.latitud, reporte.longitud),
+        [suscriptor.latitud for suscriptor in candidatos],
+        [suscriptor.longitud for suscriptor in candidatos],
+    )
+
+    for suscriptor, distancia_km in zip(candidatos, distancias):
+        if distancia_km <= suscriptor.radio:
+            escritor.agregar(
+                usuario_id=suscriptor.usuario_id,
+                reporte=reporte,
+                tipo='nuevo_reporte',
+                titulo=f"Nuevo reporte: {reporte.get_tipo_reporte_display()}",
+                mensaje=f"Se ha reportado un perro {reporte.tipo_reporte}: {reporte.nombre_perro} en {reporte.zona}",
+                url=f"/reportes/{reporte.id}/"
+            )
+
+
+@manejador('nuevo_reporte')
+def notificar_nuevo_reporte(reporte_id):
+    """Notifica a los usuarios cercanos sobre un nuevo reporte"""
+    reporte = Reporte.objects.filter(pk=reporte_id).first()
+    if reporte is None:
+        return
+    with EscritorNotificaciones() as escritor:
+        notificar_suscriptores(reporte, escritor)
+
+
+@manejador('reportes_importados', lote=True)
+def notificar_reportes_importados(lotes):
+    """
+    Notifica a los usuarios cercanos sobre los reportes de uno o más lotes
+    de ``manage.py import_reportes`` con un solo escritor, en lugar de una
+    tarea ``nuevo_reporte`` por reporte
+    """
+    ids = [reporte_id for datos in lotes for reporte_id in datos['reporte_ids']]
+    with EscritorNotificaciones() as escritor:
+        for i in range(0, len(ids), TAMANO_BLOQUE_REPORTES):
+            for reporte in Reporte.objects.filter(pk__in=ids[i:i + TAMANO_BLOQUE_REPORTES]).order_by():
+                notificar_suscriptores(reporte, escritor)
+
+
+@manejador('avistamiento')
+def notificar_avistamiento(avistamiento_id):
+    """Notifica al dueño del reporte sobre un nuevo avistamiento"""
+    avistamiento = Avistamiento.objects.select_related('reporte').filter(pk=avistamiento_id).first()
+    if avistamiento is None:
+        return
+    reporte = avistamiento.reporte
+    with EscritorNotificaciones() as escritor:
+        escritor.agregar(
+            usuario_id=reporte.usuario_id,
+            reporte=reporte,
+            tipo='avistamiento',
+            titulo="Nuevo avistamiento reportado",
+            mensaje=f"Alguien ha reportado un avistamiento de {reporte.nombre_perro}",
+            url=f"/reportes/{reporte.id}/"
+        )
+
+
+@manejador('comentario')
+def notificar_comentario(comentario_id):
+    """Notifica al dueño del reporte sobre un nuevo comentario"""
+    comentario = Comentario.objects.select_related('reporte', 'usuario').filter(pk=comentario_id).first()
+    if comentario is None:
+        return
+    reporte = comentario.reporte
+    with EscritorNotificaciones() as escritor:
+        escritor.agregar(
+            usuario_id=reporte.usuario_id,
+            reporte=reporte,
+            tipo='comentario',
+            titulo="Nuevo comentario en tu reporte",
+            mensaje=f"{comentario.usuario.get_full_name() or comentario.usuario.username} ha comentado en el reporte de {reporte.nombre_perro}",
+            url=f"/reportes/{reporte.id}/"
+        )
+
+
+@manejador('estado_cambiado')
+def notificar_cambio_estado(reporte_id, estado):
+    """Notifica al dueño del reporte que su estado cambió a ``estado``"""
+    reporte = Reporte.objects.filter(pk=reporte_id).first()
+    if reporte is None:
+        return
+    estado_display = dict(Reporte.ESTADO_CHOICES).get(estado, estado)
+    with EscritorNotificaciones() as escritor:
+        escritor.agregar(
+            usuario_id=reporte.usuario_id,
+            reporte=reporte,
+            tipo='estado_cambiado',
+            titulo="Estado del reporte actualizado",
+            mensaje=f"El estado de tu reporte de {reporte.nombre_perro} ha cambiado a: {estado_display}",
+            url=f"/reportes/{reporte.id}/"
+        )
@@ -0,0 +1,41 @@
+"""
+Conversión de modelos a diccionarios para las respuestas JSON.
+"""
+
+
+def serializar_reporte(reporte, **extra):
+    """
+    Retorna un diccionario con los campos públicos de un reporte.
+    Usa ``reporte.raza`` así que la consulta debe incluir select_related('raza').
+    """
+    datos = {
+        'id': str(reporte.id),
+        'nombre_perro': reporte.nombre_perro,
+        'tipo_reporte': reporte.tipo_reporte,
+        'estado': reporte.estado,
+        'tamano': reporte.tamano,
+        'color': reporte.color,
+        'raza': reporte.raza.nombre if reporte.raza_id else None,
+        'latitud': reporte.latitud,
+        'longitud': reporte.longitud,
+        'zona': reporte.zona,
+        'fecha_reporte': reporte.fecha_reporte.isoformat(),
+        'fecha_incidente': reporte.fecha_incidente.isoformat(),
+        'url': f"/reportes/{reporte.id}/",
+    }
+    datos.update(extra)
+    return datos
+
+
+def serializar_foto(foto):
+    """
+    Retorna un diccionario con las URLs de una foto y sus variantes.
+    Usa ``foto.variantes.all()`` así que conviene hacer prefetch de 'variantes'.
+    """
+    variantes = {variante.nombre: variante.imagen.url for variante in foto.variantes.all()}
+    return {
+        'id': foto.id,
+        'descripcion': foto.descripcion,
+        'original': foto.imagen.url if foto.imagen else None,
+        'variantes': variantes,
+    }
@@ -1,70 +1,23 @@
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
-import math
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from .geo import calcular_distancia_haversine  # Se mantiene importable desde aquí
 from .models import Reporte, Avistamiento, Comentario, FotoReporte
-from Homeinfo.models import Notificacion
-from ProfileService.models import ConfiguracionUsuario
+from . import busqueda, coincidencias, imagenes, notificaciones  # Registran los manejadores de la cola
+from Homeinfo.cola import encolar, encolar_varias
+from pawtohome import cache_respuestas
 
-def calcular_distancia_haversine(lat1, lon1, lat2, lon2):
-    """
-    Calcula la distancia entre dos puntos usando la fórmula de Haversine
-    Retorna la distancia en kilómetros
-    """
-    # Radio de la Tierra en kilómetros
-    R = 6371.0
-    
-    # Convertir grados a radianes
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    # Diferencias
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    # Fórmula de Haversine
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+# Enviada por importacion.importar() con sender=Reporte y reportes=[...] por
+# cada lote insertado con bulk_create, que no envía post_save
+reportes_importados = Signal()
 
 @receiver(post_save, sender=Reporte)
 def crear_notificaciones_nuevo_reporte(sender, instance, created, **kwargs):
     """
-    Signal para crear notificaciones cuando se crea un nuevo reporte
+    Signal para encolar las notificaciones cuando se crea un nuevo reporte
     """
     if created:
-        # Obtener usuarios con ubicación preferida configurada
-        configuraciones = ConfiguracionUsuario.objects.filter(
-            latitud_preferida__isnull=False,
-            longitud_preferida__isnull=False
-        ).exclude(usuario=instance.usuario)
-        
-        for config in configuraciones:
-            # Calcular distancia usando Haversine
-            distancia_km = calcular_distancia_haversine(
-                config.latitud_preferida, 
-                config.longitud_preferida,
-                instance.latitud,
-                instance.longitud
-            )
-            
-            # Verificar si está en el radio y si quiere este tipo de notificación
-            tipo_notificar = (
-                (instance.tipo_reporte == 'perdido' and config.notificar_perdidos) or
-                (instance.tipo_reporte == 'encontrado' and config.notificar_encontrados)
-            )
-            
-            if distancia_km <= config.radio_notificaciones and tipo_notificar:
-                Notificacion.objects.create(
-                    usuario=config.usuario,
-                    reporte=instance,
-                    tipo='nuevo_reporte',
-                    titulo=f"Nuevo reporte: {instance.get_tipo_reporte_display()}",
-                    mensaje=f"Se ha reportado un perro {instance.tipo_reporte}: {instance.nombre_perro} en {instance.zona}",
-                    url=f"/reportes/{instance.id}/"
-                )
+        encolar('nuevo_reporte', reporte_id=str(instance.pk))
 
 @receiver(post_save, sender=Avistamiento)
 def crear_notificacion_avistamiento(sender, instance, created, **kwargs):
@@ -72,50 +25,34 @@ def crear_notificacion_avistamiento(sender, instance, created, **kwargs):
     Signal para notificar al dueño del reporte cuando hay un nuevo avistamiento
     """
     if created:
-        Notificacion.objects.create(
-            usuario=instance.reporte.usuario,
-            reporte=instance.reporte,
-            tipo='avistamiento',
-            titulo="Nuevo avistamiento reportado",
-            mensaje=f"Alguien ha reportado un avistamiento de {instance.reporte.nombre_perro}",
-            url=f"/reportes/{instance.reporte.id}/"
-        )
+        encolar('avistamiento', avistamiento_id=instance.pk)
 
 @receiver(post_save, sender=Comentario)
 def crear_notificacion_comentario(sender, instance, created, **kwargs):
     """
     Signal para notificar al dueño del reporte cuando hay un nuevo comentario
     """
-    if created and instance.usuario != instance.reporte.usuario:
-        Notificacion.objects.create(
-            usuario=instance.reporte.usuario,
-            reporte=instance.reporte,
-            tipo='comentario',
-            titulo="Nuevo comentario en tu reporte",
-            mensaje=f"{instance.usuario.get_full_name() or instance.usuario.username} ha comentado en el reporte de {instance.reporte.nombre_perro}",
-            url=f"/reportes/{instance.reporte.id}/"
-        )
+    if created and instance.usuario_id != instance.reporte.usuario_id:
+        encolar('comentario', comentario_id=instance.pk)
 
 @receiver(pre_save, sender=Reporte)
 def notificar_cambio_estado(sender, instance, **kwargs):
     """
     Signal para notificar cambios de estado en reportes
     """
-    if instance.pk:  # Solo para actualizaciones, no creaciones
-        try:
-            reporte_anterior = Reporte.objects.get(pk=instance.pk)
-            if reporte_anterior.estado != instance.estado:
-                # El estado cambió, crear notificación
-                Notificacion.objects.create(
-                    usuario=instance.usuario,
-                    reporte=instance,
-                    tipo='estado_cambiado',
-                    titulo=f"Estado del reporte actualizado",
-                    mensaje=f"El estado de tu reporte de {instance.nombre_perro} ha cambiado a: {instance.get_estado_display()}",
-                    url=f"/reportes/{instance.id}/"
-                )
-        except Reporte.DoesNotExist:
-            pass
+    if instance._state.adding:  # Solo para actualizaciones, no creaciones
+        return
+    
+    if instance.tiene_valor_original('estado'):
+        # Instancia cargada de la base de datos: se compara sin consultar
+        estado_cambio = instance.has_changed('estado')
+    else:
+        estado_anterior = Reporte.objects.filter(pk=instance.pk).values_list('estado', flat=True).first()
+        estado_cambio = estado_anterior is not None and estado_anterior != instance.estado
+    
+    if estado_cambio:
+        # El estado cambió, encolar la notificación
+        encolar('estado_cambiado', reporte_id=str(instance.pk), estado=instance.estado)
 
 @receiver(post_save, sender=FotoReporte)
 def validar_foto_principal(sender, instance, created, **kwargs):
@@ -125,5 +62,90 @@ def validar_foto_principal(sender, instance, created, **kwargs):
     if created:
         # Si es el primer foto del reporte, marcarla como principal
         if not FotoReporte.objects.filter(reporte=instance.reporte, es_principal=True).exists():
+            # update() evita volver a disparar save() y sus señales
+            FotoReporte.objects.filter(pk=instance.pk).update(es_principal=True)
             instance.es_principal = True
-            instance.save(update_fields=['es_principal'])
\ No newline at end of file
+
+@receiver(post_save, sender=FotoReporte)
+def encolar_procesamiento_foto(sender, instance, **kwargs):
+    """
+    Signal para generar las variantes de una foto nueva fuera de la petición
+    """
+    if instance.imagen and not instance.procesada:
+        encolar('procesar_foto', foto_id=instance.pk)
+
+@receiver(post_save, sender=Reporte)
+def actualizar_indice_busqueda(sender, instance, created, **kwargs):
+    """
+    Signal para mantener el índice de búsqueda cuando cambia el texto del reporte
+    """
+    if created or any(instance.has_changed(campo) for campo in busqueda.CAMPOS_INDEXADOS):
+        reporte_id = instance.pk
+        transaction.on_commit(lambda: busqueda.indexar_reportes([reporte_id]))
+
+@receiver(post_delete, sender=Reporte)
+def eliminar_de_indice_busqueda(sender, instance, **kwargs):
+    """
+    Signal para retirar del índice de búsqueda los reportes eliminados
+    """
+    reporte_id = instance.pk
+    transaction.on_commit(lambda: busqueda.eliminar_reportes([reporte_id]))
+
+# Campos que afectan la puntuación o la elegibilidad de una coincidencia
+CAMPOS_COINCIDENCIA = (
+    'tipo_reporte', 'estado', 'visible', 'latitud', 'longitud',
+    'fecha_incidente', 'tamano', 'raza', 'color',
+)
+
+@receiver(post_save, sender=Reporte)
+def encolar_busqueda_coincidencias(sender, instance, created, **kwargs):
+    """
+    Signal para recalcular las coincidencias perdido/encontrado del reporte
+    """
+    if created or any(instance.has_changed(campo) for campo in CAMPOS_COINCIDENCIA):
+        encolar('buscar_coincidencias', reporte_id=str(instance.pk))
+
+# Campos que deciden si un reporte entra en una página del feed
+CAMPOS_FEED = ('visible', 'estado', 'tipo_reporte', 'zona')
+
+@receiver(post_save, sender=Reporte)
+@receiver(post_delete, sender=Reporte)
+def invalidar_cache_reporte(sender, instance, created=False, **kwargs):
+    """
+    Signal para invalidar las respuestas en cache que incluyen el reporte y,
+    si es nuevo o cambió un campo filtrable, las páginas del feed
+    """
+    etiquetas = [f"reporte:{instance.pk}"]
+    if created or (
+        kwargs.get('signal') is post_save and
+        any(instance.has_changed(campo) for campo in CAMPOS_FEED)
+    ):
+        etiquetas.append('feed')
+    transaction.on_commit(lambda: cache_respuestas.invalidar(*etiquetas))
+
+@receiver(post_save, sender=FotoReporte)
+@receiver(post_delete, sender=FotoReporte)
+@receiver(post_save, sender=Avistamiento)
+@receiver(post_delete, sender=Avistamiento)
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+def invalidar_cache_reporte_relacionado(sender, instance, **kwargs):
+    """
+    Signal para invalidar las respuestas en cache que incluyen el reporte
+    de una foto, avistamiento o comentario que cambió
+    """
+    etiqueta = f"reporte:{instance.reporte_id}"
+    transaction.on_commit(lambda: cache_respuestas.invalidar(etiqueta))
+
+@receiver(reportes_importados, sender=Reporte)
+def procesar_reportes_importados(sender, reportes, **kwargs):
+    """
+    Signal para hacer con un lote importado lo que post_save hace reporte
+    por reporte: notificaciones en una sola tarea, coincidencias, índice de
+    búsqueda y feed
+    """
+    ids = [reporte.pk for reporte in reportes]
+    encolar('reportes_importados', reporte_ids=[str(reporte_id) for reporte_id in ids])
+    encolar_varias('buscar_coincidencias', [{'reporte_id': str(reporte_id)} for reporte_id in ids])
+    transaction.on_commit(lambda: busqueda.indexar_reportes(ids))
+    transaction.on_commit(lambda: cache_respuestas.invalidar('feed'))
@@ -1,3 +1,662 @@
-from django.test import TestCase
+import math
+import os
+import random
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Homeinfo import cola
+from Homeinfo.models import Notificacion, Tarea
+from pawtohome.paginacion import codificar_cursor
+from ProfileService.indice import invalidar_indice
+from ProfileService.models import ConfiguracionUsuario
+from PIL import Image
+
+from . import busqueda, coincidencias, geo, imagenes
+from .models import CoincidenciaReporte, FotoReporte, Raza, Reporte
+
+
+def crear_reporte(usuario, **campos):
+    datos = {
+        'usuario': usuario,
+        'tipo_reporte': 'perdido',
+        'nombre_perro': 'Firulais',
+        'color': 'café',
+        'tamano': 'mediano',
+        'descripcion': 'Perro con collar rojo',
+        'latitud': 19.4326,
+        'longitud': -99.1332,
+        'direccion': 'Av. Reforma 1',
+        'zona': 'Centro',
+        'fecha_incidente': timezone.now(),
+        'telefono_contacto': '5512345678',
+        'email_contacto': 'dueno@example.com',
+    }
+    datos.update(campos)
+    return Reporte.objects.create(**datos)
+
+
+class SeguimientoCambiosReporteTests(TestCase):
+    """Pruebas del seguimiento de cambios de Reporte sin consultas adicionales"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+        cls.reporte_id = crear_reporte(cls.usuario).pk
+
+    def test_instancia_cargada_recuerda_valores(self):
+        reporte = Reporte.objects.get(pk=self.reporte_id)
+        self.assertFalse(reporte.has_changed('estado'))
+
+        reporte.estado = 'cerrado'
+        self.assertTrue(reporte.has_changed('estado'))
+        self.assertEqual(reporte.valor_original('estado'), 'activo')
+        self.assertEqual(reporte.cambios(), {'estado': ('activo', 'cerrado')})
+
+    def test_guardar_actualiza_valores_originales(self):
+        reporte = Reporte.objects.get(pk=self.reporte_id)
+        reporte.estado = 'cerrado'
+        reporte.save()
+        self.assertFalse(reporte.has_changed('estado'))
+        self.assertEqual(reporte.valor_original('estado'), 'cerrado')
+
+    def test_update_fields_solo_actualiza_campos_guardados(self):
+        reporte = Reporte.objects.get(pk=self.reporte_id)
+        reporte.estado = 'cerrado'
+        reporte.visible = False
+        reporte.save(update_fields=['visible'])
+        self.assertFalse(reporte.has_changed('visible'))
+        self.assertTrue(reporte.has_changed('estado'))
+
+    def test_campo_diferido_se_considera_cambiado(self):
+        reporte = Reporte.objects.only('nombre_perro').get(pk=self.reporte_id)
+        self.assertFalse(reporte.tiene_valor_original('estado'))
+        self.assertTrue(reporte.has_changed('estado'))
+
+    def test_guardar_sin_cambio_de_estado_no_consulta_de_mas(self):
+        reporte = Reporte.objects.get(pk=self.reporte_id)
+        reporte.descripcion = 'Perro con collar azul'
+        with self.captureOnCommitCallbacks(execute=True):
+            # Solo el UPDATE del reporte
+            with self.assertNumQueries(1):
+                reporte.save()
+        self.assertFalse(Tarea.objects.filter(tipo='estado_cambiado').exists())
+
+    def test_cambio_de_estado_se_detecta_sin_select(self):
+        reporte = Reporte.objects.get(pk=self.reporte_id)
+        reporte.estado = 'cerrado'
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            # El UPDATE del reporte y la consulta de sus avistamientos para
+            # invalidar los clusters del mapa; ningún SELECT del reporte
+            with self.assertNumQueries(2):
+                reporte.save()
+        for callback in callbacks:
+            callback()
+        tarea = Tarea.objects.get(tipo='estado_cambiado')
+        self.assertEqual(tarea.datos, {'reporte_id': str(self.reporte_id), 'estado': 'cerrado'})
+
+    def test_instancia_no_cargada_compara_contra_la_base_de_datos(self):
+        reporte = Reporte.objects.get(pk=self.reporte_id)
+        copia = Reporte(**{
+            campo.attname: getattr(reporte, campo.attname)
+            for campo in Reporte._meta.concrete_fields
+        })
+        copia._state.adding = False
+        with self.captureOnCommitCallbacks(execute=True):
+            copia.save()
+        self.assertFalse(Tarea.objects.filter(tipo='estado_cambiado').exists())
+
+    def test_crear_reporte_no_consulta_estado_anterior(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            # Solo el INSERT del reporte
+            with self.assertNumQueries(1):
+                crear_reporte(self.usuario, nombre_perro='Manchas')
+
+
+class CoincidenciasTests(TestCase):
+    """Pruebas del motor de coincidencias perdido/encontrado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        modelo = get_user_model()
+        cls.dueno = modelo.objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+        cls.vecino = modelo.objects.create_user(
+            username='vecino', password='secreto123', phone_number='5587654321'
+        )
+
+    def test_guarda_coincidencia_en_ambos_sentidos(self):
+        perdido = crear_reporte(self.dueno, color='Café y blanco')
+        cercano = crear_reporte(
+            self.vecino, tipo_reporte='encontrado', color='blanco con café',
+            latitud=19.44, longitud=-99.14,
+        )
+        lejano = crear_reporte(
+            self.vecino, tipo_reporte='encontrado', latitud=20.6597, longitud=-103.3496,
+        )
+
+        coincidencias.buscar_coincidencias(str(perdido.pk))
+
+        self.assertEqual(
+            list(CoincidenciaReporte.objects.filter(reporte=perdido).values_list('candidato_id', flat=True)),
+            [cercano.pk],
+        )
+        self.assertTrue(CoincidenciaReporte.objects.filter(reporte=cercano, candidato=perdido).exists())
+        self.assertFalse(CoincidenciaReporte.objects.filter(candidato=lejano).exists())
+
+    def test_reporte_cerrado_pierde_sus_coincidencias(self):
+        perdido = crear_reporte(self.dueno)
+        encontrado = crear_reporte(self.vecino, tipo_reporte='encontrado')
+        coincidencias.buscar_coincidencias(str(perdido.pk))
+        self.assertTrue(CoincidenciaReporte.objects.exists())
+
+        Reporte.objects.filter(pk=encontrado.pk).update(estado='cerrado')
+        coincidencias.buscar_coincidencias(str(encontrado.pk))
+        self.assertFalse(CoincidenciaReporte.objects.exists())
+
+    def test_recalculo_en_lote_coincide_con_el_calculo_en_linea(self):
+        perdido = crear_reporte(self.dueno)
+        crear_reporte(self.vecino, tipo_reporte='encontrado', latitud=19.45)
+        crear_reporte(self.vecino, tipo_reporte='encontrado', latitud=19.42, tamano='grande')
+        coincidencias.buscar_coincidencias(str(perdido.pk))
+        en_linea = set(CoincidenciaReporte.objects.values_list('reporte_id', 'candidato_id'))
+
+        reportes, total = coincidencias.recalcular_coincidencias(procesos=1)
+
+        self.assertEqual(reportes, 3)
+        self.assertEqual(total, 4)
+        self.assertEqual(set(CoincidenciaReporte.objects.values_list('reporte_id', 'candidato_id')), en_linea)
+
+
+class CacheFeedTests(TestCase):
+    """Pruebas del cache de respuestas del feed y su invalidación por señales"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reporte = crear_reporte(self.usuario)
+
+    def test_segunda_peticion_no_consulta_y_responde_304(self):
+        primera = self.client.get('/reports/feed/')
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/reports/feed/')
+        self.assertEqual(segunda.content, primera.content)
+
+        respuesta = self.client.get('/reports/feed/', HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_cambio_en_reporte_del_feed_invalida_la_pagina(self):
+        self.client.get('/reports/feed/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reporte.nombre_perro = 'Manchas'
+            self.reporte.save()
+        resultados = self.client.get('/reports/feed/').json()['resultados']
+        self.assertEqual(resultados[0]['nombre_perro'], 'Manchas')
+
+    def test_reporte_nuevo_invalida_el_feed(self):
+        self.client.get('/reports/feed/')
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_reporte(self.usuario, nombre_perro='Manchas')
+        self.assertEqual(len(self.client.get('/reports/feed/').json()['resultados']), 2)
+
+    def test_cambio_en_otro_reporte_no_invalida_la_pagina(self):
+        self.client.get('/reports/feed/', {'zona': 'Norte'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reporte.descripcion = 'Perro con collar azul'
+            self.reporte.save()
+        with self.assertNumQueries(0):
+            self.client.get('/reports/feed/', {'zona': 'Norte'})
+
+
+class CursorFeedTests(TestCase):
+    """Pruebas de la paginación por cursor del feed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = get_user_model().objects.create_user(username='dueno', phone_number='5512345678')
+        ahora = timezone.now()
+        # Dos reportes con la misma fecha para probar el desempate por id
+        fechas = [ahora, ahora - timedelta(hours=1), ahora - timedelta(hours=1),
+                  ahora - timedelta(hours=2), ahora - timedelta(hours=3)]
+        cls.reportes = [
+            crear_reporte(usuario, nombre_perro=f'Perro {i}', fecha_reporte=fecha)
+            for i, fecha in enumerate(fechas)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_recorre_todas_las_paginas_en_orden_sin_repetir(self):
+        vistos = []
+        parametros = {'limite': 2}
+        paginas = 0
+        while True:
+            datos = self.client.get('/reports/feed/', parametros).json()
+            vistos += [reporte['id'] for reporte in datos['resultados']]
+            paginas += 1
+            if datos['siguiente'] is None:
+                break
+            parametros['cursor'] = datos['siguiente']
+
+        esperados = [
+            str(reporte.pk) for reporte in
+            sorted(self.reportes, key=lambda reporte: (reporte.fecha_reporte, reporte.pk), reverse=True)
+        ]
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(paginas, 3)
+
+    def test_cursor_invalido_responde_400(self):
+        cursor_pk_alterado = codificar_cursor(timezone.now(), 'no-es-un-uuid')
+        for cursor in ('basura', cursor_pk_alterado, codificar_cursor(timezone.now(), None)):
+            with self.subTest(cursor=cursor):
+                respuesta = self.client.get('/reports/feed/', {'cursor': cursor})
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(respuesta.json()['error'], 'El cursor no es válido.')
+
+    def test_limite_no_numerico_responde_400(self):
+        respuesta = self.client.get('/reports/feed/', {'limite': 'muchos'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['error'], "El parámetro 'limite' debe ser numérico.")
+
+
+class ImportacionReportesTests(TestCase):
+    """Pruebas de la importación masiva de reportes desde CSV y JSONL"""
+
+    CABECERA = 'tipo_reporte,nombre_perro,color,tamano,raza,descripcion,latitud,longitud,' \
+               'direccion,zona,fecha_incidente,telefono_contacto,email_contacto'
+
+    def setUp(self):
+        modelo = get_user_model()
+        self.refugio = modelo.objects.create_user(username='refugio', phone_number='5511110000')
+        vecino = modelo.objects.create_user(username='vecino', phone_number='5511110001')
+        ConfiguracionUsuario.objects.filter(usuario=vecino).update(
+            latitud_preferida=19.43, longitud_preferida=-99.13, radio_notificaciones=5
+        )
+        invalidar_indice()
+        Raza.objects.create(nombre='Labrador', tamano_promedio='grande')
+
+    def tearDown(self):
+        invalidar_indice()
+
+    def archivo(self, contenido, extension):
+        descriptor, ruta = tempfile.mkstemp(suffix=extension)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+            archivo.write(contenido)
+        self.addCleanup(os.remove, ruta)
+        return ruta
+
+    def fila_csv(self, nombre, latitud='19.4326', raza='labrador'):
+        return f'encontrado,{nombre},negro,grande,{raza},Sin collar,{latitud},-99.1332,' \
+               f'Calle 1,Centro,2024-05-01 10:00,5511110000,refugio@example.com'
+
+    def test_csv_por_lotes_con_una_tarea_de_notificaciones_por_lote(self):
+        ruta = self.archivo('\n'.join([
+            self.CABECERA,
+            self.fila_csv('Uno'),
+            self.fila_csv('Dos'),
+            self.fila_csv('Tres', latitud='91'),
+            self.fila_csv('Cuatro', raza='Inexistente'),
+            self.fila_csv('Cinco'),
+        ]), '.csv')
+        salida, errores = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_reportes', ruta, usuario='refugio', lote=2, stdout=salida, stderr=errores)
+
+        self.assertIn('3 reporte(s) importado(s), 2 fila(s) inválida(s) de 5', salida.getvalue())
+        self.assertIn('Línea 4: latitud:', errores.getvalue())
+        self.assertIn("Línea 5: raza: No existe la raza 'Inexistente'.", errores.getvalue())
+        self.assertEqual(Reporte.objects.filter(usuario=self.refugio, raza__nombre='Labrador').count(), 3)
+        self.assertTrue(timezone.is_aware(Reporte.objects.first().fecha_incidente))
+        self.assertEqual(Tarea.objects.filter(tipo='nuevo_reporte').count(), 0)
+        self.assertEqual(Tarea.objects.filter(tipo='reportes_importados').count(), 2)
+        self.assertEqual(Tarea.objects.filter(tipo='buscar_coincidencias').count(), 3)
+
+        # Los dos lotes se notifican juntos: una consulta de reportes y un INSERT
+        Tarea.objects.exclude(tipo='reportes_importados').delete()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(cola.procesar_lote(), (2, 0))
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        self.assertEqual(sum(s.startswith('SELECT "reporte"') for s in sql), 1)
+        self.assertEqual(sum(s.startswith('INSERT INTO "notificacion"') for s in sql), 1)
+        self.assertEqual(Notificacion.objects.filter(usuario__username='vecino', tipo='nuevo_reporte').count(), 3)
+
+    def test_csv_con_booleanos_en_minusculas(self):
+        ruta = self.archivo('\n'.join([
+            self.CABECERA + ',visible,verificado',
+            self.fila_csv('Uno') + ',false,true',
+            self.fila_csv('Dos') + ', TRUE ,False',
+            self.fila_csv('Tres') + ',quizá,false',
+        ]), '.csv')
+        salida, errores = StringIO(), StringIO()
+        call_command('import_reportes', ruta, usuario='refugio', stdout=salida, stderr=errores)
+
+        self.assertIn('2 reporte(s) importado(s), 1 fila(s) inválida(s) de 3', salida.getvalue())
+        self.assertIn('Línea 4: visible:', errores.getvalue())
+        self.assertEqual(
+            dict(Reporte.objects.values_list('nombre_perro', 'visible')), {'Uno': False, 'Dos': True}
+        )
+        self.assertEqual(
+            dict(Reporte.objects.values_list('nombre_perro', 'verificado')), {'Uno': True, 'Dos': False}
+        )
+
+    def test_coordenadas_no_finitas_se_reportan_como_filas_invalidas(self):
+        csv_ruta = self.archivo('\n'.join([
+            self.CABECERA,
+            self.fila_csv('Uno'),
+            self.fila_csv('Dos', latitud='nan'),
+            self.fila_csv('Tres', latitud='inf'),
+        ]), '.csv')
+        jsonl_ruta = self.archivo('\n'.join([
+            '{"tipo_reporte": "perdido", "nombre_perro": "Cuatro", "color": "blanco", "tamano": "mediano",'
+            ' "descripcion": "Collar azul", "latitud": 19.4, "longitud": NaN, "direccion": "Calle 2",'
+            ' "zona": "Roma", "fecha_incidente": "2024-05-01T10:00:00-06:00",'
+            ' "telefono_contacto": "5511110000", "email_contacto": "refugio@example.com"}',
+        ]), '.jsonl')
+
+        for ruta, importados, invalidas, linea, campo in [
+            (csv_ruta, 1, 2, 3, 'latitud'), (jsonl_ruta, 0, 1, 1, 'longitud'),
+        ]:
+            salida, errores = StringIO(), StringIO()
+            call_command('import_reportes', ruta, usuario='refugio', stdout=salida, stderr=errores)
+            self.assertIn(f'{importados} reporte(s) importado(s), {invalidas} fila(s) inválida(s)', salida.getvalue())
+            self.assertIn(f'Línea {linea}: {campo}: Debe ser un número finito.', errores.getvalue())
+        self.assertEqual(list(Reporte.objects.values_list('nombre_perro', flat=True)), ['Uno'])
+
+    def test_jsonl_simulado_no_inserta(self):
+        ruta = self.archivo('\n'.join([
+            '{"tipo_reporte": "perdido", "nombre_perro": "Luna", "color": "blanco", "tamano": "mediano",'
+            ' "descripcion": "Collar azul", "latitud": 19.4, "longitud": -99.1, "direccion": "Calle 2",'
+            ' "zona": "Roma", "fecha_incidente": "2024-05-01T10:00:00-06:00",'
+            ' "telefono_contacto": "5511110000", "email_contacto": "refugio@example.com"}',
+            '{"nombre_perro": "Sin cerrar"',
+            '',
+            '{"tipo_reporte": "perdido", "edad": 3}',
+        ]), '.jsonl')
+        salida, errores = StringIO(), StringIO()
+        call_command('import_reportes', ruta, usuario='refugio', simular=True, stdout=salida, stderr=errores)
+
+        self.assertIn('1 reporte(s) válido(s), 2 fila(s) inválida(s) de 3', salida.getvalue())
+        self.assertIn('Línea 2: JSON inválido', errores.getvalue())
+        self.assertIn('Línea 4: Columnas desconocidas: edad.', errores.getvalue())
+        self.assertFalse(Reporte.objects.exists())
+
+
+def imagen_jpeg(ancho, alto):
+    contenido = BytesIO()
+    Image.new('RGB', (ancho, alto), 'red').save(contenido, 'JPEG')
+    return ContentFile(contenido.getvalue(), name='foto.jpg')
+
+
+class VariantesFotoTests(TestCase):
+    """Pruebas de la generación de variantes de las fotos"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name, IMAGENES_PROCESOS=1)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        usuario = get_user_model().objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+        self.reporte = crear_reporte(usuario)
+
+    def test_genera_todas_las_variantes(self):
+        foto = FotoReporte.objects.create(reporte=self.reporte, imagen=imagen_jpeg(1600, 1200))
+
+        imagenes.procesar_fotos([foto.pk])
+
+        foto.refresh_from_db()
+        self.assertTrue(foto.procesada)
+        self.assertEqual(foto.error_procesamiento, '')
+        variantes = {variante.nombre: variante for variante in foto.variantes.all()}
+        self.assertEqual(set(variantes), {'mediana', 'webp', 'miniatura'})
+        self.assertEqual((variantes['mediana'].ancho, variantes['mediana'].alto), (800, 600))
+        self.assertEqual(variantes['webp'].formato, 'webp')
+        self.assertEqual((variantes['miniatura'].ancho, variantes['miniatura'].alto), (200, 150))
+        for variante in variantes.values():
+            self.assertTrue(os.path.exists(variante.imagen.path))
+            self.assertEqual(variante.tamano_bytes, os.path.getsize(variante.imagen.path))
+
+    def test_imagen_pequena_no_se_amplia(self):
+        foto = FotoReporte.objects.create(reporte=self.reporte, imagen=imagen_jpeg(120, 90))
+
+        imagenes.procesar_fotos([foto.pk])
+
+        for variante in foto.variantes.all():
+            self.assertEqual((variante.ancho, variante.alto), (120, 90))
+
+    def test_foto_corrupta_no_afecta_a_las_demas(self):
+        valida = FotoReporte.objects.create(reporte=self.reporte, imagen=imagen_jpeg(640, 480))
+        corrupta = FotoReporte.objects.create(
+            reporte=self.reporte, imagen=ContentFile(b'no es una imagen', name='rota.jpg')
+        )
+
+        with self.assertLogs('reportsservice.imagenes', 'ERROR'):
+            imagenes.procesar_fotos([valida.pk, corrupta.pk])
+
+        valida.refresh_from_db()
+        corrupta.refresh_from_db()
+        self.assertTrue(valida.procesada)
+        self.assertEqual(valida.variantes.count(), 3)
+        self.assertFalse(corrupta.procesada)
+        self.assertNotEqual(corrupta.error_procesamiento, '')
+        self.assertEqual(corrupta.variantes.count(), 0)
+
+    def test_nueva_imagen_limpia_el_error(self):
+        foto = FotoReporte.objects.create(
+            reporte=self.reporte, imagen=ContentFile(b'no es una imagen', name='rota.jpg')
+        )
+        with self.assertLogs('reportsservice.imagenes', 'ERROR'):
+            imagenes.procesar_fotos([foto.pk])
+
+        foto.refresh_from_db()
+        foto.imagen = imagen_jpeg(640, 480)
+        foto.save(update_fields=['imagen'])
+        foto.refresh_from_db()
+        self.assertEqual(foto.error_procesamiento, '')
+
+        imagenes.procesar_fotos([foto.pk])
+        foto.refresh_from_db()
+        self.assertTrue(foto.procesada)
+
+
+class BusquedaTextoCompletoTests(TestCase):
+    """Pruebas del índice FTS5 de SQLite y de la vista /reports/buscar/"""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='dueno', password='secreto123', phone_number='5512345678'
+        )
+
+    def crear(self, **campos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return crear_reporte(self.usuario, **campos)
+
+    def ids(self, texto, **opciones):
+        return [str(Reporte._meta.pk.to_python(pk)) for pk, _ in busqueda.buscar_reportes(texto, **opciones)]
+
+    def test_usa_fts5_en_sqlite(self):
+        self.assertIsInstance(busqueda.obtener_motor(), busqueda.BusquedaSQLite)
+
+    def test_indexa_al_crear(self):
+        reporte = self.crear(nombre_perro='Canela', descripcion='Perra muy juguetona')
+        self.assertEqual(self.ids('juguetona'), [str(reporte.pk)])
+        # Prefijos y acentos indistintos
+        self.assertEqual(self.ids('jugue'), [str(reporte.pk)])
+        self.assertEqual(self.ids('CANELÁ'), [str(reporte.pk)])
+
+    def test_reindexa_al_editar(self):
+        reporte = self.crear(descripcion='Perro con collar rojo')
+        reporte.descripcion = 'Perro con paliacate azul'
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte.save()
+
+        self.assertEqual(self.ids('collar'), [])
+        self.assertEqual(self.ids('paliacate'), [str(reporte.pk)])
+
+    def test_elimina_al_borrar(self):
+        reporte = self.crear(descripcion='Perro con paliacate azul')
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte.delete()
+
+        self.assertEqual(self.ids('paliacate'), [])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM reporte_fts")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_actualiza_y_borra_por_rowid(self):
+        reporte = self.crear(descripcion='Perro con collar rojo')
+        reporte.descripcion = 'Perro con paliacate azul'
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                reporte.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                reporte.delete()
+
+        borrados = [q['sql'] for q in consultas if q['sql'].lstrip().startswith('DELETE FROM reporte_fts WHERE')]
+        self.assertEqual(len(borrados), 2)
+        with connection.cursor() as cursor:
+            for sql in borrados:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = ' '.join(fila[-1] for fila in cursor.fetchall())
+                # 'INDEX 0:=' es la búsqueda por rowid; 'INDEX 0:' solo es un recorrido completo
+                self.assertIn('INDEX 0:=', plan)
+            cursor.execute("SELECT count(*) FROM reporte_fts_id")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_crear_indice_reasigna_rowid_de_indices_anteriores(self):
+        reporte = self.crear(descripcion='Perro con collar rojo')
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE reporte_fts_id")
+            cursor.execute("UPDATE reporte_fts SET rowid = 999")
+
+        busqueda.obtener_motor().crear_indice()
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT f.reporte_id FROM reporte_fts f
+                JOIN reporte_fts_id i ON i.id = f.rowid AND i.reporte_id = f.reporte_id
+            """)
+            self.assertEqual(cursor.fetchall(), [(busqueda.obtener_motor()._id(reporte.pk),)])
+        self.assertEqual(self.ids('collar'), [str(reporte.pk)])
+
+    def test_ordena_por_relevancia(self):
+        en_descripcion = self.crear(nombre_perro='Toby', descripcion='Se parece a Manchas, el perro del vecino')
+        en_nombre = self.crear(nombre_perro='Manchas', descripcion='Perro pequeño')
+        self.crear(nombre_perro='Rocky', descripcion='Perro grande')
+
+        self.assertEqual(self.ids('manchas'), [str(en_nombre.pk), str(en_descripcion.pk)])
+
+    def test_excluye_reportes_ocultos(self):
+        oculto = self.crear(descripcion='Perro con paliacate', visible=False)
+        self.assertEqual(self.ids('paliacate'), [])
+        self.assertEqual(self.ids('paliacate', solo_visibles=False), [str(oculto.pk)])
+
+    def test_sintaxis_fts5_no_se_interpreta(self):
+        reporte = self.crear(descripcion='Perro con collar rojo')
+        self.assertEqual(self.ids('(collar "rojo*'), [str(reporte.pk)])
+        self.assertEqual(self.ids('"*()'), [])
+
+    def test_reconstruir_indice(self):
+        reporte = self.crear(descripcion='Perro con collar rojo')
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM reporte_fts")
+        self.assertEqual(self.ids('collar'), [])
+
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+        self.assertEqual(self.ids('collar'), [str(reporte.pk)])
+
+    def test_vista_buscar(self):
+        reportes = [self.crear(nombre_perro=f'Perro {n}', descripcion='Con collar rojo') for n in range(3)]
+
+        respuesta = self.client.get(reverse('reportsservice:buscar'), {'q': 'collar', 'limite': 2})
+
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(len(datos['resultados']), 2)
+        self.assertEqual(datos['siguiente'], 2)
+        self.assertTrue(all(fila['relevancia'] > 0 for fila in datos['resultados']))
+
+        segunda = self.client.get(reverse('reportsservice:buscar'), {'q': 'collar', 'limite': 2, 'pagina': 2}).json()
+        self.assertIsNone(segunda['siguiente'])
+        self.assertEqual(
+            {fila['id'] for fila in datos['resultados'] + segunda['resultados']},
+            {str(reporte.pk) for reporte in reportes}
+        )
+
+    def test_vista_buscar_consulta_vacia(self):
+        for parametros in ({}, {'q': '   '}):
+            respuesta = self.client.get(reverse('reportsservice:buscar'), parametros)
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('error', respuesta.json())
+
+    def test_vista_buscar_sin_terminos(self):
+        self.crear(descripcion='Perro con collar rojo')
+        respuesta = self.client.get(reverse('reportsservice:buscar'), {'q': '"*()'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['resultados'], [])
+
+    def test_vista_buscar_parametros_invalidos(self):
+        respuesta = self.client.get(reverse('reportsservice:buscar'), {'q': 'collar', 'pagina': 'dos'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class DistanciasTests(SimpleTestCase):
+    """Pruebas de las distancias por lote con NumPy y en Python puro"""
+
+    # Par de antípodas para el que el redondeo deja ``a`` en 1.0000000000000002
+    ANTIPODA = ((-78.1263994064304, -51.533293752144914), (78.1263994064304, 128.46670624785508))
+
+    def puntos(self, cantidad=2000):
+        rng = random.Random(3)
+        latitudes = [rng.uniform(-90.0, 90.0) for _ in range(cantidad)]
+        longitudes = [rng.uniform(-180.0, 180.0) for _ in range(cantidad)]
+        # Puntos repetidos, polos y antimeridiano
+        latitudes += [19.4326, 90.0, -90.0, 0.0, self.ANTIPODA[1][0]]
+        longitudes += [-99.1332, 0.0, 0.0, 180.0, self.ANTIPODA[1][1]]
+        return latitudes, longitudes
+
+    @skipIf(geo.np is None, "NumPy no está instalado")
+    def test_numpy_y_python_coinciden(self):
+        latitudes, longitudes = self.puntos()
+        for origen in [(19.4326, -99.1332), (0.0, -180.0), (89.9, 45.0), self.ANTIPODA[0]]:
+            con_numpy = geo.distances_from(origen, latitudes, longitudes)
+            en_python = geo._distancias_python(origen, latitudes, longitudes)
+            self.assertFalse(geo.np.isnan(con_numpy).any())
+            for a, b in zip(con_numpy.tolist(), en_python):
+                self.assertAlmostEqual(a, b, places=6)
+
+    def test_coinciden_con_la_formula_escalar(self):
+        latitudes, longitudes = self.puntos(200)
+        origen = (19.4326, -99.1332)
+        for distancia, lat, lon in zip(geo._distancias_python(origen, latitudes, longitudes), latitudes, longitudes):
+            self.assertAlmostEqual(distancia, geo.calcular_distancia_haversine(*origen, lat, lon), places=6)
+
+    def test_antipodas(self):
+        origen, (lat, lon) = self.ANTIPODA
+        media_vuelta = math.pi * geo.RADIO_TIERRA_KM
+        self.assertAlmostEqual(geo._distancias_python(origen, [lat], [lon])[0], media_vuelta, places=6)
+        if geo.np is not None:
+            self.assertAlmostEqual(float(geo.distances_from(origen, [lat], [lon])[0]), media_vuelta, places=6)
@@ -3,6 +3,8 @@ from . import views
 
 app_name = "reportsservice"
 urlpatterns = [
+    path('feed/', views.feed_reportes, name='feed'),
+    path('buscar/', views.buscar, name='buscar'),
     
     # Otras rutas de la aplicación
-]
\ No newline at end of file
+]
@@ -1,3 +1,134 @@
-from django.shortcuts import render
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from pawtohome.cache_respuestas import cache_respuesta, etiquetar
+from pawtohome.paginacion import CursorInvalido, paginar_por_cursor
+from .busqueda import buscar_reportes
+from .models import FotoReporte, Reporte
+from .serializadores import serializar_foto, serializar_reporte
+
+LIMITE_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+# Páginas máximas de resultados de búsqueda; más allá la relevancia es baja
+PAGINA_MAXIMA_BUSQUEDA = 50
 
 # Create your views here.
+
+@require_GET
+@cache_respuesta('feed', etiquetas=['feed'])
+def feed_reportes(request):
+    """
+    Feed público de reportes en JSON, del más reciente al más antiguo,
+    paginado por cursor sobre (fecha_reporte, id).
+
+    Parámetros: cursor, limite, tipo_reporte, estado, zona y visible
+    (solo el personal puede pedir visible=false).
+    """
+    reportes = Reporte.objects.select_related('raza').prefetch_related(
+        Prefetch(
+            'fotos',
+            queryset=FotoReporte.objects.filter(es_principal=True).prefetch_related('variantes'),
+            to_attr='fotos_principales',
+        )
+    )
+
+    tipo_reporte = request.GET.get('tipo_reporte')
+    if tipo_reporte:
+        if tipo_reporte not in dict(Reporte.TIPO_REPORTE_CHOICES):
+            return JsonResponse({'error': "El parámetro 'tipo_reporte' no es válido."}, status=400)
+        reportes = reportes.filter(tipo_reporte=tipo_reporte)
+
+    estado = request.GET.get('estado')
+    if estado:
+        if estado not in dict(Reporte.ESTADO_CHOICES):
+            return JsonResponse({'error': "El parámetro 'estado' no es válido."}, status=400)
+        reportes = reportes.filter(estado=estado)
+
+    zona = request.GET.get('zona')
+    if zona:
+        reportes = reportes.filter(zona=zona)
+
+    visible = request.GET.get('visible', 'true')
+    if visible not in ('true', 'false'):
+        return JsonResponse({'error': "El parámetro 'visible' debe ser true o false."}, status=400)
+    if visible == 'false' and not request.user.is_staff:
+        return JsonResponse({'error': 'No tiene permiso para ver reportes ocultos.'}, status=403)
+    reportes = reportes.filter(visible=(visible == 'true'))
+
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+        filas, siguiente = paginar_por_cursor(
+            reportes, 'fecha_reporte', request.GET.get('cursor'), limite
+        )
+    except (ValueError, CursorInvalido) as error:
+        mensaje = str(error) if isinstance(error, CursorInvalido) else "El parámetro 'limite' debe ser numérico."
+        return JsonResponse({'error': mensaje}, status=400)
+
+    etiquetar(request, *(f"reporte:{reporte.pk}" for reporte in filas))
+    return JsonResponse({
+        'resultados': [
+            serializar_reporte(
+                reporte,
+                foto_principal=(
+                    serializar_foto(reporte.fotos_principales[0])
+                    if reporte.fotos_principales else None
+                ),
+            )
+            for reporte in filas
+        ],
+        'siguiente': siguiente,
+    })
+
+
+@require_GET
+def buscar(request):
+    """
+    Búsqueda pública de reportes visibles por texto en JSON, ordenada por
+    relevancia.
+
+    Parámetros: q, pagina y limite.
+    """
+    texto = request.GET.get('q', '').strip()
+    if not texto:
+        return JsonResponse({'error': "El parámetro 'q' es obligatorio."}, status=400)
+
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+        pagina = min(max(int(request.GET.get('pagina', 1)), 1), PAGINA_MAXIMA_BUSQUEDA)
+    except ValueError:
+        return JsonResponse({'error': "Los parámetros 'pagina' y 'limite' deben ser numéricos."}, status=400)
+
+    # Se pide una fila de más para saber si hay otra página sin contar
+    resultados = buscar_reportes(texto, limite=limite + 1, desplazamiento=(pagina - 1) * limite)
+    hay_siguiente = len(resultados) > limite
+    resultados = resultados[:limite]
+
+    reportes = Reporte.objects.select_related('raza').prefetch_related(
+        Prefetch(
+            'fotos',
+            queryset=FotoReporte.objects.filter(es_principal=True).prefetch_related('variantes'),
+            to_attr='fotos_principales',
+        )
+    ).in_bulk([reporte_id for reporte_id, _ in resultados])
+
+    filas = []
+    for reporte_id, rango in resultados:
+        reporte = reportes.get(Reporte._meta.pk.to_python(reporte_id))
+        if reporte is None:
+            continue
+        filas.append(serializar_reporte(
+            reporte,
+            relevancia=rango,
+            foto_principal=(
+                serializar_foto(reporte.fotos_principales[0])
+                if reporte.fotos_principales else None
+            ),
+        ))
+
+    return JsonResponse({
+        'resultados': filas,
+        'pagina': pagina,
+        'siguiente': pagina + 1 if hay_siguiente and pagina < PAGINA_MAXIMA_BUSQUEDA else None,
+    })